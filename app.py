@@ -1,23 +1,43 @@
-from flask import Flask, render_template, request, abort, send_from_directory, session, url_for, redirect
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask_session import Session
+import async_mode
+# Green thread modes need the standard library patched before anything else
+# is imported.
+async_mode.patch()
+
 from config import global_config as config
+from flask import Flask, Response, render_template, request, abort, send_from_directory, session, url_for, redirect
+from flask_socketio import emit, join_room, leave_room
+from flask_session import Session
 from game_code import GameCode
 from game_store import game_store
+from message_broker import UnixSocketManager
+from metrics import metrics
+from session_store import MemorySessionInterface
+from sharding import shard_router
+from sockets import socketio
 from utils import get_session_data
+from wire_format import WIRE_ENUMS
 import os
 import logging
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'a slightly better, not so predictable secret!'
-app.config['SESSION_TYPE'] = 'filesystem'
 
-Session(app)
-socketio = SocketIO(
+if config.SESSION_TYPE == 'memory':
+    app.session_interface = MemorySessionInterface.from_config()
+    metrics.add_collector('sessions', app.session_interface.get_metrics)
+else:
+    app.config['SESSION_TYPE'] = config.SESSION_TYPE
+    Session(app)
+socketio_options = {'async_mode': async_mode.get_socketio_mode()}
+if config.MESSAGE_QUEUE:
+    # Share room broadcasts with the other shards
+    socketio_options['client_manager'] = UnixSocketManager(config.MESSAGE_QUEUE)
+socketio.init_app(
     app,
     manage_session=False,
     logger=logging.getLogger('socketio'),
-    engineio_logger=logging.getLogger('engineio')
+    engineio_logger=logging.getLogger('engineio'),
+    **socketio_options
 )
 
 from lobby_handlers import lobby
@@ -34,7 +54,12 @@ app.register_blueprint(create)
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
 logging.getLogger('socketio').setLevel(logging.WARNING)
 logging.getLogger('engineio').setLevel(logging.WARNING)
-logging.getLogger('transitions').setLevel(logging.WARNING)
+
+
+@app.context_processor
+def inject_wire_enums():
+    # Needed by static/js/util.js to decode binary socket payloads
+    return {'wire_enums': WIRE_ENUMS}
 
 
 # Home page for game creation and game joining
@@ -49,6 +74,10 @@ def how_to_play():
     return render_template('how_to_play.html')
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory('static', 'img/icons/question_mark_icon.ico')
@@ -57,6 +86,17 @@ def favicon():
 def page_not_found(e):
     return render_template('404.html'), 404
 
+def run_server(host=None, port=None):
+    ''' Serves the app in the configured async mode. '''
+    # New games pick up changes to the configuration file.
+    config.watch(config.CONFIG_RELOAD_INTERVAL)
+    if async_mode.get_mode() == 'asyncio':
+        import async_server
+        async_server.run(app, host, port)
+    else:
+        socketio.run(app, host=host, port=port)
+
 # TODO: add config for port,
 if __name__ == "__main__":
-    socketio.run(app)
+    host, port = shard_router.get_address()
+    run_server(host, port)
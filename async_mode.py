@@ -0,0 +1,70 @@
+''' Server concurrency mode (config.ASYNC_MODE):
+    - 'eventlet' and 'gevent' serve Flask-SocketIO on green threads. The
+      standard library is monkey patched (`patch` has to run before anything
+      else is imported), and blocking SQLite calls are handed to a native
+      thread pool (`run_blocking`) so they do not stall every other socket.
+    - 'threading' serves Flask-SocketIO on native threads (for debugging).
+    - 'asyncio' serves the same socket handlers from python-socketio's
+      AsyncServer on aiohttp (see async_server.py).
+    This module is imported before the standard library is patched, so it
+    reads the mode from the configuration file itself rather than through
+    config.py (whose store creates locks on import).
+'''
+import json
+import os
+
+ASYNC_MODES = ('eventlet', 'gevent', 'threading', 'asyncio')
+
+# Same default as `DefaultConfiguration.ASYNC_MODE`.
+DEFAULT_MODE = 'eventlet'
+
+_patched = None
+
+
+def read_mode():
+    ''' Reads ASYNC_MODE from resources/config.json. '''
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "config.json")
+    with open(path) as f:
+        return json.load(f).get("ASYNC_MODE", DEFAULT_MODE)
+
+def patch(mode=None):
+    ''' Selects the async mode (the configured one by default) and monkey
+        patches the standard library for green thread modes. Only the first
+        call has an effect.
+    '''
+    global _patched
+    if _patched is not None:
+        return
+    if mode is None:
+        mode = read_mode()
+    if mode not in ASYNC_MODES:
+        raise ValueError("Unknown async mode %s" % mode)
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    _patched = mode
+
+def get_mode():
+    ''' Returns the async mode selected by `patch`. '''
+    return _patched
+
+def get_socketio_mode():
+    ''' Async mode of Flask-SocketIO (unused by the asyncio server, which
+        only needs the handlers).
+    '''
+    return 'threading' if _patched == 'asyncio' else _patched
+
+def run_blocking(function, *args):
+    ''' Calls a function that blocks on the disk, in a native thread when
+        running on green threads.
+    '''
+    if _patched == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(function, *args)
+    if _patched == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    return function(*args)
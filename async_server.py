@@ -0,0 +1,186 @@
+''' asyncio server mode (config.ASYNC_MODE = 'asyncio').
+    Sockets are served by python-socketio's AsyncServer on aiohttp, with a
+    coroutine per event driving the handler registered for it with the
+    shared `socketio` server (see sockets.py). Handlers are generators
+    yielding the futures of their game's mailbox calls: their steps run on
+    the event loop, inside a Flask request context holding the socket's
+    session, and the coroutine awaits every future (and what the handler
+    sent) without blocking the loop or a thread.
+    Pages are served by the Flask app on the default executor, where they
+    wait for the mailbox like in the other modes.
+'''
+from config import global_config as config
+from engineio.async_aiohttp import make_response, translate_request
+from multidict import CIMultiDict
+from sockets import socketio as socket_handlers
+from wire_format import wire_formats
+import aiohttp.web
+import asyncio
+import flask
+import inspect
+import io
+import logging
+import socketio
+import threading
+
+
+class AsyncTransport(object):
+    ''' Sends through an AsyncServer. Sends made on the event loop thread are
+        started as tasks (collected in `pending` while a handler step runs),
+        sends made from other threads (coalesced broadcasts, the reaper,
+        pages) are handed over to the loop.
+    '''
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = None
+        self.loop_thread = None
+        # Tasks started by the running handler step.
+        self.pending = None
+
+    def start(self, loop):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+
+    def _submit(self, coroutine):
+        if threading.get_ident() != self.loop_thread:
+            asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+            return
+        task = self.loop.create_task(coroutine)
+        if self.pending is not None:
+            self.pending.append(task)
+
+    def emit(self, event, data, sid):
+        self._submit(self.server.emit(event, data, room=sid))
+
+    def broadcast(self, event, data, room):
+        self._submit(self.server.emit(event, data, room=room))
+
+    def join(self, room, sid):
+        self.server.enter_room(sid, room)
+
+
+class AsyncSocketServer(object):
+    ''' Serves a Flask app and its socket handlers from aiohttp. '''
+
+    def __init__(self, app, handlers):
+        self.app = app
+        self.server = socketio.AsyncServer(async_mode='aiohttp')
+        self.transport = AsyncTransport(self.server)
+        # WSGI environ of the handshake request of each socket, by sid.
+        self.environs = {}
+        self.web_app = aiohttp.web.Application()
+        self.server.attach(self.web_app)
+        self.web_app.router.add_route('*', '/{path:.*}', self.handle_http)
+        self.web_app.on_startup.append(self.start)
+
+        self.server.on('connect', self.connect)
+        for event, handler in handlers.items():
+            self.server.on(event, self.wrap(event, handler))
+
+    async def start(self, web_app):
+        self.transport.start(asyncio.get_event_loop())
+        wire_formats.transport = self.transport
+
+    async def connect(self, sid, environ):
+        environ = dict(environ)
+        # The body of the handshake request is never read.
+        environ['wsgi.input'] = io.BytesIO()
+        self.environs[sid] = environ
+
+    def wrap(self, event, handler):
+        async def handle(sid, *args):
+            try:
+                await self.dispatch(sid, event, handler, args)
+            finally:
+                if event == 'disconnect':
+                    self.environs.pop(sid, None)
+        return handle
+
+    async def dispatch(self, sid, event, handler, args):
+        ''' Runs a handler step by step, awaiting the mailbox future each
+            step yields and what it sent.
+        '''
+        environ = self.environs.get(sid)
+        if environ is None:
+            return
+        if not inspect.isgeneratorfunction(handler):
+            # Handlers that never wait run in a single step.
+            pending = self.run_step(sid, event, environ, lambda: handler(*args))[1]
+            for task in pending:
+                await task
+            return
+        steps = handler(*args)
+        advance = lambda: next(steps)
+        while True:
+            future, pending = self.run_step(sid, event, environ, advance)
+            for task in pending:
+                await task
+            if future is None:
+                return
+            try:
+                result = await asyncio.wrap_future(future)
+            except Exception as error:
+                advance = lambda: steps.throw(error)
+            else:
+                advance = lambda: steps.send(result)
+
+    def run_step(self, sid, event, environ, advance):
+        ''' Runs a step of a handler as Flask-SocketIO would (request
+            context with the socket's session, `request.sid`). Returns the
+            future it yielded (None once the handler is done) and the tasks
+            of what it sent.
+        '''
+        app = self.app
+        transport = self.transport
+        transport.pending = []
+        future = None
+        try:
+            with app.request_context(environ):
+                flask.request.sid = sid
+                flask.request.namespace = '/'
+                session = flask.session._get_current_object()
+                try:
+                    future = advance()
+                except StopIteration:
+                    future = None
+                except Exception:
+                    future = None
+                    logging.exception('[ASYNC] Handler of %s failed', event)
+                if getattr(session, 'modified', True):
+                    app.session_interface.save_session(app, session, app.response_class())
+            return future, transport.pending
+        finally:
+            transport.pending = None
+
+    async def handle_http(self, request):
+        ''' Serves a page through the Flask app, on the default executor. '''
+        environ = translate_request(request)
+        environ['wsgi.input'] = io.BytesIO(await request.read())
+        environ['wsgi.async'] = False
+        status, headers, body = await asyncio.get_event_loop().run_in_executor(
+            None, self.call_wsgi, environ
+        )
+        return make_response(status, CIMultiDict(headers), body)
+
+    def call_wsgi(self, environ):
+        response = []
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+        chunks = self.app(environ, start_response)
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return response[0], response[1], body
+
+    def run(self, host, port):
+        aiohttp.web.run_app(self.web_app, host=host, port=port)
+
+
+def run(app, host=None, port=None):
+    if config.MESSAGE_QUEUE:
+        raise ValueError("The asyncio server does not support a message queue")
+    # Same defaults as Flask-SocketIO.
+    AsyncSocketServer(app, socket_handlers.event_handlers).run(host or '127.0.0.1', port or 5000)
@@ -0,0 +1,118 @@
+from collections import deque
+from config import global_config as config
+from random import randrange, shuffle
+import time
+
+# Separates an avatar name from its copy number in avatar ids ("fox-2").
+COPY_SEPARATOR = '-'
+
+
+def expand_avatars(avatars, copies):
+    ''' Returns the ids of `copies` copies of every avatar. The first copy
+        keeps the plain avatar name, later ones are suffixed with their copy
+        number and share its image.
+    '''
+    avatar_ids = list(avatars)
+    for copy in range(2, copies + 1):
+        avatar_ids.extend('%s%s%d' % (avatar, COPY_SEPARATOR, copy) for avatar in avatars)
+    return tuple(avatar_ids)
+
+def get_avatar_ids(game_config):
+    ''' Ids of every avatar of a configuration (derived once per snapshot). '''
+    return expand_avatars(game_config.getAvatars(), game_config.AVATAR_COPIES)
+
+
+class AvatarPool(object):
+    ''' Per game avatar allocator.
+        Free avatars are kept in a list along with the position of each
+        avatar in it, so acquiring (a random or a preferred avatar) and
+        releasing are O(1) swaps with the last element.
+        Avatars of disconnected clients can be reserved for
+        `reservation_time` seconds, so the client gets them back when it
+        reconnects. Expired reservations are released lazily, in the order
+        they were made.
+    '''
+
+    def __init__(self, avatars, reservation_time):
+        # Avatars available for new players.
+        self.free = list(avatars)
+        shuffle(self.free)
+        # Position of each free avatar in `free`.
+        self.positions = {avatar: position for position, avatar in enumerate(self.free)}
+        # Seconds a reserved avatar is kept for its client.
+        self.reservation_time = reservation_time
+        # Expiry time of each reserved avatar.
+        self.reserved = {} # Dict[str, float]
+        # (expiry time, avatar) of reservations, oldest first.
+        self.reservations = deque()
+
+    @classmethod
+    def from_config(cls, game_config=None):
+        game_config = game_config or config.snapshot()
+        return cls(game_config.derive('avatar_ids', get_avatar_ids), game_config.AVATAR_RESERVATION_TIME)
+
+    def get_num_free(self):
+        return len(self.free)
+
+    def get_num_reserved(self):
+        return len(self.reserved)
+
+    def acquire(self, pref=None):
+        ''' Takes the preferred avatar if it is free, otherwise a random one. '''
+        self._expire_reservations()
+        if pref is not None and pref in self.positions:
+            return self._take(self.positions[pref])
+        if not self.free:
+            raise ValueError('Out of avatars')
+        return self._take(randrange(len(self.free)))
+
+    def release(self, avatar):
+        ''' Returns an avatar to the free list. '''
+        if avatar in self.positions:
+            return
+        self.reserved.pop(avatar, None)
+        self.positions[avatar] = len(self.free)
+        self.free.append(avatar)
+
+    def reserve(self, avatar):
+        ''' Keeps an avatar aside until its reservation expires. '''
+        expiry = time.time() + self.reservation_time
+        self.reserved[avatar] = expiry
+        self.reservations.append((expiry, avatar))
+
+    def reclaim(self, avatar):
+        ''' Takes back a reserved avatar, or acquires it (or another one if it
+            was taken meanwhile) once the reservation is gone.
+        '''
+        if self.reserved.pop(avatar, None) is not None:
+            return avatar
+        return self.acquire(pref=avatar)
+
+    def claim(self, avatar):
+        ''' Takes a given avatar if it is reserved or free (replaying the
+            avatar chosen for a player, see `ClientManager.apply`).
+        '''
+        if self.reserved.pop(avatar, None) is not None:
+            return avatar
+        if avatar in self.positions:
+            self._take(self.positions[avatar])
+        return avatar
+
+    def _take(self, position):
+        free = self.free
+        avatar = free[position]
+        last = free.pop()
+        if last is not avatar:
+            free[position] = last
+            self.positions[last] = position
+        del self.positions[avatar]
+        return avatar
+
+    def _expire_reservations(self):
+        now = time.time()
+        reservations = self.reservations
+        while reservations and reservations[0][0] <= now:
+            expiry, avatar = reservations.popleft()
+            # Skip reservations that were reclaimed or renewed since.
+            if self.reserved.get(avatar) == expiry:
+                self.release(avatar)
@@ -0,0 +1,79 @@
+''' Micro-benchmark of per-guess latency and memory of the game board.
+    Compares the previous list-of-Card deck (linear word scan, Enum status on
+    every Card) against the indexed, bytearray-backed `Board`.
+
+    Run from the repository root:
+        python -m benchmarks.board_bench
+'''
+from board import Board
+from card import Card, CardStatus
+import random
+import timeit
+import tracemalloc
+
+SIZES = [25, 100, 400, 1600]
+GUESSES = 20000
+
+
+class ListDeck(object):
+    ''' Reference implementation of the deck before `Board`. '''
+
+    def __init__(self, words, solution):
+        self.deck = [Card(word, position) for position, word in enumerate(words)]
+        self.solution = [CardStatus(status) for status in solution]
+
+    def get_card_by_word(self, word):
+        for card in self.deck:
+            if (card.get_word() == word):
+                return card
+        return None
+
+    def reveal(self, word):
+        card = self.get_card_by_word(word)
+        card.set_status(self.solution[card.get_position()])
+
+
+class IndexedDeck(object):
+    def __init__(self, words, solution):
+        self.board = Board(words, solution)
+
+    def reveal(self, word):
+        self.board.reveal(self.board.get_index(word))
+
+
+def make_board_inputs(size):
+    words = ['word%d' % i for i in range(size)]
+    solution = bytearray(random.choice([1, 2, 3]) for _ in range(size))
+    return words, solution
+
+
+def measure_guess(deck_cls, words, solution):
+    ''' Mean seconds per guess (lookup + reveal) over random words. '''
+    deck = deck_cls(words, solution)
+    guesses = [random.choice(words) for _ in range(GUESSES)]
+    elapsed = timeit.timeit(lambda: [deck.reveal(word) for word in guesses], number=1)
+    return elapsed / GUESSES
+
+
+def measure_memory(deck_cls, words, solution):
+    ''' Peak bytes allocated while building one deck (words excluded). '''
+    tracemalloc.start()
+    deck_cls(words, solution)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    random.seed(0)
+    print('%6s %-12s %14s %12s' % ('cards', 'deck', 'ns/guess', 'bytes'))
+    for size in SIZES:
+        words, solution = make_board_inputs(size)
+        for name, deck_cls in [('list', ListDeck), ('indexed', IndexedDeck)]:
+            latency = measure_guess(deck_cls, words, solution)
+            memory = measure_memory(deck_cls, words, solution)
+            print('%6d %-12s %14.1f %12d' % (size, name, latency * 1e9, memory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+''' Benchmark of concurrent socket capacity per async mode (see
+    async_mode.py). For every mode a server is started on its own, then
+    lobby sockets (engine.io long-polling, 8 per game) are opened in
+    growing steps and kept open. Every step reports the client_connect ->
+    client_set_id round trip of the new sockets and the server's RSS. A mode
+    tops out at the last step where at most 1% of the sockets failed and the
+    p99 round trip stayed within the latency budget.
+
+    Needs aiohttp (and the packages of each mode). Run from the repository
+    root:
+        python -m benchmarks.capacity_bench --modes eventlet asyncio --output capacity.json
+'''
+from client_manager import ClientEvent
+import aiohttp
+import argparse
+import asyncio
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+
+GAME_CODE_PATTERN = re.compile(r'/l/([a-z0-9]+)')
+
+# Serves the app in a given mode (configuration is read from the usual file,
+# the mode is selected before the app module is imported).
+LAUNCHER = '''
+import async_mode
+async_mode.patch(%r)
+import app
+app.run_server('127.0.0.1', %d)
+'''
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def within_budget(step, latency_budget):
+    ''' At most 1% failed connects, and a p99 round trip within budget. '''
+    if step['p99_ms'] is None:
+        return False
+    return step['failed'] <= 0.01 * step['sockets'] and step['p99_ms'] <= latency_budget
+
+
+def get_rss_bytes(pid):
+    with open('/proc/%d/statm' % pid) as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def encode_payload(packets):
+    ''' Engine.IO (v3) text payload. '''
+    return ''.join('%d:%s' % (len(packet), packet) for packet in packets)
+
+
+def decode_payload(payload):
+    packets = []
+    while payload:
+        length, _, payload = payload.partition(':')
+        packets.append(payload[:int(length)])
+        payload = payload[int(length):]
+    return packets
+
+
+class Socket(object):
+    ''' One long-polling lobby socket, with its own session cookie. '''
+
+    def __init__(self, base_url, connector):
+        self.base_url = base_url
+        self.http = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(unsafe=True)
+        )
+        self.url = None
+        self.tasks = []
+        self.events = asyncio.Queue()
+
+    async def connect(self, game_code):
+        ''' Joins a lobby, returning the client_connect round trip. '''
+        async with self.http.get('%s/l/%s' % (self.base_url, game_code)) as response:
+            await response.read()
+        handshake = '%s/socket.io/?EIO=3&transport=polling&b64=1' % self.base_url
+        async with self.http.get(handshake) as response:
+            packets = decode_payload(await response.text())
+        options = json.loads(packets[0][1:])
+        self.url = '%s&sid=%s' % (handshake, options['sid'])
+        self.tasks = [
+            asyncio.ensure_future(self.poll()),
+            asyncio.ensure_future(self.ping(options['pingInterval'] / 1000)),
+        ]
+        start = time.perf_counter()
+        await self.send('42' + json.dumps([ClientEvent.CONNECT.value, None]))
+        while True:
+            event = await self.events.get()
+            if event == ClientEvent.SET_ID.value:
+                return time.perf_counter() - start
+
+    async def send(self, packet):
+        async with self.http.post(self.url, data=encode_payload([packet])) as response:
+            await response.read()
+
+    async def poll(self):
+        while True:
+            async with self.http.get(self.url) as response:
+                payload = await response.text()
+            for packet in decode_payload(payload):
+                if packet.startswith('42'):
+                    self.events.put_nowait(json.loads(packet[2:])[0])
+
+    async def ping(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.send('2')
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await self.http.close()
+
+
+async def create_game(http, base_url):
+    async with http.get(base_url + '/create') as response:
+        return GAME_CODE_PATTERN.search(await response.text()).group(1)
+
+
+async def wait_until_up(http, base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with http.get(base_url + '/') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError('Server did not start')
+        await asyncio.sleep(0.2)
+
+
+async def measure_mode(mode, args):
+    server = subprocess.Popen([sys.executable, '-c', LAUNCHER % (mode, args.port)])
+    base_url = 'http://127.0.0.1:%d' % args.port
+    connector = aiohttp.TCPConnector(limit=0)
+    http = aiohttp.ClientSession(connector=connector, connector_owner=False)
+    sockets = []
+    steps = []
+    try:
+        await wait_until_up(http, base_url)
+        game_code = None
+        concurrency = asyncio.Semaphore(args.concurrency)
+
+        async def open_socket(socket, game_code):
+            async with concurrency:
+                return await asyncio.wait_for(socket.connect(game_code), args.timeout)
+
+        for target in args.steps:
+            opening = []
+            while len(sockets) < target:
+                if len(sockets) % args.sockets_per_game == 0:
+                    game_code = await create_game(http, base_url)
+                socket = Socket(base_url, connector)
+                sockets.append(socket)
+                opening.append(open_socket(socket, game_code))
+            results = await asyncio.gather(*opening, return_exceptions=True)
+            latencies = [result for result in results if isinstance(result, float)]
+            failed = len(results) - len(latencies)
+            step = {
+                'sockets': target,
+                'failed': failed,
+                'p50_ms': percentile(latencies, 0.50) * 1e3 if latencies else None,
+                'p99_ms': percentile(latencies, 0.99) * 1e3 if latencies else None,
+                'server_rss_bytes': get_rss_bytes(server.pid),
+            }
+            steps.append(step)
+            print('%-10s %6d sockets  failed %5d  p50 %8.1f ms  p99 %8.1f ms  rss %6.1f MB' % (
+                mode, target, failed, step['p50_ms'] or 0, step['p99_ms'] or 0,
+                step['server_rss_bytes'] / 2**20))
+            if not within_budget(step, args.latency_budget):
+                break
+            await asyncio.sleep(args.hold)
+    finally:
+        for socket in sockets:
+            await socket.close()
+        await http.close()
+        connector.close()
+        server.terminate()
+        server.wait()
+
+    passing = [step['sockets'] for step in steps if within_budget(step, args.latency_budget)]
+    return {'mode': mode, 'capacity': max(passing) if passing else 0, 'steps': steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['eventlet', 'gevent', 'threading', 'asyncio'])
+    parser.add_argument('--steps', nargs='+', type=int, default=[100, 250, 500, 1000, 2000, 4000, 8000])
+    parser.add_argument('--sockets-per-game', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=100, help='sockets connecting at once')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds before a connect fails')
+    parser.add_argument('--latency-budget', type=float, default=1000.0, help='p99 round trip, in ms')
+    parser.add_argument('--hold', type=float, default=5.0, help='seconds to hold every step')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    # Every socket holds a long-polling connection.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    loop = asyncio.get_event_loop()
+    results = [loop.run_until_complete(measure_mode(mode, args)) for mode in args.modes]
+    for result in results:
+        print('%-10s capacity %d sockets' % (result['mode'], result['capacity']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
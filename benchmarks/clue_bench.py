@@ -0,0 +1,51 @@
+''' Benchmark of clue ranking time per board (see clue_suggester.py), over
+    the built index if there is one, else over random unit vectors of the
+    default index size.
+
+    Run from the repository root:
+        python -m benchmarks.clue_bench
+'''
+from card import CardStatus
+from clue_suggester import ClueIndex, ClueSuggester
+from game import CodenameGame
+import numpy as np
+import time
+
+BOARDS = 200
+VOCABULARY_SIZE = 20000
+DIMS = 128
+
+
+def random_index(boards):
+    words = sorted(set(word for board in boards for word in board.words))
+    words += ['clue%d' % i for i in range(VOCABULARY_SIZE)]
+    vectors = np.random.randn(len(words), DIMS).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return ClueIndex(vectors, words)
+
+
+def main():
+    boards = [CodenameGame().board for _ in range(BOARDS)]
+    clue_suggester = ClueSuggester.get()
+    if clue_suggester is not None:
+        index = clue_suggester.index
+    else:
+        index = random_index(boards)
+    suggester = ClueSuggester(index, 10, BOARDS)
+    timings = []
+    for board in boards:
+        start = time.perf_counter()
+        suggester.suggest(board, CardStatus.RED)
+        timings.append((time.perf_counter() - start) * 1e3)
+    start = time.perf_counter()
+    for board in boards:
+        suggester.suggest(board, CardStatus.RED)
+    cached_us = (time.perf_counter() - start) / BOARDS * 1e6
+    timings.sort()
+    print('vocabulary     %d words x %d dims' % index.vectors.shape)
+    print('ranking        p50 %.2f ms  p99 %.2f ms' % (timings[len(timings) // 2], timings[int(len(timings) * 0.99)]))
+    print('cached         %.1f us' % cached_us)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+''' Headless load generator for the lobby and game socket flow.
+    Simulated browsers go through the full flow with Flask's test client and
+    the Flask-SocketIO test client, in-process:
+        /create, /l/<code>, client_connect, client_add_player, team and role
+        switches, client_init_start_game, /g/<code>, client_connect,
+        game_sync, then submit_clue / choose_word until the game is over.
+    Reports p50/p95/p99 event-to-broadcast latency per event, throughput and
+    RSS growth, and writes them as JSON.
+
+    Run from the repository root:
+        python -m benchmarks.load_bench --games 200 --browsers 4 --output load.json
+'''
+from app import app
+from client_manager import ClientEvent
+from config import global_config as config
+from game import GameEvent
+from sockets import socketio
+import argparse
+import json
+import logging
+import platform
+import re
+import resource
+import time
+
+GAME_CODE_PATTERN = re.compile(r'/l/([a-z0-9]+)')
+
+
+def get_rss_bytes():
+    ''' Current resident set size (peak RSS where /proc is unavailable). '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Browser(object):
+    ''' One simulated browser: an HTTP client (holding the session cookie)
+        and its current socket connection.
+    '''
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.http = app.test_client()
+        self.socket = None
+        self.client_id = None
+        self.player_ids = []
+
+    def get(self, path):
+        response = self.http.get(path)
+        if response.status_code >= 400:
+            raise RuntimeError('GET %s failed with %d' % (path, response.status_code))
+        return response.get_data(as_text=True)
+
+    def connect(self):
+        cookie = '; '.join('%s=%s' % (c.name, c.value) for c in self.http.cookie_jar)
+        self.socket = socketio.test_client(app, headers={'Cookie': cookie})
+
+    def disconnect(self):
+        self.socket.disconnect()
+        self.socket = None
+
+    def emit(self, event, *args):
+        ''' Emits an event, recording the time until the server has handled
+            it and sent every resulting broadcast (the test client delivers
+            them synchronously).
+        '''
+        start = time.perf_counter()
+        self.socket.emit(event, *args)
+        self.recorder.record(event, time.perf_counter() - start)
+        return self.receive()
+
+    def receive(self):
+        received = self.socket.get_received()
+        for message in received:
+            if message['name'] in (ClientEvent.SET_ID.value, ClientEvent.RECEIVE_PLAYERS.value):
+                self.client_id = message['args'][0]['client_id']
+                self.player_ids = message['args'][0]['players']
+            elif message['name'] == 'error':
+                raise RuntimeError('Server error: %s' % message['args'][0])
+        return received
+
+
+class Recorder(object):
+    def __init__(self):
+        self.latencies = {}
+
+    def record(self, event, seconds):
+        self.latencies.setdefault(event, []).append(seconds)
+
+    def summary(self):
+        return {
+            event: {
+                'count': len(values),
+                'p50_ms': percentile(values, 0.50) * 1e3,
+                'p95_ms': percentile(values, 0.95) * 1e3,
+                'p99_ms': percentile(values, 0.99) * 1e3,
+            }
+            for event, values in self.latencies.items()
+        }
+
+    def count(self):
+        return sum(len(values) for values in self.latencies.values())
+
+
+def latest(received, event):
+    ''' Returns the payload of the last `event` message received, if any. '''
+    payloads = [m['args'][0] for m in received if m['name'] == event]
+    return payloads[-1] if payloads else None
+
+
+def run_lobby(browsers):
+    ''' Creates a game and brings every browser through the lobby. '''
+    host = browsers[0]
+    game_code = GAME_CODE_PATTERN.search(host.get('/create')).group(1)
+    for browser in browsers:
+        browser.get('/l/%s' % game_code)
+        browser.connect()
+        browser.emit(ClientEvent.CONNECT.value, None)
+    for browser in browsers:
+        browser.emit(ClientEvent.ADD_PLAYER.value)
+    for browser in browsers:
+        # Switch back and forth so the final teams stay valid.
+        for event in (ClientEvent.SWITCH_TEAM, ClientEvent.SWITCH_TEAM,
+                      ClientEvent.SWITCH_ROLE, ClientEvent.SWITCH_ROLE):
+            browser.emit(event.value, browser.player_ids[0])
+    host.emit(ClientEvent.INIT_START_GAME.value)
+    return game_code
+
+
+def run_game(browsers, game_code):
+    ''' Moves every browser to the game page, then plays until the game is
+        over (every card of a team, or the bomb, revealed).
+    '''
+    for browser in browsers:
+        browser.disconnect()
+        browser.get('/g/%s' % game_code)
+    game_bundle = None
+    for browser in browsers:
+        browser.connect()
+        browser.emit(ClientEvent.CONNECT.value, {'client_id': browser.client_id})
+        game_bundle = latest(browser.emit(GameEvent.SYNC.value), GameEvent.UPDATE.value)
+
+    deck = game_bundle['deck']
+    unrevealed = [card['word'] for card in deck]
+    turn = 0
+    while unrevealed:
+        browser = browsers[turn % len(browsers)]
+        turn += 1
+        if game_bundle['currentRole'] == 'Spymaster':
+            received = browser.emit(GameEvent.SUBMIT_CLUE.value, {'word': 'clue', 'number': 2})
+        else:
+            received = browser.emit(GameEvent.CHOOSE_WORD.value, unrevealed.pop())
+        patch = latest(received, GameEvent.PATCH.value)
+        for card in patch['cards']:
+            deck[card['index']]['status'] = card['status']
+        game_bundle.update(patch)
+        if any(card['status'] == 'BOMB' for card in deck) or \
+           patch['redCount'] == config.getNumReds() or \
+           patch['blueCount'] == config.getNumBlues():
+            break
+    for browser in browsers:
+        browser.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--browsers', type=int, default=4, help='browsers per game (at least 4)')
+    parser.add_argument('--output', default='load_bench.json')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    recorder = Recorder()
+    rss_start = get_rss_bytes()
+    start = time.perf_counter()
+    for _ in range(args.games):
+        browsers = [Browser(recorder) for _ in range(args.browsers)]
+        game_code = run_lobby(browsers)
+        run_game(browsers, game_code)
+    elapsed = time.perf_counter() - start
+    rss_end = get_rss_bytes()
+
+    results = {
+        'python': platform.python_version(),
+        'games': args.games,
+        'browsers_per_game': args.browsers,
+        'elapsed_s': elapsed,
+        'events': recorder.count(),
+        'events_per_s': recorder.count() / elapsed,
+        'games_per_s': args.games / elapsed,
+        'rss_start_bytes': rss_start,
+        'rss_end_bytes': rss_end,
+        'rss_growth_bytes': rss_end - rss_start,
+        'latency': recorder.summary(),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
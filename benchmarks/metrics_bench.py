@@ -0,0 +1,35 @@
+''' Benchmark of the per-event instrumentation overhead.
+    Times a full event (start, four phase marks and stop, i.e. what every
+    socket handler records) and a single histogram observation.
+
+    Run from the repository root:
+        python -m benchmarks.metrics_bench
+'''
+from metrics import Metrics, SESSION, QUEUE, MUTATION, SERIALIZATION
+import timeit
+
+EVENTS = 200000
+
+
+def time_event(metrics):
+    timer = metrics.time_event('choose_word')
+    timer.mark(SESSION)
+    timer.mark(QUEUE)
+    timer.mark(MUTATION)
+    timer.mark(SERIALIZATION)
+    timer.stop()
+
+
+def main():
+    metrics = Metrics()
+    event_seconds = min(timeit.repeat(lambda: time_event(metrics), number=EVENTS, repeat=3))
+    histogram = metrics.event_histograms['choose_word'][SESSION]
+    observe_seconds = min(timeit.repeat(lambda: histogram.observe(12345), number=EVENTS, repeat=3))
+    print('timed event (5 phases):  %.0f ns' % (event_seconds / EVENTS * 1e9))
+    print('histogram observation:   %.0f ns' % (observe_seconds / EVENTS * 1e9))
+    print('render (%d events):      %.3f ms' % (
+        len(metrics.event_histograms), timeit.timeit(metrics.render, number=10) / 10 * 1e3))
+
+
+if __name__ == '__main__':
+    main()
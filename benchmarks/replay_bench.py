@@ -0,0 +1,106 @@
+''' Benchmark of rebuilding games from their recorded events (see
+    game_events.py). Bot games (lobby of 4 clients, then clues and guesses of
+    `NoisyPolicy` bots) are recorded like the game store does, with a
+    snapshot every config.SNAPSHOT_INTERVAL events. Reports the throughput
+    of replaying every event from the initial snapshot, and the time to
+    rebuild each finished game from its latest snapshot plus the tail of
+    events after it, as on recovery.
+
+    Run from the repository root:
+        python -m benchmarks.replay_bench
+'''
+from client_manager import ClientEvent
+from config import global_config as config
+from game import GameEvent
+from game_code import GameCode
+from game_manager import GameManager
+from simulator import NoisyPolicy
+import pickle
+import random
+import time
+
+GAMES = 500
+CLIENTS = 4
+
+
+def record_game(rng):
+    ''' Plays a game, returning its initial snapshot, its records, and its
+        latest snapshot with the number of records it includes.
+    '''
+    game_manager = GameManager(GameCode('bench'))
+    initial = pickle.dumps(game_manager, pickle.HIGHEST_PROTOCOL)
+    records = []
+    latest = [initial, 0]
+
+    def journal(game_manager, new_records):
+        records.extend(new_records)
+        seq = game_manager.event_seq
+        if (seq - len(new_records)) // config.SNAPSHOT_INTERVAL != seq // config.SNAPSHOT_INTERVAL:
+            latest[:] = [pickle.dumps(game_manager, pickle.HIGHEST_PROTOCOL), seq]
+    game_manager.journal = journal
+
+    clients = [
+        game_manager.handle_client_event(None, ClientEvent.CONNECT, None)[0]
+        for _ in range(CLIENTS)
+    ]
+    for client in clients:
+        game_manager.handle_client_event(client.id, ClientEvent.ADD_PLAYER, None)
+    client_id = clients[0].id
+    game_manager.handle_client_event(client_id, ClientEvent.INIT_START_GAME, '/g')
+
+    game = game_manager.game
+    policy = NoisyPolicy(rng)
+    while game.winner is None:
+        team, role = game.get_current_turn()
+        word, number = policy.get_clue(game, team)
+        game_manager.handle_game_event(client_id, GameEvent.SUBMIT_CLUE, {'word': word, 'number': number})
+        while game.winner is None and game.get_current_turn()[0] is team:
+            word = policy.get_guess(game, team)
+            if word is None:
+                # No socket event ends a turn early, recorded with the next one.
+                game.end_turn()
+                break
+            game_manager.handle_game_event(client_id, GameEvent.CHOOSE_WORD, word)
+    return initial, records, latest[0], latest[1]
+
+
+def replay(snapshot, records, first_seq):
+    game_manager = pickle.loads(snapshot)
+    for seq, record in enumerate(records, first_seq):
+        game_manager.replay_event(seq, record)
+    return game_manager
+
+
+def main():
+    rng = random.Random(0)
+    games = [record_game(rng) for _ in range(GAMES)]
+    num_events = sum(len(records) for _, records, _, _ in games)
+
+    # Replaying from the initial snapshot, without the snapshot load.
+    snapshots = [pickle.loads(initial) for initial, _, _, _ in games]
+    start = time.perf_counter()
+    for game_manager, (_, records, _, _) in zip(snapshots, games):
+        for seq, record in enumerate(records, 1):
+            game_manager.replay_event(seq, record)
+    elapsed = time.perf_counter() - start
+
+    rebuilds = []
+    tails = []
+    for _, records, latest, latest_seq in games:
+        tail = records[latest_seq:]
+        start = time.perf_counter()
+        replay(latest, tail, latest_seq + 1)
+        rebuilds.append((time.perf_counter() - start) * 1e6)
+        tails.append(len(tail))
+    rebuilds.sort()
+
+    print('games          %d (%.1f events each, snapshot every %d)' % (
+        GAMES, num_events / GAMES, config.SNAPSHOT_INTERVAL))
+    print('replay         %.0f events/s' % (num_events / elapsed))
+    print('rebuild        p50 %.0f us  p99 %.0f us  (tail of %.1f events on average, %d at most)' % (
+        rebuilds[len(rebuilds) // 2], rebuilds[int(len(rebuilds) * 0.99)],
+        sum(tails) / len(tails), max(tails)))
+
+
+if __name__ == '__main__':
+    main()
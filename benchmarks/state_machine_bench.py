@@ -0,0 +1,100 @@
+''' Benchmark of game/turn state machine construction and transitions.
+    Compares per-instance `transitions.Machine` models (the previous
+    implementation, only measured if the `transitions` package is installed)
+    against the class-level tables of `StateMachine`.
+
+    Run from the repository root:
+        python -m benchmarks.state_machine_bench
+'''
+from player import PlayerTeam, PlayerRole
+from state_machine import StateMachine
+from turn_manager import TurnManager
+import timeit
+
+try:
+    from transitions import Machine
+except ImportError:
+    Machine = None
+
+CREATIONS = 20000
+TRANSITIONS = 200000
+
+# Same table as GameManager, without building a CodenameGame per instance.
+LIFECYCLE_STATES = ['IN_LOBBY', 'IN_GAME', 'IN_ENDSCREEN']
+LIFECYCLE_TRANSITIONS = [
+    ['start_game', 'IN_LOBBY', 'IN_GAME'],
+    ['pause_game', 'IN_GAME', 'IN_LOBBY'],
+    ['game_over', 'IN_GAME', 'IN_ENDSCREEN'],
+]
+
+
+class Lifecycle(StateMachine):
+    states = LIFECYCLE_STATES
+    transitions = LIFECYCLE_TRANSITIONS
+
+
+class MachineLifecycle(object):
+    def __init__(self):
+        self.machine = Machine(model=self, states=LIFECYCLE_STATES,
+                               transitions=LIFECYCLE_TRANSITIONS,
+                               initial='IN_LOBBY')
+
+
+class MachineTurnManager(object):
+    ''' TurnManager as implemented on top of `transitions.Machine`. '''
+
+    def __init__(self, starting_team):
+        self.machine = Machine(model=self, states=TurnManager.states,
+                               transitions=TurnManager.transitions,
+                               initial=TurnManager.create_state(starting_team, PlayerRole.SPYMASTER))
+
+    def get_current_turn_team_role(self):
+        team_raw, role_raw = self.state.split()
+        return PlayerTeam(team_raw), PlayerRole(role_raw)
+
+
+def measure_creation(make_lifecycle, make_turn_manager):
+    ''' Games per second, creating one lifecycle and one turn machine each. '''
+    elapsed = timeit.timeit(
+        lambda: (make_lifecycle(), make_turn_manager(PlayerTeam.RED)),
+        number=CREATIONS
+    )
+    return CREATIONS / elapsed
+
+
+def measure_next_turn(turn_manager):
+    ''' Nanoseconds per `next_turn` followed by a turn lookup. '''
+    def step():
+        turn_manager.next_turn()
+        turn_manager.get_current_turn_team_role()
+    return timeit.timeit(step, number=TRANSITIONS) / TRANSITIONS * 1e9
+
+
+def measure_lifecycle(make_lifecycle):
+    ''' Nanoseconds per `start_game` + `pause_game` round trip. '''
+    lifecycle = make_lifecycle()
+    def step():
+        lifecycle.start_game()
+        lifecycle.pause_game()
+    return timeit.timeit(step, number=TRANSITIONS) / TRANSITIONS * 1e9
+
+
+def main():
+    implementations = [('table', lambda: Lifecycle('IN_LOBBY'), TurnManager)]
+    if Machine is not None:
+        implementations.insert(0, ('transitions', MachineLifecycle, MachineTurnManager))
+    else:
+        print('transitions is not installed, skipping the baseline')
+
+    print('%-12s %14s %14s %18s' % ('machine', 'games/s', 'ns/next_turn', 'ns/start+pause'))
+    for name, make_lifecycle, make_turn_manager in implementations:
+        print('%-12s %14.0f %14.1f %18.1f' % (
+            name,
+            measure_creation(make_lifecycle, make_turn_manager),
+            measure_next_turn(make_turn_manager(PlayerTeam.BLUE)),
+            measure_lifecycle(make_lifecycle),
+        ))
+
+
+if __name__ == '__main__':
+    main()
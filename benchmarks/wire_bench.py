@@ -0,0 +1,62 @@
+''' Benchmark of socket payload size and encode time, JSON against the
+    MessagePack wire format (see wire_format.py), for a full game_update
+    snapshot (mid-game, with an activity log) and a client_update lobby
+    broadcast of a full room.
+
+    Run from the repository root:
+        python -m benchmarks.wire_bench
+'''
+from client_manager import ClientEvent, ClientManager
+from game import CodenameGame
+import json
+import timeit
+import wire_format
+
+ENCODES = 5000
+CLIENTS = 10
+PLAYERS_PER_CLIENT = 2
+
+
+def game_update_payload():
+    game = CodenameGame()
+    for word in game.board.words[:6]:
+        if game.current_clue is None or game.guesses_left == 0:
+            game.set_current_clue('clue', 3)
+        try:
+            game.make_guess(word)
+        except Exception:
+            pass
+    return game.serialize()
+
+
+def client_update_payload():
+    client_manager = ClientManager()
+    for _ in range(CLIENTS):
+        client, _ = client_manager.handle_event(None, None, ClientEvent.CONNECT, None)
+        for _ in range(PLAYERS_PER_CLIENT):
+            client_manager.handle_event(None, client.id, ClientEvent.ADD_PLAYER, None)
+    return client_manager.get_lobby_bundle()
+
+
+def measure(name, payload):
+    # Socket.IO serializes JSON payloads with json.dumps.
+    json_size = len(json.dumps(payload).encode('utf-8'))
+    json_us = timeit.timeit(lambda: json.dumps(payload), number=ENCODES) / ENCODES * 1e6
+    print('%-14s json     %6d bytes  %7.1f us' % (name, json_size, json_us))
+    if wire_format.msgpack is None:
+        print('%-14s msgpack  (msgpack is not installed)' % name)
+        return
+    encode = lambda: wire_format.encode(payload, wire_format.MSGPACK)
+    msgpack_size = len(encode())
+    msgpack_us = timeit.timeit(encode, number=ENCODES) / ENCODES * 1e6
+    print('%-14s msgpack  %6d bytes  %7.1f us  (%.0f%% of json)' % (
+        name, msgpack_size, msgpack_us, 100.0 * msgpack_size / json_size))
+
+
+def main():
+    measure('game_update', game_update_payload())
+    measure('client_update', client_update_payload())
+
+
+if __name__ == '__main__':
+    main()
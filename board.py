@@ -0,0 +1,81 @@
+from array import array
+from card import Card, CardStatus
+
+# CardStatus members indexed by their value, so buffer bytes can be turned
+# back into statuses without an Enum lookup.
+STATUSES = tuple(sorted(CardStatus, key=lambda status: status.value))
+STATUS_NAMES = tuple(status.name for status in STATUSES)
+
+
+class Board(object):
+    ''' Compact, index-based representation of the game deck.
+        Words are looked up through a word to position hash, while the
+        revealed statuses and the solution (see `MapCard.map`) are kept in
+        parallel bytearrays holding `CardStatus` values.
+    '''
+
+    def __init__(self, words, solution):
+        # Words on the board, by position (Immutable).
+        self.words = list(words)
+        # Word to board position mapping (Immutable).
+        self.word_index = {word: position for position, word in enumerate(self.words)}
+        # Revealed status of each position, EMPTY until guessed (Mutable).
+        self.statuses = bytearray(len(self.words))
+        # Actual status of each position (Immutable).
+        self.solution = solution
+        # Number of revealed / remaining cards per status (Mutable).
+        self.revealed = array('H', [0] * len(STATUSES))
+        self.remaining = array('H', [0] * len(STATUSES))
+        for status in self.solution:
+            self.remaining[status] += 1
+
+    def get_size(self):
+        return len(self.words)
+
+    def get_index(self, word):
+        ''' Returns the board position of a word, or None if not on the board. '''
+        return self.word_index.get(word)
+
+    def get_word(self, index):
+        return self.words[index]
+
+    def get_status(self, index):
+        ''' Returns the revealed status at a board position. '''
+        return STATUSES[self.statuses[index]]
+
+    def get_solution(self, index):
+        ''' Returns the actual status at a board position. '''
+        return STATUSES[self.solution[index]]
+
+    def get_card(self, index):
+        ''' Returns a Card snapshot of a board position. '''
+        card = Card(self.words[index], index)
+        card.set_status(self.get_status(index))
+        return card
+
+    def is_revealed(self, index):
+        return self.statuses[index] != CardStatus.EMPTY.value
+
+    def reveal(self, index):
+        ''' Reveals the actual status of a board position, updating the
+            per-status counters, and returns that status.
+        '''
+        status = self.solution[index]
+        if self.statuses[index] != status:
+            self.statuses[index] = status
+            self.revealed[status] += 1
+            self.remaining[status] -= 1
+        return STATUSES[status]
+
+    def get_num_revealed(self, status):
+        return self.revealed[status.value]
+
+    def get_num_remaining(self, status):
+        return self.remaining[status.value]
+
+    def serialize(self):
+        ''' Serializes each card's word and revealed status to JSON. '''
+        return [
+            {"status": STATUS_NAMES[status], "word": word}
+            for word, status in zip(self.words, self.statuses)
+        ]
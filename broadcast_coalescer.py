@@ -0,0 +1,131 @@
+from concurrent.futures import Future
+from config import global_config as config
+import heapq
+import logging
+from metrics import metrics
+import threading
+import time
+from wire_format import wire_formats
+
+
+class BroadcastCoalescer(object):
+    ''' Limits a room to one broadcast of an event per `window` seconds.
+        The first broadcast after a quiet window is sent right away; the ones
+        requested within the window are merged into a single broadcast sent
+        when the window closes, built from the state at that time, so rooms
+        always end up with the latest state. The data may be built
+        asynchronously (e.g. on a game's mailbox): a broadcast whose `build`
+        returns a Future is sent once the Future is done, without waiting
+        for it.
+    '''
+
+    def __init__(self, window, send):
+        # Minimum seconds between two broadcasts to a room.
+        self.window = window
+        # Callback sending (event, data, room).
+        self.send = send
+        # Time of the last broadcast to each room.
+        self.last_sent = {} # Dict[str, float]
+        # Broadcast waiting for the window of each room to close, as
+        # (event, function building the data).
+        self.pending = {} # Dict[str, (str, Callable[[], dict])]
+        # Heap of (deadline, room) of pending broadcasts.
+        self.deadlines = []
+        self.condition = threading.Condition()
+        self.thread = None
+        # Broadcast metrics.
+        self.requested = 0
+        self.sent = 0
+
+    def get_metrics(self):
+        return {
+            'requested': self.requested,
+            'sent': self.sent,
+            'suppressed': self.requested - self.sent - len(self.pending),
+            'pending': len(self.pending),
+        }
+
+    def request(self, room, event, build):
+        ''' Requests a broadcast of `event` to a room, with data returned by
+            `build` when it is actually sent.
+        '''
+        now = time.monotonic()
+        with self.condition:
+            self.requested += 1
+            if room in self.pending:
+                self.pending[room] = (event, build)
+                return
+            last_sent = self.last_sent.get(room)
+            if last_sent is not None and now - last_sent < self.window:
+                self.pending[room] = (event, build)
+                heapq.heappush(self.deadlines, (last_sent + self.window, room))
+                self._start()
+                self.condition.notify()
+                return
+            self.last_sent[room] = now
+        self._send(room, event, build)
+
+    def discard(self, room):
+        ''' Forgets a room (e.g. when its game is removed). '''
+        with self.condition:
+            self.last_sent.pop(room, None)
+            self.pending.pop(room, None)
+
+    def _send(self, room, event, build):
+        self.sent += 1
+        data = build()
+        if isinstance(data, Future):
+            data.add_done_callback(lambda future: self._send_result(room, event, future))
+            return
+        self.send(event, data, room)
+
+    def _send_result(self, room, event, future):
+        try:
+            self.send(event, future.result(), room)
+        except Exception:
+            logging.exception('[BROADCAST] Failed to broadcast to %s', room)
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='broadcast-coalescer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                if self.deadlines[0][0] > now:
+                    self.condition.wait(self.deadlines[0][0] - now)
+                    continue
+                _, room = heapq.heappop(self.deadlines)
+                broadcast = self.pending.pop(room, None)
+                if broadcast is None:
+                    continue
+                self.last_sent[room] = now
+            try:
+                self._send(room, *broadcast)
+            except Exception:
+                logging.exception('[BROADCAST] Failed to broadcast to %s', room)
+
+
+class CoalescedEvent(object):
+    ''' Broadcast to a room going through a `BroadcastCoalescer` (same
+        interface as `EmitEvent`).
+    '''
+
+    def __init__(self, coalescer, room, event, build):
+        self.coalescer = coalescer
+        self.room = room
+        self.event = event
+        self.build = build
+
+    def emit(self):
+        self.coalescer.request(self.room, self.event, self.build)
+
+# For global access
+lobby_updates = BroadcastCoalescer(config.LOBBY_UPDATE_WINDOW, wire_formats.broadcast)
+metrics.add_collector('lobby_updates', lobby_updates.get_metrics)
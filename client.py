@@ -2,7 +2,7 @@ from config import global_config as config
 from enum import Enum
 from random import choice
 from uuid import uuid4
-from player import Player, PlayerRole, PlayerTeam
+from player import PlayerRole, PlayerTeam
 
 class Client(object):
     def __init__(self, client_id):
@@ -17,12 +17,6 @@ class Client(object):
         ''' Returns number of players. '''
         return len(self.players)
 
-    def add_new_player(self, used_avatars, team=None, role=None):
-        ''' Creates new player and adds it. '''
-        new_player = Player.new_player(used_avatars, team, role)
-        self.add_player(new_player)
-        return new_player
-
     def add_player(self, player):
         ''' Adds new player to active players and tracks avatar'''
         self.players[player.id] = player
@@ -82,6 +76,13 @@ class Client(object):
         player = self.players[player_id]
         player.role = PlayerRole.SPYMASTER if player.role == PlayerRole.OPERATIVE else PlayerRole.OPERATIVE
 
+    def serialize(self):
+        ''' Serializes client id and players to JSON object. '''
+        return {
+            'id': self.id,
+            'players': [p.serialize() for p in self.get_players().values()]
+        }
+
     def serialize_players(self):
         ''' Serializes players to JSON object. '''
         return {
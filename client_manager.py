@@ -1,8 +1,14 @@
+from avatar_pool import AvatarPool
 from constants import CLIENT_ID_KEY
 from client import Client
 from enum import Enum
+from game_events import (
+    ClientJoined, ClientLeft, ClientRestored, LobbyLocked, PlayerAdded,
+    PlayerDeleted, RoleSwitched, TeamSwitched
+)
 from utils import JSONUtils, EmitEvent
 from player import Player, PlayerTeam, PlayerRole
+from uuid import uuid4
 
 
 class PlayerConfigError(Enum):
@@ -49,17 +55,41 @@ class ClientManager(object):
         PlayerConfigError.NO_BLUE_OPERATIVE
     ]
 
-    def __init__(self):
+    def __init__(self, game_config=None):
         # Player client mapping (maybe not necessary)
         self.player_clients = {}
         # Active clients of game.
         self.clients = {}
         # Disconnected clients of game (for in case they come back).
         self.dangling_clients = {}
-        # Avatars being used for clients.
-        self.used_avatars = []
+        # Allocator of the avatars of players (reserved while their client is
+        # disconnected).
+        self.avatar_pool = AvatarPool.from_config(game_config)
         # Allow new players to join or not
         self.locked = False
+        # Incremented on every change to clients or players (used for caching).
+        self.version = 0
+        # Events applied since they were last recorded.
+        self.pending_events = []
+        self._build_player_index()
+
+    def _build_player_index(self):
+        ''' Rebuilds the player index and role counts from the active clients. '''
+        # Players of all active clients, by player id.
+        self.players = {}
+        # Number of active players per (team, role).
+        self.role_counts = {(team, role): 0 for team in PlayerTeam for role in PlayerRole}
+        for client in self.clients.values():
+            for player in client.get_players().values():
+                self._index_player(player)
+
+    def _index_player(self, player):
+        self.players[player.id] = player
+        self.role_counts[(player.team, player.role)] += 1
+
+    def _unindex_player(self, player):
+        del self.players[player.id]
+        self.role_counts[(player.team, player.role)] -= 1
 
     def handle_event(self, game_code, client_id, client_event, data):
         ''' Handles all client events given a client id, the event and data
@@ -103,7 +133,7 @@ class ClientManager(object):
                                          % (client_id, player_id))
             self.switch_player_role(client_id, player_id)
         elif client_event is ClientEvent.INIT_START_GAME:
-            self.locked = True
+            self._emit(LobbyLocked())
             redirect_url = data
             events.append(EmitEvent(ClientEvent.START_GAME.value, redirect_url, room=game_code, broadcast=True))
         elif client_event is ClientEvent.DISCONNECT:
@@ -119,6 +149,64 @@ class ClientManager(object):
 
         return client, events
 
+    def _emit(self, event):
+        ''' Applies the event of a (validated) change and queues it for
+            recording.
+        '''
+        self.apply(event)
+        self.pending_events.append(event)
+
+    def pop_events(self):
+        ''' Returns (and clears) the events applied since the last call. '''
+        events = self.pending_events
+        self.pending_events = []
+        return events
+
+    def apply(self, event):
+        ''' Applies an event (see game_events.py) to the clients. Avatars
+            are taken from the pool when they are chosen, and only claimed
+            here when the event is replayed.
+        '''
+        event_type = type(event)
+        if event_type is PlayerAdded:
+            client = self.get_client(event.client_id)
+            avatar = self.avatar_pool.claim(event.avatar)
+            player = client.add_player(Player(
+                event.player_id,
+                PlayerTeam(event.team),
+                PlayerRole(event.role),
+                avatar
+            ))
+            self._index_player(player)
+        elif event_type is TeamSwitched:
+            self._switch_player(event.client_id, event.player_id, Client.switch_player_team)
+        elif event_type is RoleSwitched:
+            self._switch_player(event.client_id, event.player_id, Client.switch_player_role)
+        elif event_type is PlayerDeleted:
+            client = self.get_client(event.client_id)
+            player = client.remove_player(event.player_id)
+            self.avatar_pool.release(player.avatar)
+            self._unindex_player(player)
+        elif event_type is ClientJoined:
+            self.clients[event.client_id] = Client(event.client_id)
+        elif event_type is ClientRestored:
+            client = self.dangling_clients.pop(event.client_id)
+            for player_id, player in client.get_players().items():
+                player.avatar = self.avatar_pool.claim(event.avatars[player_id])
+                self._index_player(player)
+            self.clients[client.id] = client
+        elif event_type is ClientLeft:
+            client = self.clients.pop(event.client_id)
+            for player in client.get_players().values():
+                self.avatar_pool.reserve(player.avatar)
+                self._unindex_player(player)
+            self.dangling_clients[client.id] = client
+        elif event_type is LobbyLocked:
+            self.locked = True
+        else:
+            raise ValueError("Unknown client event %s" % str(event))
+        self.version += 1
+
     def get_client(self, client_id):
         ''' Returns an active client if it exists. '''
         if client_id not in self.clients:
@@ -129,13 +217,9 @@ class ClientManager(object):
         ''' Returns number of active clients. '''
         return len(self.clients)
 
-    def add_client(self, client):
-        ''' Adds new client to a client and tracks avatar. '''
-        self.clients[client.id] = client
-        players = client.get_players().values()
-        for player in players:
-            self.used_avatars.append(player.avatar)
-        return client
+    def get_num_dangling_clients(self):
+        ''' Returns number of disconnected clients kept for reconnection. '''
+        return len(self.dangling_clients)
 
     def add_new_player(self, client_id):
         ''' Add a player that fixes the player config error if one exists,
@@ -144,31 +228,35 @@ class ClientManager(object):
         client = self.get_client(client_id)
         error = PlayerConfigError(self.get_player_config_error())
         new_role = PlayerRole.OPERATIVE if error in self.operative_errors else PlayerRole.SPYMASTER
-
         if error in self.red_team_errors:
-            new_player = client.add_new_player(self.used_avatars, PlayerTeam.RED, new_role)
+            new_team = PlayerTeam.RED
         elif error in self.blue_team_errors:
-            new_player = client.add_new_player(self.used_avatars, PlayerTeam.BLUE, new_role)
+            new_team = PlayerTeam.BLUE
         else:
-            new_player = client.add_new_player(self.used_avatars)
-
-        self.used_avatars.append(new_player.avatar)
-        return new_player
+            new_team = new_role = None
+
+        new_player = Player.new_player(self.avatar_pool.acquire(), new_team, new_role)
+        self._emit(PlayerAdded(
+            client.id,
+            new_player.id,
+            new_player.team.value,
+            new_player.role.value,
+            new_player.avatar
+        ))
+        return self.players[new_player.id]
 
     def add_new_client(self):
         ''' Creates new client and adds it. '''
-        new_client = Client.new_client()
-        self.add_client(new_client)
-        return new_client
+        client_id = str(uuid4())
+        self._emit(ClientJoined(client_id))
+        return self.clients[client_id]
 
     def remove_client(self, client_id):
-        ''' Removes client from active clients. '''
-        client = self.clients.pop(client_id, None)
-        players = client.get_players().values()
-        for player in players:
-            self.used_avatars.remove(player.avatar)
-        self.dangling_clients[client_id] = client
-        return client
+        ''' Removes client from active clients, reserving its players' avatars
+            in case it reconnects.
+        '''
+        self._emit(ClientLeft(client_id))
+        return self.dangling_clients[client_id]
 
     def get_clients(self):
         ''' Returns active client id to client mapping. '''
@@ -206,40 +294,41 @@ class ClientManager(object):
         ''' Restores disconnected client to active client mapping. '''
         if client_id in self.clients:
             return self.get_active_client(client_id)
-        client = self.dangling_clients.pop(client_id)
-        players = client.get_players().values()
-        for player in players:
-            avatar = Player._get_avatar(self.used_avatars, pref=player.avatar)
-            player = Player(player.id, player.team, player.role, avatar)
-            self.used_avatars.append(player.avatar)
-        return self.add_client(client)
+        client = self.dangling_clients[client_id]
+        # Their avatars, or others if they were taken meanwhile.
+        avatars = {
+            player_id: self.avatar_pool.reclaim(player.avatar)
+            for player_id, player in client.get_players().items()
+        }
+        self._emit(ClientRestored(client_id, avatars))
+        return client
 
     def get_players(self):
-        players = {}
-        for client in self.clients.values():
-            client_players = client.get_players()
-            players = dict(players, **client_players)
-        return players
+        ''' Returns player id to player mapping of all active clients
+            (the live index, which must not be modified).
+        '''
+        return self.players
 
     def client_has_player(self, client_id, player_id):
         client = self.get_client(client_id)
         return client.has_player(player_id)
 
     def switch_player_team(self, client_id, player_id):
-        client = self.get_client(client_id)
-        client.switch_player_team(player_id)
-        return
+        self._emit(TeamSwitched(client_id, player_id))
 
     def switch_player_role(self, client_id, player_id):
+        self._emit(RoleSwitched(client_id, player_id))
+
+    def _switch_player(self, client_id, player_id, switch):
+        ''' Applies `switch(client, player_id)`, keeping role counts. '''
         client = self.get_client(client_id)
-        client.switch_player_role(player_id)
-        return
+        player = client.get_player(player_id)
+        self.role_counts[(player.team, player.role)] -= 1
+        switch(client, player_id)
+        self.role_counts[(player.team, player.role)] += 1
 
     def delete_player(self, client_id, player_id):
-        client = self.get_client(client_id)
-        player = client.remove_player(player_id)
-        self.used_avatars.remove(player.avatar)
-        return
+        self._emit(PlayerDeleted(client_id, player_id))
 
     def client_has_role(self, client_id, team, role):
         client = self.get_client(client_id)
@@ -247,35 +336,29 @@ class ClientManager(object):
 
 
     def get_player_config_error(self):
-        ''' Validate player teams and roles. '''
-        teams = {}
-        red_roles = {}
-        blue_roles = {}
-
-        for player in self.get_players().values():
-            teams[player.team] = teams.get(player.team, 0) + 1
-
-            if player.team == PlayerTeam.RED:
-                red_roles[player.role] = red_roles.get(player.role, 0) + 1
-            elif player.team == PlayerTeam.BLUE:
-                blue_roles[player.role] = blue_roles.get(player.role, 0) + 1
+        ''' Validate player teams and roles (from the role counts). '''
+        counts = self.role_counts
+        red_spymasters = counts[(PlayerTeam.RED, PlayerRole.SPYMASTER)]
+        red_operatives = counts[(PlayerTeam.RED, PlayerRole.OPERATIVE)]
+        blue_spymasters = counts[(PlayerTeam.BLUE, PlayerRole.SPYMASTER)]
+        blue_operatives = counts[(PlayerTeam.BLUE, PlayerRole.OPERATIVE)]
 
         # validate that there are two teams
-        if PlayerTeam.RED not in teams:
+        if red_spymasters + red_operatives == 0:
             return PlayerConfigError.NO_RED_TEAM.value
-        if PlayerTeam.BLUE not in teams:
+        if blue_spymasters + blue_operatives == 0:
             return PlayerConfigError.NO_BLUE_TEAM.value
 
         # validate that each team has a spymaster
-        if PlayerRole.SPYMASTER not in red_roles:
+        if red_spymasters == 0:
             return PlayerConfigError.NO_RED_SPYMASTER.value
-        if PlayerRole.SPYMASTER not in blue_roles:
+        if blue_spymasters == 0:
             return PlayerConfigError.NO_BLUE_SPYMASTER.value
 
         # validate that each team has at least one operative
-        if PlayerRole.OPERATIVE not in red_roles:
+        if red_operatives == 0:
             return PlayerConfigError.NO_RED_OPERATIVE.value
-        if PlayerRole.OPERATIVE not in blue_roles:
+        if blue_operatives == 0:
             return PlayerConfigError.NO_BLUE_OPERATIVE.value
 
         return PlayerConfigError.NONE.value
@@ -0,0 +1,335 @@
+''' Spymaster clue suggestions.
+    Word vectors of the board vocabulary (config.WORDS_FILE) and of a
+    candidate clue vocabulary are built offline into a float32 matrix with
+    unit rows (config.CLUE_INDEX_FILE, words in config.CLUE_VOCABULARY_FILE).
+    At runtime the matrix is memory-mapped and every candidate is scored
+    against the whole board with a single matrix product.
+
+    Build step (needs nltk, and network access for the WordNet corpus):
+        python -m clue_suggester [--vectors glove.txt] [--candidates 20000]
+'''
+from card import CardStatus
+from collections import Counter, OrderedDict
+from config import global_config as config
+from hashlib import blake2b
+import logging
+import math
+from metrics import metrics
+import os
+import re
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ClueIndex(object):
+    ''' Memory-mapped word vectors (one unit row per word). '''
+
+    def __init__(self, vectors, words):
+        # Word vectors, by row (Immutable).
+        self.vectors = vectors
+        # Words, by row (Immutable).
+        self.words = words
+        # Word to row mapping (Immutable).
+        self.word_rows = {word: row for row, word in enumerate(words)}
+
+    @classmethod
+    def load(cls, path, vocabulary_path):
+        with open(vocabulary_path, 'r') as f:
+            words = [line.rstrip('\n') for line in f]
+        vectors = np.load(path, mmap_mode='r')
+        if len(words) != vectors.shape[0]:
+            raise ValueError("%s does not match %s" % (vocabulary_path, path))
+        return cls(vectors, words)
+
+    @staticmethod
+    def normalize(word):
+        return word.strip().lower().replace(' ', '_')
+
+    def get_rows(self, words):
+        ''' Returns the row of each word, -1 for words without a vector. '''
+        return np.array([self.word_rows.get(ClueIndex.normalize(word), -1) for word in words])
+
+
+class ClueSuggester(object):
+    ''' Ranks candidate clues for a team on a board.
+        A candidate counts the unrevealed team words it is more similar to
+        than to any danger (opposing words, neutral words with some slack,
+        the bomb with an extra margin), and is scored by that count plus the
+        margin of its weakest counted word. Rankings are cached per board
+        state and team.
+    '''
+
+    # Minimum similarity margin of a counted word over the closest danger.
+    MARGIN = 0.05
+    # Neutral words are less of a danger than opposing words...
+    NEUTRAL_SLACK = 0.05
+    # ...and the bomb is more of one.
+    BOMB_MARGIN = 0.1
+
+    # Configured suggester, loaded on first use (see `get`).
+    instance = None
+    loaded = False
+    instance_lock = threading.Lock()
+
+    def __init__(self, index, num_suggestions, cache_size):
+        self.index = index
+        self.num_suggestions = num_suggestions
+        self.cache_size = cache_size
+        # Rankings by (board words, revealed statuses, team status), least
+        # recently used first.
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls):
+        ''' Returns the configured suggester, or None if the index was not
+            built (or NumPy is not installed).
+        '''
+        if np is None or not os.path.exists(config.CLUE_INDEX_FILE):
+            logging.info('[CLUES] No clue index at %s, suggestions are disabled', config.CLUE_INDEX_FILE)
+            return None
+        index = ClueIndex.load(config.CLUE_INDEX_FILE, config.CLUE_VOCABULARY_FILE)
+        return cls(index, config.CLUE_SUGGESTIONS, config.CLUE_CACHE_SIZE)
+
+    @classmethod
+    def get(cls):
+        ''' Returns the configured suggester (see `from_config`), loading the
+            index on the first call.
+        '''
+        if not cls.loaded:
+            with cls.instance_lock:
+                if not cls.loaded:
+                    cls.instance = cls.from_config()
+                    if cls.instance is not None:
+                        metrics.add_collector('clues', cls.instance.get_metrics)
+                    cls.loaded = True
+        return cls.instance
+
+    def get_metrics(self):
+        return {
+            'vocabulary_size': len(self.index.words),
+            'cached_rankings': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def suggest(self, board, team_status):
+        ''' Returns the best clues for the team whose cards have
+            `team_status`, as [{word, number, targets}], best first.
+        '''
+        key = (tuple(board.words), bytes(board.statuses), team_status.value)
+        with self.lock:
+            ranking = self.cache.get(key)
+            if ranking is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return ranking
+            self.misses += 1
+        ranking = self.rank(board, team_status)
+        with self.lock:
+            self.cache[key] = ranking
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return ranking
+
+    def rank(self, board, team_status):
+        index = self.index
+        vectors = index.vectors
+        rows = index.get_rows(board.words)
+        known = rows >= 0
+        board_vectors = np.zeros((len(rows), vectors.shape[1]), dtype=vectors.dtype)
+        board_vectors[known] = vectors[rows[known]]
+        # Similarity of every candidate to every board word.
+        similarities = vectors.dot(board_vectors.T)
+
+        unrevealed = np.frombuffer(bytes(board.statuses), dtype=np.uint8) == CardStatus.EMPTY.value
+        solution = np.frombuffer(bytes(board.solution), dtype=np.uint8)
+        opponent_status = CardStatus.BLUE if team_status is CardStatus.RED else CardStatus.RED
+        team = unrevealed & (solution == team_status.value)
+        if not team.any():
+            return []
+
+        danger = np.full(len(vectors), -1.0, dtype=similarities.dtype)
+        for status, offset in ((opponent_status, 0.0),
+                               (CardStatus.NEUTRAL, -ClueSuggester.NEUTRAL_SLACK),
+                               (CardStatus.BOMB, ClueSuggester.BOMB_MARGIN)):
+            mask = unrevealed & (solution == status.value)
+            if mask.any():
+                np.maximum(danger, similarities[:, mask].max(axis=1) + offset, out=danger)
+
+        team_similarities = similarities[:, team]
+        threshold = danger + ClueSuggester.MARGIN
+        counted = team_similarities > threshold[:, None]
+        counts = counted.sum(axis=1)
+        weakest = np.where(counted, team_similarities, np.inf).min(axis=1)
+        scores = np.where(counts > 0, counts + weakest - danger, -np.inf)
+        # Board words are not valid clues.
+        scores[rows[known]] = -np.inf
+
+        # Enough candidates to survive filtering of forms of board words.
+        top = 4 * self.num_suggestions + len(rows)
+        if top < len(scores):
+            candidates = np.argpartition(-scores, top)[:top]
+            candidates = candidates[np.argsort(-scores[candidates])]
+        else:
+            candidates = np.argsort(-scores)
+
+        board_words = [ClueIndex.normalize(word) for word in board.words]
+        team_positions = np.flatnonzero(team)
+        suggestions = []
+        for row in candidates:
+            if len(suggestions) == self.num_suggestions or scores[row] == -np.inf:
+                break
+            word = index.words[row]
+            if '_' in word or any(word in board_word or board_word in word for board_word in board_words):
+                continue
+            targets = [
+                board.words[position]
+                for position in team_positions[np.argsort(-similarities[row, team_positions])]
+                if similarities[row, position] > threshold[row]
+            ]
+            suggestions.append({
+                'word': word,
+                'number': int(counts[row]),
+                'targets': targets,
+            })
+        return suggestions
+
+
+# Offline build
+
+def feature_vector(feature, dims, nonzeros=8):
+    ''' Sparse random +-1 vector of a context feature (random indexing),
+        derived from a hash of the feature so builds are reproducible.
+    '''
+    digest = blake2b(feature.encode('utf-8'), digest_size=2 * nonzeros).digest()
+    vector = np.zeros(dims, dtype=np.float32)
+    for i in range(nonzeros):
+        vector[digest[2 * i] % dims] += 1.0 if digest[2 * i + 1] & 1 else -1.0
+    return vector
+
+def wordnet_contexts(word, wn):
+    ''' Context features of a word: the lemmas of its synsets and of their
+        neighbours, and the words of their glosses.
+    '''
+    contexts = Counter()
+    for synset in wn.synsets(word):
+        related = [synset] + synset.hypernyms() + synset.hyponyms() + \
+            synset.part_meronyms() + synset.part_holonyms() + \
+            synset.member_holonyms() + synset.topic_domains()
+        for other in related:
+            contexts.update('lemma:' + name.lower() for name in other.lemma_names())
+        gloss = ' '.join([synset.definition()] + synset.examples())
+        contexts.update('gloss:' + token for token in re.findall(r'[a-z]{3,}', gloss.lower()))
+    return contexts
+
+def build_from_wordnet(words, dims):
+    ''' Word vectors by random indexing of WordNet contexts, weighted by
+        log count and inverse document frequency.
+    '''
+    import nltk
+    from nltk.corpus import wordnet as wn
+    nltk.download('wordnet')
+    contexts = [wordnet_contexts(word, wn) for word in words]
+    document_frequency = Counter()
+    for word_contexts in contexts:
+        document_frequency.update(word_contexts.keys())
+    feature_vectors = {}
+    vectors = np.zeros((len(words), dims), dtype=np.float32)
+    for row, word_contexts in enumerate(contexts):
+        for feature, count in word_contexts.items():
+            if feature not in feature_vectors:
+                feature_vectors[feature] = feature_vector(feature, dims)
+            weight = math.log1p(count) * math.log(len(words) / document_frequency[feature])
+            vectors[row] += weight * feature_vectors[feature]
+    return vectors
+
+def wordnet_candidates(limit):
+    ''' Returns the `limit` most frequent (SemCor lemma counts) single-word
+        WordNet nouns.
+    '''
+    import nltk
+    from nltk.corpus import wordnet as wn
+    nltk.download('wordnet')
+    counts = Counter()
+    for synset in wn.all_synsets(wn.NOUN):
+        for lemma in synset.lemmas():
+            name = lemma.name().lower()
+            if re.match(r'^[a-z]{3,}$', name):
+                counts[name] += lemma.count() + 1
+    return [word for word, _ in counts.most_common(limit)]
+
+def load_vectors(path, words, candidate_limit):
+    ''' Reads word vectors in the GloVe text format. Returns the vectors of
+        `words` (averaging the parts of multi-word ones) followed by the
+        first `candidate_limit` plain words of the file (files are sorted by
+        frequency), and the candidate words.
+    '''
+    wanted = set(part for word in words for part in ClueIndex.normalize(word).split('_'))
+    found = {}
+    candidates = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            token, _, values = line.rstrip().partition(' ')
+            is_candidate = len(candidates) < candidate_limit and re.match(r'^[a-z]{3,}$', token)
+            if token in wanted or is_candidate:
+                found[token] = np.array(values.split(' '), dtype=np.float32)
+                if is_candidate:
+                    candidates.append(token)
+    dims = len(next(iter(found.values())))
+    vectors = np.zeros((len(words) + len(candidates), dims), dtype=np.float32)
+    for row, word in enumerate(words):
+        parts = [found[part] for part in ClueIndex.normalize(word).split('_') if part in found]
+        if parts:
+            vectors[row] = np.mean(parts, axis=0)
+    for row, word in enumerate(candidates, len(words)):
+        vectors[row] = found[word]
+    return vectors, candidates
+
+def build_index(board_words, path, vocabulary_path, vectors_path=None, candidate_limit=20000, dims=128):
+    ''' Builds the clue index of the board words and a candidate vocabulary.
+        Written to temporary files first, so a running server never maps a
+        partial index.
+    '''
+    board_words = sorted(set(ClueIndex.normalize(word) for word in board_words))
+    if vectors_path is not None:
+        vectors, candidates = load_vectors(vectors_path, board_words, candidate_limit)
+    else:
+        candidates = wordnet_candidates(candidate_limit)
+        vectors = None
+    board_set = set(board_words)
+    words = board_words + [word for word in candidates if word not in board_set]
+    if vectors is None:
+        vectors = build_from_wordnet(words, dims)
+    else:
+        keep = list(range(len(board_words))) + \
+            [len(board_words) + i for i, word in enumerate(candidates) if word not in board_set]
+        vectors = vectors[keep]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, vectors.astype(np.float32))
+    with open(vocabulary_path + '.tmp', 'w') as f:
+        f.write(''.join(word + '\n' for word in words))
+    os.replace(path + '.tmp', path)
+    os.replace(vocabulary_path + '.tmp', vocabulary_path)
+    return len(words)
+
+if __name__ == '__main__':
+    import argparse
+    from word_source import WordsFile
+    parser = argparse.ArgumentParser(description='Builds the clue suggestion index.')
+    parser.add_argument('--vectors', help='word vectors in the GloVe text format (default: built from WordNet)')
+    parser.add_argument('--candidates', type=int, default=20000, help='size of the candidate clue vocabulary')
+    parser.add_argument('--dims', type=int, default=128, help='dimensions of vectors built from WordNet')
+    args = parser.parse_args()
+    count = build_index(WordsFile(config.WORDS_FILE).getAllWords(), config.CLUE_INDEX_FILE,
+                        config.CLUE_VOCABULARY_FILE, args.vectors, args.candidates, args.dims)
+    print('Indexed %d words into %s' % (count, config.CLUE_INDEX_FILE))
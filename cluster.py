@@ -0,0 +1,43 @@
+''' Runs a sharded deployment on this machine: a local message broker plus
+    one app process per url in config.SHARD_URLS. Games are partitioned
+    between the processes by consistent hashing of their game code (see
+    `sharding.py`), and room broadcasts are shared through the broker.
+
+    Usage: python cluster.py
+'''
+from config import global_config as config
+from message_broker import MessageBroker, socket_path
+from sharding import SHARD_INDEX_ENV
+import logging
+import os
+import subprocess
+import sys
+
+
+def main():
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    if len(config.SHARD_URLS) < 2 or not config.MESSAGE_QUEUE:
+        raise ValueError("SHARD_URLS (2 or more) and MESSAGE_QUEUE must be configured")
+
+    broker = MessageBroker(socket_path(config.MESSAGE_QUEUE))
+    broker.start()
+
+    workers = []
+    for index, url in enumerate(config.SHARD_URLS):
+        env = dict(os.environ)
+        env[SHARD_INDEX_ENV] = str(index)
+        logging.info('Starting shard %d on %s', index, url)
+        workers.append(subprocess.Popen([sys.executable, 'app.py'], env=env))
+
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    finally:
+        broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,117 @@
+from math import sqrt
 import json
+import logging
+import os
+import threading
+import time
 
 class Configuration:
-    ''' Key-value in-memory configuration object. '''
+    ''' Key-value in-memory configuration object.
+        Configurations are immutable snapshots: changes are made by deriving
+        a new snapshot (see `replace`) and swapping it in (see
+        `ConfigurationStore`).
+    '''
 
-    def __init__(self, dict):
+    def __init__(self, dict, game_overrides=None):
         self.NUM_CARDS = dict.get("NUM_CARDS", DefaultConfiguration.NUM_CARDS)
         self.NUM_BOMBS = dict.get("NUM_BOMBS", DefaultConfiguration.NUM_BOMBS)
         self.NUM_REDS = dict.get("NUM_REDS", DefaultConfiguration.NUM_REDS)
         self.NUM_BLUES = dict.get("NUM_BLUES", DefaultConfiguration.NUM_BLUES)
         self.GAME_CODE_LEN = dict.get("GAME_CODE_LEN", DefaultConfiguration.GAME_CODE_LEN)
+        self.GAME_CODE_COOLDOWN = dict.get("GAME_CODE_COOLDOWN", DefaultConfiguration.GAME_CODE_COOLDOWN)
+        self.GAME_CODE_MAX_OCCUPANCY = dict.get("GAME_CODE_MAX_OCCUPANCY", DefaultConfiguration.GAME_CODE_MAX_OCCUPANCY)
         self.WORDS_FILE = dict.get("WORDS_FILE", DefaultConfiguration.WORDS_FILE)
+        self.WORD_SOURCE = dict.get("WORD_SOURCE", DefaultConfiguration.WORD_SOURCE)
+        self.NOUN_LEXICON_FILE = dict.get("NOUN_LEXICON_FILE", DefaultConfiguration.NOUN_LEXICON_FILE)
         self.AVATARS = dict.get("AVATARS", DefaultConfiguration.AVATARS)
+        self.AVATAR_COPIES = dict.get("AVATAR_COPIES", DefaultConfiguration.AVATAR_COPIES)
+        self.AVATAR_RESERVATION_TIME = dict.get("AVATAR_RESERVATION_TIME", DefaultConfiguration.AVATAR_RESERVATION_TIME)
         self.CLEAN_UP_DELTA = dict.get("CLEAN_UP_DELTA", DefaultConfiguration.CLEAN_UP_DELTA)
+        self.MAP_CARD_MODE = dict.get("MAP_CARD_MODE", DefaultConfiguration.MAP_CARD_MODE)
+        self.MAP_CARD_POOL_SIZE = dict.get("MAP_CARD_POOL_SIZE", DefaultConfiguration.MAP_CARD_POOL_SIZE)
+        self.STORAGE_TYPE = dict.get("STORAGE_TYPE", DefaultConfiguration.STORAGE_TYPE)
+        self.STORAGE_PATH = dict.get("STORAGE_PATH", DefaultConfiguration.STORAGE_PATH)
+        self.STORAGE_FLUSH_INTERVAL = dict.get("STORAGE_FLUSH_INTERVAL", DefaultConfiguration.STORAGE_FLUSH_INTERVAL)
+        self.SNAPSHOT_INTERVAL = dict.get("SNAPSHOT_INTERVAL", DefaultConfiguration.SNAPSHOT_INTERVAL)
+        self.SHARD_URLS = dict.get("SHARD_URLS", DefaultConfiguration.SHARD_URLS)
+        self.MESSAGE_QUEUE = dict.get("MESSAGE_QUEUE", DefaultConfiguration.MESSAGE_QUEUE)
+        self.LOBBY_UPDATE_WINDOW = dict.get("LOBBY_UPDATE_WINDOW", DefaultConfiguration.LOBBY_UPDATE_WINDOW)
+        self.SESSION_TYPE = dict.get("SESSION_TYPE", DefaultConfiguration.SESSION_TYPE)
+        self.SESSION_CACHE_SIZE = dict.get("SESSION_CACHE_SIZE", DefaultConfiguration.SESSION_CACHE_SIZE)
+        self.SESSION_STORAGE_PATH = dict.get("SESSION_STORAGE_PATH", DefaultConfiguration.SESSION_STORAGE_PATH)
+        self.SESSION_FLUSH_INTERVAL = dict.get("SESSION_FLUSH_INTERVAL", DefaultConfiguration.SESSION_FLUSH_INTERVAL)
+        self.CLUE_INDEX_FILE = dict.get("CLUE_INDEX_FILE", DefaultConfiguration.CLUE_INDEX_FILE)
+        self.CLUE_VOCABULARY_FILE = dict.get("CLUE_VOCABULARY_FILE", DefaultConfiguration.CLUE_VOCABULARY_FILE)
+        self.CLUE_SUGGESTIONS = dict.get("CLUE_SUGGESTIONS", DefaultConfiguration.CLUE_SUGGESTIONS)
+        self.CLUE_CACHE_SIZE = dict.get("CLUE_CACHE_SIZE", DefaultConfiguration.CLUE_CACHE_SIZE)
+        self.ASYNC_MODE = dict.get("ASYNC_MODE", DefaultConfiguration.ASYNC_MODE)
+        self.GAME_WORKERS = dict.get("GAME_WORKERS", DefaultConfiguration.GAME_WORKERS)
+        self.ACTIVITY_LOG_CAPACITY = dict.get("ACTIVITY_LOG_CAPACITY", DefaultConfiguration.ACTIVITY_LOG_CAPACITY)
+        self.ACTIVITY_LOG_PAGE_SIZE = dict.get("ACTIVITY_LOG_PAGE_SIZE", DefaultConfiguration.ACTIVITY_LOG_PAGE_SIZE)
+        self.CONFIG_RELOAD_INTERVAL = dict.get("CONFIG_RELOAD_INTERVAL", DefaultConfiguration.CONFIG_RELOAD_INTERVAL)
+        self.GAME_POOL_SIZE = dict.get("GAME_POOL_SIZE", DefaultConfiguration.GAME_POOL_SIZE)
+
+        # Derived values, computed once per snapshot.
+        self.NUM_NEUTRALS = self.NUM_CARDS - self.NUM_BOMBS - self.NUM_REDS - self.NUM_BLUES
+        # Values this snapshot was built from (see `replace`).
+        self.values = dict.copy()
+        # Values derived by other modules (see `derive`).
+        self.derived = {}
+        # Values overridden for a single game (see `withGameOverrides`).
+        self.game_overrides = game_overrides or {}
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('frozen'):
+            raise AttributeError("Configuration snapshots are immutable")
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['derived'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def replace(self, **values):
+        ''' Returns a new snapshot with the given values changed. '''
+        new_values = self.values.copy()
+        new_values.update(values)
+        return Configuration(new_values)
+
+    def derive(self, name, function):
+        ''' Returns `function(self)`, computed once per snapshot (e.g. for
+            values that other modules build from the configuration).
+        '''
+        derived = self.derived
+        if name not in derived:
+            derived[name] = function(self)
+        return derived[name]
+
+    def withGameOverrides(self, numCards=None, numBombs=None):
+        ''' Returns the snapshot of a game created with its own board size
+            and/or bomb count. Team card counts are scaled to the board size,
+            invalid boards raise a ValueError.
+        '''
+        if numCards is None and numBombs is None:
+            return self
+        try:
+            numCards = self.NUM_CARDS if numCards is None else int(numCards)
+            numBombs = self.NUM_BOMBS if numBombs is None else int(numBombs)
+        except ValueError:
+            raise ValueError("Card and bomb counts must be numbers")
+        side = int(round(sqrt(numCards)))
+        if side * side != numCards or not 3 <= side <= 7:
+            raise ValueError("The board must be a square of 9 to 49 cards")
+        numReds = self.NUM_REDS * numCards // self.NUM_CARDS
+        numBlues = self.NUM_BLUES * numCards // self.NUM_CARDS
+        if not 1 <= numBombs <= numCards - numReds - numBlues:
+            raise ValueError("A board of %d cards takes 1 to %d bombs" % (numCards, numCards - numReds - numBlues))
+        game_overrides = {'NUM_CARDS': numCards, 'NUM_BOMBS': numBombs, 'NUM_REDS': numReds, 'NUM_BLUES': numBlues}
+        values = self.values.copy()
+        values.update(game_overrides)
+        return Configuration(values, game_overrides)
 
     @classmethod
     def fileConfiguration(cls):
@@ -43,7 +143,7 @@ class Configuration:
         return self.NUM_BLUES
 
     def getNumNeutrals(self):
-        return self.NUM_CARDS - self.NUM_BOMBS - self.NUM_REDS - self.NUM_BLUES
+        return self.NUM_NEUTRALS
 
     def getGameCodeLen(self):
         return self.GAME_CODE_LEN
@@ -55,9 +155,10 @@ class FileConfiguration:
     ''' Namespace for file configuration related helper methods. '''
 
     @staticmethod
-    def parseConfigDict():
+    def parseConfigDict(configFilePath=None):
         ''' Parses JSON into python dictionary. '''
-        configFilePath = FileConfiguration.getConfigFilePath()
+        if configFilePath is None:
+            configFilePath = FileConfiguration.getConfigFilePath()
         dict = {}
         with open(configFilePath, 'r') as f:
             dict = json.loads(f.read())
@@ -65,8 +166,92 @@ class FileConfiguration:
 
     @staticmethod
     def getConfigFilePath():
-        ''' Get JSON file path (THIS SHOULD NOT CHANGE TRIVIALLY). '''
-        return "resources/config.json"
+        ''' Get JSON file path (THIS SHOULD NOT CHANGE TRIVIALLY), next to
+            this module whatever the working directory.
+        '''
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "config.json")
+
+class ConfigurationStore:
+    ''' Holds the current configuration snapshot. Attributes are read from
+        the current snapshot, so `global_config.NUM_CARDS` always sees the
+        latest one; code needing consistent values across a swap (e.g. a new
+        game) keeps a snapshot (see `snapshot`).
+        `watch` polls the configuration file and swaps in a new snapshot when
+        it changes. Values only read at startup (workers, storage, async
+        mode, ...) still need a restart.
+    '''
+
+    def __init__(self, path):
+        object.__setattr__(self, 'path', path)
+        object.__setattr__(self, 'mtime', self._get_mtime())
+        object.__setattr__(self, 'current', Configuration(FileConfiguration.parseConfigDict(path)))
+        # Values set with `update`, kept over reloads.
+        object.__setattr__(self, 'overrides', {})
+        object.__setattr__(self, 'lock', threading.Lock())
+        object.__setattr__(self, 'thread', None)
+
+    @classmethod
+    def fileConfigurationStore(cls):
+        return cls(FileConfiguration.getConfigFilePath())
+
+    def __getattr__(self, name):
+        if name == 'current':
+            raise AttributeError(name)
+        return getattr(self.current, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Configuration snapshots are immutable, see update()")
+
+    def snapshot(self):
+        ''' Returns the current (immutable) snapshot. '''
+        return self.current
+
+    def update(self, **values):
+        ''' Swaps in a snapshot with the given values changed (for scripts
+            and benchmarks). The values are kept over reloads.
+        '''
+        with self.lock:
+            self.overrides.update(values)
+            object.__setattr__(self, 'current', self.current.replace(**values))
+
+    def reload(self):
+        ''' Swaps in a new snapshot if the file changed since it was last
+            read. A file that cannot be parsed is ignored.
+        '''
+        mtime = self._get_mtime()
+        if mtime == self.mtime:
+            return False
+        with self.lock:
+            object.__setattr__(self, 'mtime', mtime)
+            try:
+                values = FileConfiguration.parseConfigDict(self.path)
+            except (OSError, ValueError):
+                logging.exception('[CONFIG] Failed to reload %s', self.path)
+                return False
+            values.update(self.overrides)
+            object.__setattr__(self, 'current', Configuration(values))
+        logging.info('[CONFIG] Reloaded %s', self.path)
+        return True
+
+    def watch(self, interval):
+        ''' Reloads the file every `interval` seconds (0 disables it). '''
+        if not interval or self.thread is not None:
+            return
+        thread = threading.Thread(target=self._watch, args=(interval,), name='config-watcher')
+        thread.daemon = True
+        object.__setattr__(self, 'thread', thread)
+        thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reload()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
 
 class DefaultConfiguration:
     ''' Default in-code configuration options (if file is unavailable). '''
@@ -76,7 +261,36 @@ class DefaultConfiguration:
     NUM_REDS = 8
     NUM_BLUES = 8
     WORDS_FILE = "resources/words.txt"
+    WORD_SOURCE = "file"
+    NOUN_LEXICON_FILE = "resources/nouns.lex"
     GAME_CODE_LEN = 5
+    GAME_CODE_COOLDOWN = 3600
+    GAME_CODE_MAX_OCCUPANCY = 0.001
     AVATARS = []
+    AVATAR_COPIES = 1
+    AVATAR_RESERVATION_TIME = 120
     CLEAN_UP_DELTA = 600
-global_config = Configuration.factory("file")
+    MAP_CARD_MODE = "random"
+    MAP_CARD_POOL_SIZE = 64
+    STORAGE_TYPE = "memory"
+    STORAGE_PATH = "codenames.db"
+    STORAGE_FLUSH_INTERVAL = 0.005
+    SNAPSHOT_INTERVAL = 50
+    SHARD_URLS = []
+    MESSAGE_QUEUE = None
+    LOBBY_UPDATE_WINDOW = 0.03
+    SESSION_TYPE = "memory"
+    SESSION_CACHE_SIZE = 10000
+    SESSION_STORAGE_PATH = None
+    SESSION_FLUSH_INTERVAL = 1.0
+    CLUE_INDEX_FILE = "resources/clues.npy"
+    CLUE_VOCABULARY_FILE = "resources/clues.txt"
+    CLUE_SUGGESTIONS = 10
+    CLUE_CACHE_SIZE = 1024
+    ASYNC_MODE = "eventlet"
+    GAME_WORKERS = 8
+    ACTIVITY_LOG_CAPACITY = 50
+    ACTIVITY_LOG_PAGE_SIZE = 10
+    CONFIG_RELOAD_INTERVAL = 2.0
+    GAME_POOL_SIZE = 16
+global_config = ConfigurationStore.fileConfigurationStore()
@@ -10,8 +10,14 @@ COLOR_BOMB_1 = ''
 # Used to store/load game_code to/from session
 GAME_CODE_KEY = 'game_code'
 
+# Used to store/load the game created (and not joined yet) by a session
+PENDING_GAME_KEY = 'pending_game'
+
 # Used to store/load client_id to/from session
 CLIENT_ID_KEY = 'client_id'
 
 # Used to transmit cached player_id from browser cookies to server
 OLD_ID_KEY = 'old_id'
+
+# Used to request a socket payload encoding at client_connect
+WIRE_FORMAT_KEY = 'encoding'
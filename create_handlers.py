@@ -1,14 +1,29 @@
+from config import global_config as config
+from constants import PENDING_GAME_KEY
 from flask import Blueprint, render_template, abort, session, request
+from game_code import GameCode
 from game_store import game_store
 
 create = Blueprint('create', __name__, template_folder='templates')
 
 @create.route('/create')
 def create_game():
-    # TODO: Note that going on the create page and refreshing results in many games being
-    # added to the active games dict, which is not desired. Unclear on a resolution
-    # for this issue yet.
-    new_code = game_store.create_game()
+    # Optional overrides of the board of this game, e.g. /create?cards=16&bombs=2
+    overrides = [request.args.get('cards'), request.args.get('bombs')]
+    # Refreshing the page returns the game this session created, as long as
+    # nobody joined it yet (and the overrides are the same).
+    pending = session.get(PENDING_GAME_KEY)
+    if pending is not None and pending[1] == overrides:
+        game_code = GameCode(pending[0])
+        if game_store.is_pending_game(game_code):
+            game_store.touch_game(game_code)
+            return render_template('create.html', game_code=game_code)
+    try:
+        game_config = config.snapshot().withGameOverrides(*overrides)
+    except ValueError as err:
+        abort(400, str(err))
+    new_code = game_store.create_game(game_config=game_config)
+    session[PENDING_GAME_KEY] = [new_code.serialize(), overrides]
     return render_template('create.html', game_code=new_code)
 
 @create.route('/join')
@@ -1,9 +1,9 @@
-from flask_socketio import emit
 import logging
+from wire_format import wire_formats
 
 class ErrorHandler:
     @staticmethod
     def game_code_dne(event, game_code):
         error_msg = """Game code does not exist. Please create a new game."""
         logging.warn('EVENT "%s" %s %s', event, game_code, error_msg)
-        emit('error', error_msg)
+        wire_formats.emit('error', error_msg)
@@ -1,10 +1,13 @@
-from card import Card, CardStatus
+from board import Board, STATUS_NAMES
+from card import CardStatus
+from collections import deque
 from config import global_config as config
-from copy import deepcopy
 from enum import Enum
+from game_events import CardRevealed, ClueSubmitted, TurnEnded
+from itertools import islice
 from map_card import *
-from player import PlayerTeam
-from transitions import Machine
+from math import sqrt
+from player import PlayerRole, PlayerTeam
 from turn_manager import TurnManager
 from word_source import WordsInMemory
 
@@ -16,6 +19,12 @@ class GameEvent(Enum):
     CHOOSE_WORD = 'choose_word'
     SUBMIT_CLUE = 'submit_clue'
     UPDATE = 'game_update'
+    PATCH = 'game_patch'
+    SYNC = 'game_sync'
+    SUGGEST_CLUES = 'suggest_clues'
+    CLUE_SUGGESTIONS = 'clue_suggestions'
+    LOG_HISTORY = 'log_history'
+    LOG_PAGE = 'log_page'
 
 
 class CodenameGame(object):
@@ -23,16 +32,14 @@ class CodenameGame(object):
         see it.
     '''
 
-    def __init__(self):
-        # An array of Card objects. The elements composing the deck do not ever change
-        #   although the elements themselves are mutated as the game progresses.
-        self.deck = self._gen_cards()
+    def __init__(self, map_card=None, words=None, game_config=None):
+        # Configuration snapshot of this game, with its overrides (Immutable).
+        self.config = game_config or config.snapshot()
         # Solution mapping of actual card statuses (Immutable).
-        self.map_card = MapCard()
-        # Number of 'found' red cards (Mutable).
-        self.red_count = 0
-        # Number of 'found' blue cards (Mutable).
-        self.blue_count = 0
+        self.map_card = map_card if map_card is not None else MapCard(game_config=self.config)
+        # Board of words and their revealed statuses. The words on the board
+        #   do not ever change although their statuses change as the game progresses.
+        self.board = self._gen_cards(words)
         # Current turn (RED/BLUE) as a CardStatus (Mutable).
         self.starting_team = self.map_card.get_starting_color()
         # Current turn clue (Mutable).
@@ -40,80 +47,205 @@ class CodenameGame(object):
         # Number of guesses left for the team whose turn it is to guess (Mutable).
         self.guesses_left = 0
         # Log of each turn's clue, guesses, and results (Mutable).
-        self.activity_log = ActivityLog()
+        self.activity_log = ActivityLog.from_config(self.config)
         # Mutable buffer for building activity log entries.
         self.log_entry_builder = LogEntryBuilder()
         # Create a new turn manager with the starting color
         self.turn_manager = TurnManager(self.starting_team)
-
-    # Generate a new deck of cards, chosing a set of cards randomly from the set
-    # of all cards.
-    def _gen_cards(self):
-        ''' Generate a set of word cards '''
-        words = WordsInMemory.sampleWords(config.getNumCards())
-        cards = []
-        position = 0
-        for word in words:
-            cards.append(Card(word, position))
-            position += 1
-        return cards
+        # Board version, incremented on every mutation (Mutable).
+        self.version = 0
+        # Patches produced by mutations that have not been broadcast yet (Mutable).
+        self.pending_patches = []
+        # Winning team, once the game is over (Mutable).
+        self.winner = None
+        # Events applied since they were last recorded (Mutable).
+        self.pending_events = []
+
+    # Generate a new board, chosing a set of words randomly from the set
+    # of all words.
+    def _gen_cards(self, words=None):
+        ''' Generate a board of words backed by the map card solution. '''
+        if words is None:
+            words = WordsInMemory.sampleWords(self.config.getNumCards())
+        return Board(words, self.map_card.map)
+
+    @property
+    def red_count(self):
+        ''' Number of 'found' red cards. '''
+        return self.board.get_num_revealed(CardStatus.RED)
+
+    @property
+    def blue_count(self):
+        ''' Number of 'found' blue cards. '''
+        return self.board.get_num_revealed(CardStatus.BLUE)
 
     def handle_game_event(self):
         pass
 
-    def mark_card(self, ind, new_status):
-        ''' Mark a card as either red or blue, based on the passed in status. '''
-        assert(0 <= ind < len(deck))
-        self.deck[ind].set_status(new_status)
+    def mark_card(self, ind):
+        ''' Reveal the actual status of the card at the given position. '''
+        assert(0 <= ind < self.board.get_size())
+        return self.board.reveal(ind)
 
     def get_card_by_word(self, word):
         ''' Get a card object from the board given a word '''
-        for card in self.deck:
-            if (card.get_word() == word):
-                return card
-        return None
+        index = self.board.get_index(word)
+        if index is None:
+            return None
+        return self.board.get_card(index)
 
     def set_current_clue(self, word, number):
         ''' Set the current clue that the spymaster has given '''
         assert(int(number) == number), "Not a valid number"
 
-        self.current_clue = Clue(word, number)
-        self.guesses_left = number + 1
-        self.turn_manager.next_turn()
+        if (self.winner is not None):
+            raise Exception("Game is over")
+
+        team, role = self.get_current_turn()
+        if (role is not PlayerRole.SPYMASTER):
+            raise Exception("No clue expected this turn")
+
+        self._emit(ClueSubmitted(word, number))
 
     # Makes a guess, and returns boolean based on correctness of guess
     def make_guess(self, word):
         ''' Represents the player making a guess by selecting a specific word '''
+        if (self.winner is not None):
+            raise Exception("Game is over")
+
         if (self.current_clue is None):
             raise Exception("No clue given")
 
         if (self.guesses_left == 0):
             raise Exception("No more guesses left!")
 
-        card = self.get_card_by_word(word)
-        if (not card):
+        index = self.board.get_index(word)
+        if (index is None):
             raise Exception("Invalid word")
 
+        if (self.board.is_revealed(index)):
+            raise Exception("Card already revealed")
+
+        self._emit(CardRevealed(index))
+
+    def end_turn(self):
+        ''' Ends the guessing turn before running out of guesses. '''
+        team, role = self.get_current_turn()
+        if (self.winner is not None or role is not PlayerRole.OPERATIVE):
+            raise Exception("No guessing turn to end")
+
+        self._emit(TurnEnded())
+
+    def _emit(self, event):
+        ''' Applies the event of a (validated) move, queues it for recording
+            and queues the patch broadcasting it.
+        '''
+        log_seq = self.activity_log.last_seq
+        self.apply(event)
+        self.pending_events.append(event)
+        self._add_patch(
+            [event.index] if type(event) is CardRevealed else (),
+            self.activity_log.get_entries_since(log_seq)
+        )
+
+    def pop_events(self):
+        ''' Returns (and clears) the events applied since the last call. '''
+        events = self.pending_events
+        self.pending_events = []
+        return events
+
+    def apply(self, event):
+        ''' Applies an event (see game_events.py) to the game and bumps its
+            version. Events are only checked when emitted, replaying them
+            always succeeds.
+        '''
+        event_type = type(event)
+        if event_type is CardRevealed:
+            self._reveal(event.index)
+        elif event_type is ClueSubmitted:
+            self._give_clue(event.word, event.number)
+        elif event_type is TurnEnded:
+            self.guesses_left = 0
+            self._end_guessing()
+        else:
+            raise ValueError("Unknown game event %s" % str(event))
+        self.version += 1
+
+    def _give_clue(self, word, number):
+        ''' Sets the clue of the team whose spymaster is playing. '''
+        team, role = self.get_current_turn()
+        self.current_clue = Clue(word, number)
+        self.guesses_left = number + 1
+        self.log_entry_builder.track_side(team)
+        self.log_entry_builder.track_clue(self.current_clue)
+        self.turn_manager.next_turn()
+
+    def _reveal(self, index):
+        ''' Reveals a card guessed by the team whose operatives are playing. '''
         team, role = self.get_current_turn()
-        position_type = self.map_card.get_card_type_at_position(card.get_position())
-        self.log_entry_builder.track_guess(Card(word, position_type))
+        position_type = self.board.reveal(index)
+        self.log_entry_builder.track_guess(self.board.get_card(index))
         if (team.name == position_type.name):
-            card.set_status(position_type)
             self.guesses_left -= 1
         else:
             # Incorrect guess ends the turn
-            card.set_status(position_type)
             self.guesses_left = 0
 
-        if self.guesses_left == 0:
-            self.turn_manager.next_turn()
+        if self.is_game_over():
+            self.winner = self._get_winner(team, position_type)
+            self.guesses_left = 0
+            self.activity_log.add_entry(self.log_entry_builder.build())
+        elif self.guesses_left == 0:
+            self._end_guessing()
+
+    def _end_guessing(self):
+        ''' Logs the finished guessing turn and hands over to the other team. '''
+        self.activity_log.add_entry(self.log_entry_builder.build())
+        self.turn_manager.next_turn()
+
+    def _get_winner(self, team, position_type):
+        ''' Returns the winner of a game ended by `team` revealing a card of
+            `position_type` (a wrong guess can complete the other team).
+        '''
+        other_team = PlayerTeam.BLUE if team is PlayerTeam.RED else PlayerTeam.RED
+        if position_type is CardStatus.BOMB:
+            return other_team
+        if self.board.get_num_remaining(CardStatus[team.name]) == 0:
+            return team
+        return other_team
+
+    def _add_patch(self, changed_positions, log_entries):
+        ''' Queues a patch describing the changed cards and new log entries
+            along with the (small) turn state that follows the mutation.
+        '''
+        team, role = self.get_current_turn()
+        statuses = self.board.statuses
+        self.pending_patches.append({
+            "version": self.version,
+            "cards": [
+                {"index": index, "status": STATUS_NAMES[statuses[index]]}
+                for index in changed_positions
+            ],
+            "redCount": self.red_count,
+            "blueCount": self.blue_count,
+            "currentClue": Clue.serialize_clue(self.current_clue),
+            "guessesLeft": self.guesses_left,
+            "currentTeam": team.value,
+            "currentRole": role.value,
+            "logEntries": log_entries
+        })
+
+    def pop_patches(self):
+        ''' Returns (and clears) the patches queued since the last call. '''
+        patches = self.pending_patches
+        self.pending_patches = []
+        return patches
 
     def switch_turns(self, word, number):
-        ''' Swtich active turn to the other team '''
-        self.log_entry_builder.track_clue(self.side)
-        self.log_entry_builder.track_clue(self.clue)
-        self.activity_log.addEntry(self.log_entry_builder.build(self.side, self.clue))
-        self.current_turn = CardStatus.RED if self.current_turn == CardStatus.BLUE else CardStatus.BLUE
+        ''' Swtich active turn to the other team, whose spymaster gives a clue. '''
+        team, role = self.get_current_turn()
+        if role is PlayerRole.OPERATIVE:
+            self.end_turn()
         self.set_current_clue(word, number)
 
     def get_current_turn(self):
@@ -125,31 +257,22 @@ class CodenameGame(object):
             red or blue meets their total possible or the bomb has been hit.
         '''
 
-        if (
-                # Check if bomb has been uncovered.
-                self.deck[self.map_card.get_bomb_location()].get_status == CardStatus.BOMB or \
-                # Check if red or blue is at winning count.
-                self.red_count == self.map_card.get_num_card_by_type(CardStatus.RED) or \
-                self.blue_count == self.map_card.get_num_card_by_type(CardStatus.BLUE)
-            ):
-            # If game is over, update activity log, since no switch-turn will be called.
-            self.log_entry_builder.track_clue(self.side)
-            self.log_entry_builder.track_clue(self.clue)
-            self.activity_log.add_entry(self.log_entry_builder.build(self.side, self.clue))
-            return True
-
-        return False
+        board = self.board
+        return (
+            # Check if bomb has been uncovered.
+            board.get_num_revealed(CardStatus.BOMB) > 0 or \
+            # Check if red or blue has found all of their cards.
+            board.get_num_remaining(CardStatus.RED) == 0 or \
+            board.get_num_remaining(CardStatus.BLUE) == 0
+        )
 
     # Stores the current game state into a JSON
     def serialize(self):
         ''' Serialize the game board, along with card counter, and activity log. '''
-        card_statuses = []
-        for card in self.deck:
-            card_statuses.append(card.get_status())
-        serialized_deck = [card.serialize() for card in self.deck]
         team, role = self.get_current_turn()
         return {
-            "deck" : serialized_deck,
+            "version": self.version,
+            "deck" : self.board.serialize(),
             "redCount": self.red_count,
             "blueCount": self.blue_count,
             "currentClue": Clue.serialize_clue(self.current_clue),
@@ -162,34 +285,95 @@ class CodenameGame(object):
     def __repr__(self):
         output = str(self.map_card) + "\n"
         max_len = 15
-        spacer = lambda x: str(x) + " "*(max_len - len(str(x)))
-        for x in range(5):
-            output += "".join(map(spacer, self.deck[5*x:5*x+5]))
+        board = self.board
+        row_size = int(sqrt(board.get_size()))
+        card_repr = lambda i: "(%s,%s)" % (board.words[i], STATUS_NAMES[board.statuses[i]])
+        spacer = lambda i: card_repr(i) + " "*(max_len - len(card_repr(i)))
+        for x in range(0, board.get_size(), row_size):
+            output += "".join(map(spacer, range(x, x+row_size)))
             output += "\n"
         output += "\n"
-        status_spacer = lambda x: str(x.status.name) + " "*(max_len - len(x.status.name))
-        for x in range(5):
-            output += "".join(map(status_spacer, self.deck[5*x:5*x+5]))
+        status_spacer = lambda s: STATUS_NAMES[s] + " "*(max_len - len(STATUS_NAMES[s]))
+        for x in range(0, board.get_size(), row_size):
+            output += "".join(map(status_spacer, board.statuses[x:x+row_size]))
             output += "\n"
         return output
 
 class ActivityLog:
-    ''' Log of each turn's clue, guesses, and results.
-        Stores log entries of turn's side, guesses, and results.
-        Essentially a list wrapper with a defined serialize method.
+    ''' Append-only log of each turn's clue, guesses, and results.
+        Entries are serialized once, when added, and numbered from 1 (their
+        "seq"). Only the latest `capacity` entries are kept in memory, older
+        ones are handed to the `archive` (if any, see `GameLogArchive`) and
+        read back from it when paging through the history.
     '''
 
-    def __init__(self, log = []):
-        self.log = []
+    def __init__(self, capacity=None, page_size=None):
+        # Serialized entries, oldest first, with contiguous seqs.
+        self.entries = deque(maxlen=capacity or config.ACTIVITY_LOG_CAPACITY)
+        # Default number of entries of a page (see `get_page`).
+        self.page_size = page_size or config.ACTIVITY_LOG_PAGE_SIZE
+        # Seq of the latest entry.
+        self.last_seq = 0
+        # Receives entries leaving memory (set by the game store, not pickled).
+        self.archive = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['archive'] = None
+        return state
+
+    @classmethod
+    def from_config(cls, game_config):
+        ''' Returns the log of a game on the given configuration snapshot. '''
+        return cls(game_config.ACTIVITY_LOG_CAPACITY, game_config.ACTIVITY_LOG_PAGE_SIZE)
 
     def add_entry(self, entry):
-        ''' Appends new entry to end of list.'''
-        self.log.append(entry)
+        ''' Numbers and appends a new entry, spilling the oldest one to the
+            archive once the log is at capacity.
+        '''
+        self.last_seq += 1
+        record = entry.serialize()
+        record["seq"] = self.last_seq
+        entries = self.entries
+        if len(entries) == entries.maxlen and self.archive is not None:
+            self.archive.append(entries[0])
+        entries.append(record)
+
+    def get_entries_since(self, seq):
+        ''' Returns the entries added after seq `seq` (still in memory). '''
+        entries = self.entries
+        return list(islice(entries, max(0, len(entries) - (self.last_seq - seq)), None))
+
+    def get_page(self, before=None, limit=None):
+        ''' Returns up to `limit` entries preceding seq `before` (the latest
+            ones by default) oldest first, and the cursor of the page before
+            them (None once the first entry was reached).
+        '''
+        limit = limit or self.page_size
+        first_in_memory = self.last_seq - len(self.entries) + 1
+        # Without an archive, entries that left memory are gone.
+        oldest = 1 if self.archive is not None else first_in_memory
+        end = self.last_seq + 1
+        if before is not None:
+            end = max(oldest, min(int(before), end))
+        start = max(oldest, end - limit)
+        page = []
+        if start < first_in_memory:
+            page = self.archive.load(start, min(end, first_in_memory))
+        if end > first_in_memory:
+            offset = max(start, first_in_memory) - first_in_memory
+            page.extend(islice(self.entries, offset, end - first_in_memory))
+        return page, (start if start > oldest else None)
 
     def serialize(self):
-        ''' Serializes log to JSON list of log entries. '''
+        ''' Serializes the latest page of log entries, with the cursor of
+            the page before them (see `get_page`).
+        '''
+        page, cursor = self.get_page()
         return {
-            "log": [entry.serialize() for entry in self.log]
+            "log": page,
+            "cursor": cursor,
+            "lastSeq": self.last_seq
         }
 
 class LogEntry:
@@ -242,13 +426,13 @@ class LogEntryBuilder:
         numCorrect = 0
         numIncorrect = 0
         for guess in self.tracked_guesses:
-            if guess.status == guess.side:
+            if guess.status.name == self.side.name:
                 numCorrect += 1
             else:
                 numIncorrect += 1
-        entry = LogEntry(side, clue, deepcopy(self.tracked_guesses), numCorrect, numIncorrect)
+        entry = LogEntry(self.clue, self.side, self.tracked_guesses, numCorrect, numIncorrect)
 
-        entry.clearTracking()
+        self.clear_tracking()
         return entry
 
 class Clue:
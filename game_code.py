@@ -1,5 +1,13 @@
+from collections import deque
+from config import global_config as config
+from hashlib import blake2b
+import os
 from string import ascii_lowercase, digits
-from random import SystemRandom
+import threading
+import time
+
+# Characters game codes are made of.
+GAME_CODE_ALPHABET = ascii_lowercase + digits
 
 class GameCode:
 	'''	Wrapper class around unique string id for generated games.
@@ -27,17 +35,144 @@ class GameCode:
 	def serialize(self):
 		return self.__str__()
 
-def generate_game_code(length):
-	''' Generate a random game code of length `len` comprised of lowercase letters
-		and numbers.
+def encode_game_code(value, length):
+	''' Writes a number as `length` characters of `GAME_CODE_ALPHABET`. '''
+	base = len(GAME_CODE_ALPHABET)
+	chars = []
+	for _ in range(length):
+		value, digit = divmod(value, base)
+		chars.append(GAME_CODE_ALPHABET[digit])
+	return GameCode(''.join(chars))
+
+class FeistelPermutation:
+	'''	Keyed bijection of range(size), built from a balanced Feistel network
+		over the smallest even number of bits covering `size`. Values mapped
+		outside of the range are mapped again (cycle walking) until they land
+		in it, which takes fewer than 4 passes on average.
 	'''
-	return GameCode(''.join(SystemRandom().choice(ascii_lowercase + digits) for _ in range(length)))
 
-def generate_unique_game_code(len, existing_codes):
-	''' Given a set of existing codes, generate a unique code using
-		`generate_game_code`. 
+	ROUNDS = 4
+
+	def __init__(self, size, key):
+		self.size = size
+		self.key = key
+		self.half_bits = (max(2, (size - 1).bit_length()) + 1) // 2
+		self.half_mask = (1 << self.half_bits) - 1
+
+	def _round_function(self, round, value):
+		digest = blake2b(value.to_bytes(8, 'big'), digest_size=8, key=self.key, person=bytes([round]))
+		return int.from_bytes(digest.digest(), 'big') & self.half_mask
+
+	def permute(self, value):
+		while True:
+			left, right = value >> self.half_bits, value & self.half_mask
+			for round in range(FeistelPermutation.ROUNDS):
+				left, right = right, left ^ self._round_function(round, right)
+			value = (left << self.half_bits) | right
+			if value < self.size:
+				return value
+
+class GameCodeAllocator:
+	'''	Hands out unique, unguessable game codes in constant time.
+		Codes are the images of a counter through a keyed permutation of the
+		code namespace, so they never collide with each other. Released codes
+		are handed out again once `cooldown` seconds have passed. The code
+		length grows by one (starting a new counter and permutation) before
+		live codes fill more than `max_occupancy` of the namespace, which
+		keeps codes hard to guess, or when the counter runs out.
 	'''
-	game_code = generate_game_code(len)
-	while game_code in existing_codes:
-		game_code = generate_game_code(len)
-	return game_code
+
+	def __init__(self, length, cooldown, max_occupancy, key=None):
+		# Secret key of the permutations.
+		self.key = key if key is not None else os.urandom(16)
+		self.cooldown = cooldown
+		self.max_occupancy = max_occupancy
+		# (time the code can be reused, code) of released codes, oldest first.
+		self.cooling = deque()
+		# Number of codes in use.
+		self.live = 0
+		# Codes in use that were allocated here, the only ones recycled.
+		self.allocated = set() # Set[GameCode]
+		# Allocation metrics.
+		self.issued = 0
+		self.recycled = 0
+		self.lock = threading.Lock()
+		self._set_length(length)
+
+	@classmethod
+	def from_config(cls):
+		return cls(config.getGameCodeLen(), config.GAME_CODE_COOLDOWN, config.GAME_CODE_MAX_OCCUPANCY)
+
+	def _set_length(self, length):
+		self.length = length
+		# Separate permutation per length.
+		key = blake2b(self.key, digest_size=16, person=bytes([length])).digest()
+		self.permutation = FeistelPermutation(len(GAME_CODE_ALPHABET) ** length, key)
+		# Number of codes of this length generated so far.
+		self.counter = 0
+
+	def get_occupancy(self):
+		''' Returns the fraction of the current namespace in use. '''
+		return self.live / self.permutation.size
+
+	def get_metrics(self):
+		return {
+			'length': self.length,
+			'namespace_size': self.permutation.size,
+			'live': self.live,
+			'occupancy': self.get_occupancy(),
+			'issued': self.issued,
+			'recycled': self.recycled,
+			'cooling': len(self.cooling),
+		}
+
+	def allocate(self, accept=None):
+		'''	Returns a new game code, skipping the ones rejected by `accept`
+			(e.g. codes owned by another shard). Rejected recycled codes (e.g.
+			still in use) go back to cooling, to be tried again later.
+		'''
+		with self.lock:
+			rejected = []
+			while True:
+				game_code, recycled = self._next_code()
+				if accept is None or accept(game_code):
+					break
+				if recycled:
+					rejected.append(game_code)
+			if rejected:
+				ready = time.monotonic() + self.cooldown
+				self.cooling.extend((ready, code) for code in rejected)
+			self.live += 1
+			self.issued += 1
+			self.allocated.add(game_code)
+			if recycled:
+				self.recycled += 1
+			return game_code
+
+	def track(self, game_code):
+		'''	Counts a code in use that was not allocated here (recovered games,
+			fixed codes). It is not recycled once released, since it may come
+			out of the permutations too.
+		'''
+		with self.lock:
+			self.live += 1
+
+	def release(self, game_code):
+		''' Returns a code, to be reused after the cooldown if it was allocated here. '''
+		with self.lock:
+			self.live = max(0, self.live - 1)
+			if game_code in self.allocated:
+				self.allocated.discard(game_code)
+				self.cooling.append((time.monotonic() + self.cooldown, game_code))
+
+	def _next_code(self):
+		''' Returns the next candidate code, and whether it was recycled. '''
+		if self.cooling and self.cooling[0][0] <= time.monotonic():
+			return self.cooling.popleft()[1], True
+		permutation = self.permutation
+		if self.counter >= permutation.size or self.live >= self.max_occupancy * permutation.size:
+			self._set_length(self.length + 1)
+			permutation = self.permutation
+		index = self.counter
+		self.counter += 1
+		return encode_game_code(permutation.permute(index), self.length), False
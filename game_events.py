@@ -0,0 +1,52 @@
+''' Typed events of the state changes of a game (see `CodenameGame.apply`
+    and `ClientManager.apply`). Commands validate a request, decide any
+    random outcome (ids, avatars, teams) and emit an event carrying it; the
+    state is a fold of the events over the latest snapshot, so replaying the
+    recorded events rebuilds a game exactly.
+    Events are namedtuples, recorded compactly as [code, *fields] lists of
+    JSON values.
+'''
+from collections import namedtuple
+
+# Event types by code.
+EVENT_TYPES = {}
+
+
+def event_type(code, name, fields=''):
+    ''' Declares an event type recorded as [code, *fields]. '''
+    cls = namedtuple(name, fields)
+    cls.code = code
+    EVENT_TYPES[code] = cls
+    return cls
+
+# CodenameGame events.
+# The spymaster whose turn it is gave a clue for `number` (int) words.
+ClueSubmitted = event_type('clue', 'ClueSubmitted', 'word number')
+# An operative revealed the card at `index`.
+CardRevealed = event_type('reveal', 'CardRevealed', 'index')
+# The guessing team ended its turn early.
+TurnEnded = event_type('end_turn', 'TurnEnded')
+
+GAME_EVENTS = (ClueSubmitted, CardRevealed, TurnEnded)
+
+# ClientManager events (teams and roles are PlayerTeam/PlayerRole values).
+# A new client (without players) joined the lobby.
+ClientJoined = event_type('join', 'ClientJoined', 'client_id')
+# A disconnected client came back, its players with the given avatars (by
+# player id).
+ClientRestored = event_type('restore', 'ClientRestored', 'client_id avatars')
+# A client disconnected, its players' avatars are reserved for it.
+ClientLeft = event_type('leave', 'ClientLeft', 'client_id')
+PlayerAdded = event_type('add_player', 'PlayerAdded', 'client_id player_id team role avatar')
+PlayerDeleted = event_type('delete_player', 'PlayerDeleted', 'client_id player_id')
+TeamSwitched = event_type('switch_team', 'TeamSwitched', 'client_id player_id')
+RoleSwitched = event_type('switch_role', 'RoleSwitched', 'client_id player_id')
+# The game started, no new clients may join.
+LobbyLocked = event_type('lock', 'LobbyLocked')
+
+
+def encode_event(event):
+    return [event.code] + list(event)
+
+def decode_event(record):
+    return EVENT_TYPES[record[0]](*record[1:])
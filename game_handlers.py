@@ -3,31 +3,38 @@ from config import global_config as config
 from constants import GAME_CODE_KEY, CLIENT_ID_KEY
 from client_manager import ClientEvent
 from error_handling import ErrorHandler
-from flask import Blueprint, render_template, session, url_for
-from flask_socketio import emit
+from flask import Blueprint, render_template, session, url_for, request, redirect
 from game import GameEvent
 from game_code import GameCode
 from game_store import game_store
 from lobby_handlers import client_event_handler
+from metrics import metrics, SESSION, QUEUE, MUTATION, SERIALIZATION
+from sharding import shard_router
 from utils import get_session_data
-from __main__ import socketio
+from sockets import socketio
+from wire_format import wire_formats
 
 game = Blueprint('game', __name__, template_folder='templates')
 
 
 @game.route('/g/<game_code>')
 def game_data(game_code):
+    timer = metrics.time_event('game_data')
     game_code_obj = GameCode(game_code)
+    if not shard_router.owns(game_code_obj):
+        return redirect(shard_router.get_url(game_code_obj, request.full_path))
     if not game_store.contains_game(game_code_obj):
         # TODO error handling
         return render_template('rejoin.html')
     session[GAME_CODE_KEY] = game_code
+    game_store.touch_game(game_code_obj)
     game_manager = game_store.get_game(game_code_obj)
 
     if CLIENT_ID_KEY not in session:
         # Somehow the client lost their session between the lobby and the game
         # TODO: handle reconnection
         return render_template('rejoin.html')
+    timer.mark(SESSION)
 
     # TODO: This is emulating a lobby reconnection event using the session data
     #       I don't think this is a very good way to transition clients from
@@ -36,31 +43,47 @@ def game_data(game_code):
     #       and game on a single page.
     cookie = {}
     cookie[CLIENT_ID_KEY] = session[CLIENT_ID_KEY]
-    try:
+
+    def connect_client():
+        # Runs on the game's mailbox, so no event changes the game between
+        # the reconnection and the read of the bundle.
+        timer.mark(QUEUE)
         client, events = game_manager.handle_client_event(
             client_id=None,
             client_event=ClientEvent.CONNECT,
             data=cookie
         )
+        timer.mark(MUTATION)
+        role_to_serve = client.has_spymaster()
+        return client, game_store.get_encoded_full_game_bundle(game_code_obj, role_to_serve)
+
+    try:
+        client, game_bundle = game_manager.submit(connect_client).result()
         session[CLIENT_ID_KEY] = client.id
     except PermissionError as e:
         return render_template('rejoin.html')
 
-    role_to_serve = client.has_spymaster()
-
-    return render_template(
-       'game.html',
-       game_bundle=game_store.get_full_game_bundle(game_code_obj, role_to_serve),
-       GameEvent=GameEvent,
-       ClientEvent=ClientEvent,
-   )
+    page = render_template(
+        'game.html',
+        game_bundle=game_bundle,
+        GameEvent=GameEvent,
+        ClientEvent=ClientEvent,
+    )
+    timer.mark(SERIALIZATION)
+    # Nothing is emitted, the page is the response.
+    timer.stop()
+    return page
 
 
 def game_event_handler(game_event, data=None):
+    ''' Handles a game event on the game of the session. A generator of the
+        game's mailbox futures (see `SocketServer`), run with `yield from`.
+    '''
+    timer = metrics.time_event(game_event.value)
     try:
         game_code_raw, client_id = get_session_data(session)
     except ValueError as err:
-        emit('error', str(err))
+        wire_formats.emit('error', str(err))
         return
 
     game_code = GameCode(game_code_raw)
@@ -68,11 +91,14 @@ def game_event_handler(game_event, data=None):
         ErrorHandler.game_code_dne(GameEvent.UPDATE, game_code)
         return
 
+    game_store.touch_game(game_code)
     game_manager = game_store.get_game(game_code)
+    timer.mark(SESSION)
 
     #try:
-    game, events = game_manager.handle_game_event(client_id, game_event, data)
+    game, events = yield game_manager.submit_game_event(client_id, game_event, data, timer)
     for event in events: event.emit()
+    timer.stop()
     return game
     #except Exception as e:
     #
@@ -86,7 +112,7 @@ def player_turn(message):
     try:
         game_code_raw, client_id = get_session_data(session)
     except ValueError as err:
-        emit('error', str(err))
+        wire_formats.emit('error', str(err))
         return
 
     game_code = GameCode(game_code_raw)
@@ -128,11 +154,23 @@ def player_turn(message):
 
 @socketio.on(GameEvent.CHOOSE_WORD.value)
 def choose_word(word):
-    game_event_handler(GameEvent.CHOOSE_WORD, word)
+    yield from game_event_handler(GameEvent.CHOOSE_WORD, word)
 
 @socketio.on(GameEvent.SUBMIT_CLUE.value)
 def submit_clue(clue):
-    game_event_handler(GameEvent.SUBMIT_CLUE, clue)
+    yield from game_event_handler(GameEvent.SUBMIT_CLUE, clue)
+
+@socketio.on(GameEvent.SYNC.value)
+def sync_game():
+    yield from game_event_handler(GameEvent.SYNC)
+
+@socketio.on(GameEvent.SUGGEST_CLUES.value)
+def suggest_clues():
+    yield from game_event_handler(GameEvent.SUGGEST_CLUES)
+
+@socketio.on(GameEvent.LOG_HISTORY.value)
+def log_history(cursor):
+    yield from game_event_handler(GameEvent.LOG_HISTORY, cursor)
 
 @socketio.on('pause game')
 def player_pause_game():
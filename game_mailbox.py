@@ -0,0 +1,56 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import global_config as config
+import threading
+
+
+class Mailbox(object):
+    ''' Single-writer queue of work on one game. Submitted calls run one at
+        a time, in submission order, on a shared executor, so different
+        games run in parallel while a game's state is only ever touched by
+        one worker at a time (no game needs a lock of its own).
+        A mailbox holds at most one task on the executor; it runs up to
+        `batch_size` calls before yielding its worker to other games.
+    '''
+
+    def __init__(self, executor, batch_size=16):
+        self.executor = executor
+        self.batch_size = batch_size
+        # Pending (future, function, args).
+        self.queue = deque()
+        # Whether a task draining the queue is on the executor.
+        self.scheduled = False
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        ''' Queues `function(*args)`, returning a Future of its result. '''
+        future = Future()
+        with self.lock:
+            self.queue.append((future, function, args))
+            if self.scheduled:
+                return future
+            self.scheduled = True
+        self.executor.submit(self._drain)
+        return future
+
+    def get_num_pending(self):
+        return len(self.queue)
+
+    def _drain(self):
+        for _ in range(self.batch_size):
+            with self.lock:
+                if not self.queue:
+                    self.scheduled = False
+                    return
+                future, function, args = self.queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        # Still scheduled, behind the games that were waiting for a worker.
+        self.executor.submit(self._drain)
+
+# For global access
+game_workers = ThreadPoolExecutor(config.GAME_WORKERS, thread_name_prefix='game-worker')
@@ -1,7 +1,14 @@
+from broadcast_coalescer import CoalescedEvent, lobby_updates
+from card import CardStatus
 from client_manager import ClientManager, ClientEvent
+from clue_suggester import ClueSuggester
 from game import CodenameGame, GameEvent
+from game_events import GAME_EVENTS, decode_event, encode_event
+from game_mailbox import Mailbox, game_workers
 from enum import Enum
-from transitions import Machine
+from metrics import MUTATION, NULL_TIMER, QUEUE, SERIALIZATION
+from player import PlayerRole, PlayerTeam
+from state_machine import StateMachine
 from utils import JSONUtils, EmitEvent
 
 
@@ -10,7 +17,7 @@ class GameState(Enum):
     IN_GAME  = 1
     IN_ENDSCREEN = 2
 
-class GameManager(object):
+class GameManager(StateMachine):
     states = [ GameState.IN_LOBBY, GameState.IN_GAME, GameState.IN_ENDSCREEN ]
 
     transitions = [
@@ -19,43 +26,106 @@ class GameManager(object):
         ['game_over', GameState.IN_GAME, GameState.IN_ENDSCREEN],
     ]
 
-    def __init__(self, game_code):
+    def __init__(self, game_code, game_config=None):
+        super().__init__(initial=GameState.IN_LOBBY)
         # Game code of game being managed.
         self.game_code = game_code
-        # Generated codename game.
-        self.game = CodenameGame()
+        # Generated codename game (on the given configuration snapshot, or
+        # the current one).
+        self.game = CodenameGame(game_config=game_config)
         # Manager for clients (and players)
-        self.client_manager = ClientManager()
+        self.client_manager = ClientManager(self.game.config)
         # Manager for displaying the right data to a client
         # self.display_manager = DisplayManager()
-        self.machine = Machine(
-            model=self,
-            states=GameManager.states,
-            initial=GameState.IN_LOBBY,
-            transitions=GameManager.transitions,
-        )
+        # Number of events (see game_events.py) applied so far.
+        self.event_seq = 0
+        # Callback receiving (game manager, records) after every command
+        # that applied events (as recorded by `encode_event`, the last one
+        # numbered `event_seq`), set by the game store.
+        self.journal = None
+        # Runs the events of this game one at a time (see `submit`).
+        self.mailbox = Mailbox(game_workers)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['journal'] = None
+        del state['mailbox']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.mailbox = Mailbox(game_workers)
+
+    def submit(self, function, *args):
+        ''' Runs `function(*args)` on this game's mailbox, after everything
+            submitted before it, and returns a Future of its result. Every
+            change to the game goes through here.
+        '''
+        return self.mailbox.submit(function, *args)
+
+    def submit_client_event(self, client_id, client_event, data, timer=NULL_TIMER):
+        ''' Queues a client event, see `handle_client_event`. '''
+        return self.submit(self.handle_client_event, client_id, client_event, data, timer)
+
+    def submit_game_event(self, client_id, game_event, data, timer=NULL_TIMER):
+        ''' Queues a game event, see `handle_game_event`. '''
+        return self.submit(self.handle_game_event, client_id, game_event, data, timer)
+
+    def _record_events(self):
+        ''' Numbers the events applied by the last command and passes them
+            to the journal.
+        '''
+        events = self.client_manager.pop_events()
+        events.extend(self.game.pop_events())
+        if not events:
+            return
+        self.event_seq += len(events)
+        if self.journal is not None:
+            self.journal(self, [encode_event(event) for event in events])
+
+    def apply_event(self, event):
+        ''' Applies an event to the game or its clients. '''
+        if isinstance(event, GAME_EVENTS):
+            self.game.apply(event)
+        else:
+            self.client_manager.apply(event)
+
+    def replay_event(self, seq, record):
+        ''' Re-applies a recorded event (see `_record_events`). Events carry
+            the outcomes that depend on randomness (new clients and
+            players), so replaying them rebuilds the same state.
+        '''
+        self.apply_event(decode_event(record))
+        self.event_seq = seq
 
     def get_game(self):
         ''' Returns contained CodenamesGame object. '''
         return self.game
 
     def get_lobby_update_event(self):
-        ''' Constructs a client UPDATE event based upon the current state. '''
-        lobby_bundle = self.client_manager.get_lobby_bundle()
-        return EmitEvent(
+        ''' Constructs a client UPDATE event broadcasting the lobby state.
+            Updates are coalesced per room (see `BroadcastCoalescer`), the
+            lobby bundle is built on the game's mailbox when the update is
+            actually sent, and broadcast once built (nothing waits for it, so
+            this is safe from within the mailbox).
+        '''
+        return CoalescedEvent(
+            lobby_updates,
+            self.game_code,
             ClientEvent.UPDATE.value,
-            lobby_bundle,
-            room=self.game_code,
-            broadcast=True
+            lambda: self.submit(self.client_manager.get_lobby_bundle)
         )
 
-    def handle_client_event(self, client_id, client_event, data):
+    def handle_client_event(self, client_id, client_event, data, timer=NULL_TIMER):
         ''' Passes client events down to the client manager to deal with and
             appends an UPDATE event.
         '''
-        client_manager = self.client_manager
-        client, events = client_manager.handle_event(self.game_code, client_id, client_event, data)
+        timer.mark(QUEUE)
+        client, events = self.client_manager.handle_event(self.game_code, client_id, client_event, data)
+        self._record_events()
+        timer.mark(MUTATION)
         events.append(self.get_lobby_update_event())
+        timer.mark(SERIALIZATION)
         return client, events
 
     def validate_client_has_current_role(self, client_id):
@@ -63,17 +133,82 @@ class GameManager(object):
         return self.client_manager.client_has_role(client_id, team, role)
 
     def get_game_update_event(self):
-        ''' Constructs a game UPDATE event based upon the current state. '''
+        ''' Constructs a game UPDATE event based upon the current state.
+            Only sent to the requesting client (full snapshots are never
+            broadcast, see `get_game_patch_events`).
+        '''
         game_bundle = self.game.serialize()
-        return EmitEvent(
-            GameEvent.UPDATE.value,
-            game_bundle,
-            room=self.game_code,
-            broadcast=True
-        )
+        return EmitEvent(GameEvent.UPDATE.value, game_bundle)
 
-    def handle_game_event(self, client_id, game_event, data):
+    def get_game_patch_events(self):
+        ''' Constructs a game PATCH event for every mutation since the last
+            broadcast. Clients apply them in version order and request a SYNC
+            when they detect a gap.
+        '''
+        return [
+            EmitEvent(
+                GameEvent.PATCH.value,
+                patch,
+                room=self.game_code,
+                broadcast=True
+            )
+            for patch in self.game.pop_patches()
+        ]
+
+    def get_clue_suggestions_event(self, client_id):
+        ''' Constructs a CLUE_SUGGESTIONS event for the spymaster whose turn
+            it is. Only sent to the requesting client.
+        '''
+        team, role = self.game.get_current_turn()
+        if role is not PlayerRole.SPYMASTER or not self.client_manager.client_has_role(client_id, team, role):
+            return EmitEvent('error', 'Clue suggestions are only available to the current spymaster')
+        clue_suggester = ClueSuggester.get()
+        if clue_suggester is None:
+            return EmitEvent('error', 'Clue suggestions are not available')
+        team_status = CardStatus.RED if team is PlayerTeam.RED else CardStatus.BLUE
+        return EmitEvent(GameEvent.CLUE_SUGGESTIONS.value, {
+            'version': self.game.version,
+            'suggestions': clue_suggester.suggest(self.game.board, team_status),
+        })
+
+    def get_log_page_event(self, cursor):
+        ''' Constructs a LOG_PAGE event with the activity log entries that
+            precede `cursor` (a seq, as returned with every page). Only sent
+            to the requesting client.
+        '''
+        try:
+            before = int(cursor)
+        except (TypeError, ValueError):
+            return EmitEvent('error', 'Invalid activity log cursor')
+        log, cursor = self.game.activity_log.get_page(before)
+        return EmitEvent(GameEvent.LOG_PAGE.value, {
+            'log': log,
+            'cursor': cursor,
+        })
+
+    def handle_game_event(self, client_id, game_event, data, timer=NULL_TIMER):
+        timer.mark(QUEUE)
         events = []
+        if game_event is GameEvent.SYNC:
+            timer.mark(MUTATION)
+            events.append(self.get_game_update_event())
+        elif game_event is GameEvent.LOG_HISTORY:
+            timer.mark(MUTATION)
+            events.append(self.get_log_page_event(data))
+        elif game_event is GameEvent.SUGGEST_CLUES:
+            timer.mark(MUTATION)
+            events.append(self.get_clue_suggestions_event(client_id))
+        else:
+            self.apply_game_event(game_event, data)
+            self._record_events()
+            timer.mark(MUTATION)
+
+        events.extend(self.get_game_patch_events())
+        timer.mark(SERIALIZATION)
+        return self.game, events
+
+    def apply_game_event(self, game_event, data):
+        ''' Applies a state changing game event to the contained game. '''
         game = self.game
         # TODO: validate that the move came from the expected client
         # self.validate_client_has_current_role(client_id)
@@ -90,12 +225,18 @@ class GameManager(object):
             # TODO validate clue
             game.set_current_clue(clue['word'], int(clue['number']))
 
-        events.append(self.get_game_update_event())
-        return game, events
-
     def get_num_clients(self):
         return self.client_manager.get_num_clients()
 
+    def get_num_dangling_clients(self):
+        return self.client_manager.get_num_dangling_clients()
+
+    def get_state_version(self):
+        ''' Returns a version that changes whenever the game or its clients
+            change, for caching serialized bundles.
+        '''
+        return (self.game.version, self.client_manager.version)
+
     def serialize_game(self):
         ''' Serializes contained game to JSON object along with game code. '''
         game_bundle = self.game.serialize()
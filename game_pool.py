@@ -0,0 +1,91 @@
+from collections import deque
+from config import global_config as config
+from game_manager import GameManager
+import threading
+import time
+
+
+class GamePool(object):
+    ''' Pool of ready-to-use games, built ahead of time on the current
+        configuration snapshot. Like `MapCardPool`, a background thread
+        refills it whenever it drops below half its size, so creating a game
+        only pops one and gives it a code. Games with board overrides (or
+        created while the pool is empty) are built on the request path.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        # Games without a code yet, built on `config.snapshot()`.
+        self.games = deque() # Deque[GameManager]
+        self.refill_needed = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Number of games built on the request path (pool was empty).
+        self.misses = 0
+        # Number of games built in the background, and the time spent on it.
+        self.refilled = 0
+        self.refill_seconds = 0.0
+
+    @classmethod
+    def from_config(cls):
+        return cls(config.GAME_POOL_SIZE)
+
+    def get(self, game_code, game_config=None):
+        ''' Returns a new game with the given code, on the given configuration
+            snapshot (or the current one).
+        '''
+        current = config.snapshot()
+        game_manager = None
+        if game_config is None or game_config is current:
+            game_manager = self._pop(current)
+            if game_manager is None and self.size > 0:
+                self.misses += 1
+            if len(self.games) < self.size // 2:
+                self._request_refill()
+        if game_manager is None:
+            game_manager = GameManager(None, game_config or current)
+        game_manager.game_code = game_code
+        return game_manager
+
+    def _pop(self, current):
+        while True:
+            try:
+                game_manager = self.games.popleft()
+            except IndexError:
+                return None
+            # Games built before a configuration reload are dropped.
+            if game_manager.game.config is current:
+                return game_manager
+
+    def _request_refill(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='game-pool')
+                self.thread.daemon = True
+                self.thread.start()
+        self.refill_needed.set()
+
+    def _run(self):
+        while True:
+            self.refill_needed.wait()
+            self.refill_needed.clear()
+            current = config.snapshot()
+            start = time.perf_counter()
+            built = 0
+            while len(self.games) < self.size:
+                self.games.append(GameManager(None, current))
+                built += 1
+            self.refilled += built
+            self.refill_seconds += time.perf_counter() - start
+
+    def get_metrics(self):
+        ''' Returns the pool depth, refill counters and misses. '''
+        return {
+            'depth': len(self.games),
+            'refilled': self.refilled,
+            'refill_rate': self.refilled / self.refill_seconds if self.refill_seconds else 0,
+            'misses': self.misses,
+        }
+
+# For global access
+game_pool = GamePool.from_config()
@@ -0,0 +1,129 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class GameReaper(object):
+    ''' Expires games that have been inactive for `idle_timeout` seconds.
+        A single background thread sleeps until the earliest deadline in a
+        heap, then hands every expired game to `on_expire` in one batch.
+        Activity only updates a timestamp; a game's deadline is re-armed
+        lazily when it comes due.
+    '''
+
+    def __init__(self, idle_timeout, on_expire):
+        # Seconds without activity after which a game expires.
+        self.idle_timeout = idle_timeout
+        # Callback receiving a list of expired game codes.
+        self.on_expire = on_expire
+        # Last activity time of each tracked game.
+        self.last_activity = {} # Dict[GameCode, float]
+        # Heap of (deadline, generation, game code). Only the entry with the
+        # current generation of a game is live, stale ones (of untracked or
+        # re-armed games) are skipped when they come due.
+        self.deadlines = []
+        self.counter = itertools.count()
+        # Generation of the live heap entry of each tracked game.
+        self.generations = {} # Dict[GameCode, int]
+        self.condition = threading.Condition()
+        self.thread = None
+        # Clean up metrics.
+        self.sweeps = 0
+        self.reaped_games = 0
+        self.last_sweep_size = 0
+        self.last_sweep_seconds = 0.0
+
+    def start(self):
+        ''' Starts the reaper thread (if not already running). '''
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name='game-reaper')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def track(self, game_code):
+        ''' Starts tracking the activity of a game. '''
+        now = time.monotonic()
+        with self.condition:
+            self.last_activity[game_code] = now
+            self._push(now + self.idle_timeout, game_code)
+            if self.deadlines[0][2] == game_code:
+                self.condition.notify()
+
+    def _push(self, deadline, game_code):
+        generation = next(self.counter)
+        self.generations[game_code] = generation
+        heapq.heappush(self.deadlines, (deadline, generation, game_code))
+
+    def touch(self, game_code):
+        ''' Records activity on a game. '''
+        if game_code in self.last_activity:
+            self.last_activity[game_code] = time.monotonic()
+
+    def untrack(self, game_code):
+        ''' Stops tracking a game (its heap entry is skipped when it comes due). '''
+        with self.condition:
+            self.last_activity.pop(game_code, None)
+            self.generations.pop(game_code, None)
+
+    def get_num_tracked(self):
+        return len(self.last_activity)
+
+    def get_metrics(self):
+        ''' Returns clean up counters. '''
+        return {
+            'tracked_games': self.get_num_tracked(),
+            'sweeps': self.sweeps,
+            'reaped_games': self.reaped_games,
+            'last_sweep_size': self.last_sweep_size,
+            'last_sweep_seconds': self.last_sweep_seconds,
+        }
+
+    def sweep(self, now=None):
+        ''' Pops every due deadline, returning the games that are expired and
+            re-arming the ones that saw activity since.
+        '''
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.condition:
+            deadlines = self.deadlines
+            while deadlines and deadlines[0][0] <= now:
+                _, generation, game_code = heapq.heappop(deadlines)
+                if self.generations.get(game_code) != generation:
+                    continue
+                deadline = self.last_activity[game_code] + self.idle_timeout
+                if deadline <= now:
+                    del self.last_activity[game_code]
+                    del self.generations[game_code]
+                    expired.append(game_code)
+                else:
+                    self._push(deadline, game_code)
+        return expired
+
+    def _run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                if self.deadlines[0][0] > now:
+                    self.condition.wait(self.deadlines[0][0] - now)
+                    continue
+            start = time.monotonic()
+            expired = self.sweep()
+            if expired:
+                try:
+                    self.on_expire(expired)
+                except Exception:
+                    logging.exception('[CLEAN UP] Failed to remove expired games')
+            self.sweeps += 1
+            self.reaped_games += len(expired)
+            self.last_sweep_size = len(expired)
+            self.last_sweep_seconds = time.monotonic() - start
+            if expired:
+                logging.info('[CLEAN UP] Reaped %d idle games in %.6fs',
+                             len(expired), self.last_sweep_seconds)
@@ -0,0 +1,289 @@
+from async_mode import run_blocking
+from game_code import GameCode
+import json
+import logging
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+
+
+class GameStorage:
+	'''	Interface defining required methods of a game storage backend.
+		The game store keeps live games in memory and reports every change
+		to its storage backend, which is used to recover games on startup.
+	'''
+
+	@staticmethod
+	def factory(type, path=None, flush_interval=None):
+		''' Factory method for constructing game storage by type. '''
+		if type == "memory":
+			return MemoryGameStorage()
+		elif type == "sqlite":
+			return SQLiteGameStorage(path, flush_interval)
+		else:
+			raise ValueError("Unknown game storage type specified")
+
+	def append_event(self, game_code, seq, record):
+		''' Records event number `seq` of a game. '''
+		raise NotImplementedError("Please Implement this method")
+
+	def save_snapshot(self, game_code, seq, game_manager):
+		''' Records the full state of a game after event number `seq`.
+			Events up to `seq` are no longer needed for recovery.
+		'''
+		raise NotImplementedError("Please Implement this method")
+
+	def compact(self, game_code, seq):
+		''' Replaces the latest snapshot of a game and its events up to `seq`
+			by a snapshot after event `seq`, built by the backend from the
+			records themselves (the game is not touched, so this is cheap for
+			the caller).
+		'''
+		raise NotImplementedError("Please Implement this method")
+
+	def delete_game(self, game_code):
+		''' Removes a game, all its events and its archived log entries. '''
+		raise NotImplementedError("Please Implement this method")
+
+	def archive_log_entry(self, game_code, entry):
+		''' Records a (serialized) activity log entry that left memory. '''
+		raise NotImplementedError("Please Implement this method")
+
+	def load_log_entries(self, game_code, start, end):
+		''' Returns the archived log entries of a game with `start` <= seq <
+			`end`, oldest first.
+		'''
+		raise NotImplementedError("Please Implement this method")
+
+	def load_games(self):
+		''' Yields (game code, latest snapshot, [(seq, record)] events since
+			the snapshot) for every stored game.
+		'''
+		raise NotImplementedError("Please Implement this method")
+
+	def flush(self):
+		''' Blocks until all recorded changes are durable. '''
+		pass
+
+class GameLogArchive:
+	''' Archive of the activity log of one game (see `ActivityLog`), backed
+		by the game storage.
+	'''
+
+	def __init__(self, storage, game_code):
+		self.storage = storage
+		self.game_code = game_code
+
+	def append(self, entry):
+		self.storage.archive_log_entry(self.game_code, entry)
+
+	def load(self, start, end):
+		return self.storage.load_log_entries(self.game_code, start, end)
+
+class MemoryGameStorage(GameStorage):
+	''' Storage backend that keeps nothing: games are lost on restart.
+		Archived log entries are kept in memory while their game lives.
+	'''
+
+	def __init__(self):
+		# Archived log entries by game code and seq.
+		self.log_entries = {} # Dict[GameCode, Dict[int, dict]]
+
+	def append_event(self, game_code, seq, record):
+		pass
+
+	def save_snapshot(self, game_code, seq, game_manager):
+		pass
+
+	def compact(self, game_code, seq):
+		pass
+
+	def delete_game(self, game_code):
+		self.log_entries.pop(game_code, None)
+
+	def archive_log_entry(self, game_code, entry):
+		self.log_entries.setdefault(game_code, {})[entry["seq"]] = entry
+
+	def load_log_entries(self, game_code, start, end):
+		entries = self.log_entries.get(game_code, {})
+		return [entries[seq] for seq in range(start, end) if seq in entries]
+
+	def load_games(self):
+		return []
+
+class SQLiteGameStorage(GameStorage):
+	'''	Storage backend writing snapshots and an event log to a SQLite file.
+		Writes are queued and applied by a single writer thread, which groups
+		everything queued within `flush_interval` seconds into one transaction
+		so the request path never waits on the disk. Periodic snapshots are
+		built on the writer too (see `compact`), by replaying the logged
+		events over the previous snapshot.
+	'''
+
+	SCHEMA = """
+		CREATE TABLE IF NOT EXISTS snapshots (
+			game_code TEXT PRIMARY KEY,
+			seq INTEGER NOT NULL,
+			data BLOB NOT NULL
+		);
+		CREATE TABLE IF NOT EXISTS events (
+			game_code TEXT NOT NULL,
+			seq INTEGER NOT NULL,
+			data TEXT NOT NULL,
+			PRIMARY KEY (game_code, seq)
+		);
+		CREATE TABLE IF NOT EXISTS log_entries (
+			game_code TEXT NOT NULL,
+			seq INTEGER NOT NULL,
+			data TEXT NOT NULL,
+			PRIMARY KEY (game_code, seq)
+		);
+	"""
+
+	# Maximum number of writes committed in one transaction.
+	MAX_BATCH_SIZE = 1024
+
+	def __init__(self, path, flush_interval):
+		self.path = path
+		self.flush_interval = flush_interval
+		# Pending (sql, params) writes or functions of the connection, None
+		# stops the writer.
+		self.writes = queue.Queue()
+		connection = self._connect()
+		connection.executescript(SQLiteGameStorage.SCHEMA)
+		connection.close()
+		self.thread = threading.Thread(target=self._run, name='game-storage')
+		self.thread.daemon = True
+		self.thread.start()
+
+	def _connect(self):
+		# Used from the native threads of `run_blocking` in green thread modes.
+		connection = sqlite3.connect(self.path, check_same_thread=False)
+		connection.execute("PRAGMA journal_mode=WAL")
+		connection.execute("PRAGMA synchronous=NORMAL")
+		return connection
+
+	def append_event(self, game_code, seq, record):
+		self.writes.put((
+			"INSERT OR REPLACE INTO events VALUES (?, ?, ?)",
+			(str(game_code), seq, json.dumps(record))
+		))
+
+	def save_snapshot(self, game_code, seq, game_manager):
+		data = pickle.dumps(game_manager, pickle.HIGHEST_PROTOCOL)
+		self.writes.put((
+			"INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+			(str(game_code), seq, data)
+		))
+		self.writes.put((
+			"DELETE FROM events WHERE game_code = ? AND seq <= ?",
+			(str(game_code), seq)
+		))
+
+	def compact(self, game_code, seq):
+		self.writes.put(lambda connection: self._compact(connection, str(game_code), seq))
+
+	def _compact(self, connection, game_code, seq):
+		# Runs on the writer, after the events queued before it.
+		row = connection.execute(
+			"SELECT seq, data FROM snapshots WHERE game_code = ?", (game_code,)
+		).fetchone()
+		if row is None or row[0] >= seq:
+			return
+		game_manager = pickle.loads(row[1])
+		events = connection.execute(
+			"SELECT seq, data FROM events WHERE game_code = ? AND seq > ? AND seq <= ? ORDER BY seq",
+			(game_code, row[0], seq)
+		).fetchall()
+		if len(events) != seq - row[0]:
+			logging.error('[STORAGE] Missing events of game %s, not compacted', game_code)
+			return
+		for event_seq, record in events:
+			game_manager.replay_event(event_seq, json.loads(record))
+		connection.execute(
+			"INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+			(game_code, seq, pickle.dumps(game_manager, pickle.HIGHEST_PROTOCOL))
+		)
+		connection.execute("DELETE FROM events WHERE game_code = ? AND seq <= ?", (game_code, seq))
+
+	def delete_game(self, game_code):
+		self.writes.put(("DELETE FROM snapshots WHERE game_code = ?", (str(game_code),)))
+		self.writes.put(("DELETE FROM events WHERE game_code = ?", (str(game_code),)))
+		self.writes.put(("DELETE FROM log_entries WHERE game_code = ?", (str(game_code),)))
+
+	def archive_log_entry(self, game_code, entry):
+		self.writes.put((
+			"INSERT OR REPLACE INTO log_entries VALUES (?, ?, ?)",
+			(str(game_code), entry["seq"], json.dumps(entry))
+		))
+
+	def load_log_entries(self, game_code, start, end):
+		# Entries that just left memory may still be queued.
+		self.flush()
+		return run_blocking(self._load_log_entries, str(game_code), start, end)
+
+	def _load_log_entries(self, game_code, start, end):
+		connection = self._connect()
+		try:
+			rows = connection.execute(
+				"SELECT data FROM log_entries WHERE game_code = ? AND seq >= ? AND seq < ? ORDER BY seq",
+				(game_code, start, end)
+			)
+			return [json.loads(data) for data, in rows]
+		finally:
+			connection.close()
+
+	def load_games(self):
+		connection = self._connect()
+		try:
+			snapshots = connection.execute("SELECT game_code, seq, data FROM snapshots").fetchall()
+			for game_code, seq, data in snapshots:
+				events = connection.execute(
+					"SELECT seq, data FROM events WHERE game_code = ? AND seq > ? ORDER BY seq",
+					(game_code, seq)
+				)
+				records = [(event_seq, json.loads(record)) for event_seq, record in events]
+				yield GameCode(game_code), pickle.loads(data), records
+		finally:
+			connection.close()
+
+	def flush(self):
+		self.writes.join()
+
+	def close(self):
+		''' Flushes pending writes and stops the writer thread. '''
+		self.writes.put(None)
+		self.thread.join()
+
+	def _commit(self, connection, batch):
+		try:
+			with connection:
+				for write in batch:
+					if callable(write):
+						write(connection)
+					elif write is not None:
+						connection.execute(*write)
+		except Exception:
+			logging.exception('[STORAGE] Failed to commit %d writes', len(batch))
+
+	def _run(self):
+		connection = self._connect()
+		while True:
+			batch = [self.writes.get()]
+			deadline = time.monotonic() + self.flush_interval
+			while batch[-1] is not None and len(batch) < SQLiteGameStorage.MAX_BATCH_SIZE:
+				timeout = deadline - time.monotonic()
+				if timeout <= 0:
+					break
+				try:
+					batch.append(self.writes.get(timeout=timeout))
+				except queue.Empty:
+					break
+			run_blocking(self._commit, connection, batch)
+			for _ in batch:
+				self.writes.task_done()
+			if batch[-1] is None:
+				connection.close()
+				return
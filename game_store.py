@@ -1,55 +1,126 @@
+from broadcast_coalescer import lobby_updates
 from config import global_config as config
+from flask.json import htmlsafe_dumps
 from game import CodenameGame
-from game_code import *
-from game_manager import GameManager
+from game_code import GameCode, GameCodeAllocator
+from game_pool import game_pool
+from game_reaper import GameReaper
+from game_storage import GameLogArchive, GameStorage
 import logging
+from metrics import metrics
 from player import PlayerRole
-import time, threading
+from sharding import shard_router
 from utils import JSONUtils
 
 
 class ActiveGameStore:
-	''' In-memory store for games currently in play (active). '''
+	''' In-memory store for games currently in play (active).
+		Every game change is also recorded to a storage backend (snapshots
+		and an event log) so games can be recovered after a restart.
+	'''
 
-	def __init__(self):
+	def __init__(self, storage):
 		# Mapping of active game codes to game managers.
 		self.active_games = {} # Dict[GameCode, GameManager]
-
-	def create_game(self, game_code_option = None):
+		# Backend recording game snapshots and events.
+		self.storage = storage # GameStorage
+		# Cache of encoded full game bundles, by game code and role.
+		self.bundle_cache = {} # Dict[(GameCode, PlayerRole), (version, str)]
+		# Hands out codes of new games.
+		self.game_codes = GameCodeAllocator.from_config()
+		# Expires games after config.CLEAN_UP_DELTA seconds without activity.
+		self.reaper = GameReaper(config.CLEAN_UP_DELTA, self.remove_games)
+		self.reaper.start()
+
+	def create_game(self, game_code_option = None, game_config = None):
 		''' Wrapper method for creating new game, and adding to game_store.
 			If no game code is provided, a new game code is generated (and used).
+			The game keeps the given configuration snapshot (with its
+			overrides), or the current one, and is taken from the pool of
+			pre-built games (see `GamePool`) when it can be.
 		'''
-		game_code = self.create_game_code() if game_code_option is None else game_code_option
-		self.update_game(game_code, GameManager(game_code))
-
-        # Initiate a timer to kill off this game if doesn't have any clients
-        # after config.CLEAN_UP_DELTA seconds
-		# TODO: this is pretty hacky and bad because it will destroy a game
-		# 	    no matter how active it has been, if it has no clients after
-		#       CLEAN_UP_DELTA seconds.
-		if not __debug__:
-			threading.Timer(config.CLEAN_UP_DELTA, lambda: self.watch(game_code)).start()
+		if game_code_option is None:
+			game_code = self.create_game_code()
+		else:
+			game_code = game_code_option
+			self.game_codes.track(game_code)
+		self.update_game(game_code, game_pool.get(game_code, game_config))
+		self.reaper.track(game_code)
 		return game_code
 
 	def create_game_code(self):
-		''' Wrapper method for generating new game code
-			with the globally configured game code length.
+		''' Wrapper method for allocating a new game code (see
+			`GameCodeAllocator`). Codes of games recovered from storage are
+			skipped, and when sharded, only codes owned by this process'
+			shard are used.
 		'''
-		code_len = config.getGameCodeLen()
-		return generate_unique_game_code(code_len, self.active_games)
+		return self.game_codes.allocate(
+			lambda game_code: game_code not in self.active_games and shard_router.owns(game_code)
+		)
 
 	def remove_game(self, game_code):
 		if game_code not in self.active_games:
 			raise ValueError("%s not found in game store" % str(game_code))
-		del self.active_games[game_code]
+		game_manager = self.active_games.pop(game_code)
+		# Events still queued on the game are no longer recorded.
+		game_manager.journal = None
+		game_manager.game.activity_log.archive = None
+		self.reaper.untrack(game_code)
+		self.storage.delete_game(game_code)
+		for role in PlayerRole:
+			self.bundle_cache.pop((game_code, role), None)
+		lobby_updates.discard(game_code)
+		self.game_codes.release(game_code)
 
 	def contains_game(self, game_code):
 		''' Checks if active game store contains given game code. '''
 		return game_code in self.active_games
 
+	def is_pending_game(self, game_code):
+		''' Checks if a game is still as it was created: in the store, in
+			its lobby, and never joined by any client.
+		'''
+		game_manager = self.active_games.get(game_code)
+		return game_manager is not None and game_manager.event_seq == 0
+
 	def update_game(self, game_code, new_game):
 		''' Overrides stored game at given game code with new provided game. '''
 		self.active_games[game_code] = new_game
+		new_game.journal = self.record_events
+		new_game.game.activity_log.archive = GameLogArchive(self.storage, game_code)
+		self.storage.save_snapshot(game_code, new_game.event_seq, new_game)
+
+	def record_events(self, game_manager, records):
+		''' Journal callback of stored games: logs the events of a command
+			and compacts them into a snapshot every config.SNAPSHOT_INTERVAL
+			events.
+		'''
+		game_code = game_manager.game_code
+		seq = game_manager.event_seq
+		first_seq = seq - len(records) + 1
+		for offset, record in enumerate(records):
+			self.storage.append_event(game_code, first_seq + offset, record)
+		# Snapshots are only consistent between commands. They are built by
+		# the storage backend, off the game's mailbox.
+		if (first_seq - 1) // config.SNAPSHOT_INTERVAL != seq // config.SNAPSHOT_INTERVAL:
+			self.storage.compact(game_code, seq)
+
+	def recover_games(self):
+		''' Loads the games recorded in storage, replaying the events logged
+			since each game's latest snapshot.
+		'''
+		for game_code, game_manager, records in self.storage.load_games():
+			if not shard_router.owns(game_code):
+				continue
+			game_manager.game.activity_log.archive = GameLogArchive(self.storage, game_code)
+			for seq, record in records:
+				game_manager.replay_event(seq, record)
+			self.active_games[game_code] = game_manager
+			game_manager.journal = self.record_events
+			self.reaper.track(game_code)
+			self.game_codes.track(game_code)
+			logging.info('[STORAGE] Recovered game %s (%d events replayed)',
+						 str(game_code), len(records))
 
 	def get_game(self, game_code):
 		''' Returns specified game by game code.'''
@@ -57,17 +128,35 @@ class ActiveGameStore:
 			raise ValueError("%s not found in game store" % str(game_code))
 		return self.active_games[game_code]
 
-	def watch(self, game_code):
-		''' Meant to be called every config.CLEAN_UP_DELTA seconds to check if
-			a game has no clients and delete it if that is the case.
-	    '''
-		logging.info('[CLEAN UP] Checking game %s for clients', str(game_code))
-		game_manager = self.get_game(game_code)
-		if game_manager.get_num_clients() == 0:
-			logging.info('[CLEAN UP] KILLING game %s', str(game_code))
+	def touch_game(self, game_code):
+		''' Records activity on a game, postponing its clean up. '''
+		self.reaper.touch(game_code)
+
+	def get_metrics(self):
+		''' Returns gauges of the games and clients currently in memory. '''
+		games = list(self.active_games.values())
+		return {
+			'active_games': len(games),
+			'clients': sum(game.get_num_clients() for game in games),
+			'dangling_clients': sum(game.get_num_dangling_clients() for game in games),
+			'queued_events': sum(game.mailbox.get_num_pending() for game in games),
+		}
+
+	def remove_games(self, game_codes):
+		''' Removes a batch of (expired) games, skipping already removed ones.
+			Removals are queued on each game's mailbox, behind the events
+			already submitted to it.
+		'''
+		for game_code in game_codes:
+			game_manager = self.active_games.get(game_code)
+			if game_manager is not None:
+				logging.info('[CLEAN UP] KILLING game %s', str(game_code))
+				game_manager.submit(self._remove_expired_game, game_code, game_manager)
+
+	def _remove_expired_game(self, game_code, game_manager):
+		# Skips games removed (or replaced) since they expired.
+		if self.active_games.get(game_code) is game_manager:
 			self.remove_game(game_code)
-		else:
-			threading.Timer(config.CLEAN_UP_DELTA, lambda: self.watch(game_code)).start()
 
 	def get_game_bundle(self, game_code):
 		'''	Returns JSON bundle of all dynamic game information
@@ -104,19 +193,44 @@ class ActiveGameStore:
 		game_manager = self.get_game(game_code)
 		game_bundle = game_manager.serialize_game()
 		JSONUtils.merge_in_place(game_bundle, game_manager.serialize_players_mapping())
-		JSONUtils.include_in_place(game_bundle, 'boardSize', str(config.getNumCards()))
+		JSONUtils.include_in_place(game_bundle, 'boardSize', str(game_manager.game.config.getNumCards()))
 		if role is PlayerRole.SPYMASTER:
 			JSONUtils.include_in_place(game_bundle, 'map', game_manager.game.map_card.serialize())
 		return game_bundle
 
+	def get_encoded_full_game_bundle(self, game_code, role):
+		'''	Returns the full game bundle (see `get_full_game_bundle`) as an
+			HTML-safe JSON string. The encoding is cached per game code and
+			role, and reused until the game or its clients change.
+		'''
+		game_manager = self.get_game(game_code)
+		version = game_manager.get_state_version()
+		key = (game_code, role)
+		cached = self.bundle_cache.get(key)
+		if cached is not None and cached[0] == version:
+			return cached[1]
+		encoded = htmlsafe_dumps(self.get_full_game_bundle(game_code, role))
+		self.bundle_cache[key] = (version, encoded)
+		return encoded
+
 	def get_all_active_games(self):
 		''' Returns in-memory list of all active game codes. '''
 		return [game_code.serialize() for game_code in self.active_games.keys()]
 
-game_store = ActiveGameStore()
+game_store = ActiveGameStore(GameStorage.factory(
+	config.STORAGE_TYPE,
+	path=config.STORAGE_PATH,
+	flush_interval=config.STORAGE_FLUSH_INTERVAL
+))
+game_store.recover_games()
+metrics.add_collector('store', game_store.get_metrics)
+metrics.add_collector('reaper', game_store.reaper.get_metrics)
+metrics.add_collector('game_codes', game_store.game_codes.get_metrics)
+metrics.add_collector('game_pool', game_pool.get_metrics)
 
 # TODO: if debug:
 
 test_game = CodenameGame()
-game_store.create_game(GameCode('test'))
+if shard_router.owns(GameCode('test')) and not game_store.contains_game(GameCode('test')):
+	game_store.create_game(GameCode('test'))
 #game_store.active_games[GameCode('test')] = test_game
@@ -1,13 +1,15 @@
 from client_manager import ClientEvent
-from constants import GAME_CODE_KEY, CLIENT_ID_KEY
+from constants import GAME_CODE_KEY, CLIENT_ID_KEY, WIRE_FORMAT_KEY
 from enum import Enum
 from error_handling import ErrorHandler
 from flask import Blueprint, render_template, abort, session, request, redirect, url_for
-from flask_socketio import emit, join_room, leave_room
 from game_code import GameCode
 from game_store import game_store
+from metrics import metrics, SESSION
+from sharding import shard_router
 from utils import get_session_data
-from __main__ import socketio
+from sockets import socketio
+from wire_format import wire_formats
 
 
 lobby = Blueprint('lobby', __name__, template_folder='templates')
@@ -16,9 +18,12 @@ lobby = Blueprint('lobby', __name__, template_folder='templates')
 @lobby.route('/l/<game_code>')
 def game_lobby(game_code):
     game_code_obj = GameCode(game_code)
+    if not shard_router.owns(game_code_obj):
+        return redirect(shard_router.get_url(game_code_obj, request.full_path))
     session[GAME_CODE_KEY] = game_code
 
     if game_store.contains_game(game_code_obj):
+        game_store.touch_game(game_code_obj)
         return render_template(
             'lobby.html',
             game_code=game_code_obj.serialize(),
@@ -41,10 +46,15 @@ def add_to_lobby():
 ###  Socket listeners ###
 
 def client_event_handler(client_event, data=None):
+    ''' Handles a client event on the game of the session. A generator of
+        the game's mailbox futures (see `SocketServer`), run with
+        `yield from`.
+    '''
+    timer = metrics.time_event(client_event.value)
     try:
         game_code_raw, client_id = get_session_data(session)
     except ValueError as err:
-        emit('error', str(err))
+        wire_formats.emit('error', str(err))
         return
 
     game_code = GameCode(game_code_raw)
@@ -52,19 +62,23 @@ def client_event_handler(client_event, data=None):
         ErrorHandler.game_code_dne(ClientEvent.UPDATE, game_code)
         return
 
+    game_store.touch_game(game_code)
     game_manager = game_store.get_game(game_code)
+    timer.mark(SESSION)
 
     #try:
-    client, events = game_manager.handle_client_event(client_id, client_event, data)
+    client, events = yield game_manager.submit_client_event(client_id, client_event, data, timer)
     #except Exception as e:
     #    emit('error', str(e))
 
     for event in events:
         event.emit()
+    timer.stop()
     return client
 
 @socketio.on(ClientEvent.CONNECT.value)
 def client_connect(cookie):
+    timer = metrics.time_event(ClientEvent.CONNECT.value)
     if GAME_CODE_KEY not in session:
         # TODO: error handling
         return
@@ -75,44 +89,47 @@ def client_connect(cookie):
         ErrorHandler.game_code_dne(ClientEvent.CONNECT, game_code)
         return
 
+    game_store.touch_game(game_code)
     game_manager = game_store.get_game(game_code)
+    timer.mark(SESSION)
 
     #try
-    client, events = game_manager.handle_client_event(
+    client, events = yield game_manager.submit_client_event(
         client_id=None,
         client_event=ClientEvent.CONNECT,
-        data=cookie
+        data=cookie,
+        timer=timer
     )
     #except Exception as e:
     #    emit('error', str(e))
 
-    for event in events: event.emit()
-
     # Store the client id and game code in the session for further requests
     session[CLIENT_ID_KEY] = client.id
 
-    # Add the client's socket to the socket room
-    join_room(game_code)
+    # Add the client's socket to the socket room, so that it gets the lobby
+    # update broadcast as well
+    wire_formats.negotiate(cookie.get(WIRE_FORMAT_KEY) if cookie else None)
+    wire_formats.join(game_code)
 
-    # emit an update to the clients
-    game_manager.get_lobby_update_event().emit()
+    for event in events: event.emit()
+    timer.stop()
 
 
 @socketio.on(ClientEvent.ADD_PLAYER.value)
 def add_player():
-    client_event_handler(ClientEvent.ADD_PLAYER)
+    yield from client_event_handler(ClientEvent.ADD_PLAYER)
 
 @socketio.on(ClientEvent.DELETE_PLAYER.value)
 def delete_player(player_id):
-    client_event_handler(ClientEvent.DELETE_PLAYER, player_id)
+    yield from client_event_handler(ClientEvent.DELETE_PLAYER, player_id)
 
 @socketio.on(ClientEvent.SWITCH_TEAM.value)
 def player_switch_team(player_id):
-    client_event_handler(ClientEvent.SWITCH_TEAM, player_id)
+    yield from client_event_handler(ClientEvent.SWITCH_TEAM, player_id)
 
 @socketio.on(ClientEvent.SWITCH_ROLE.value)
 def player_switch_role(player_id):
-    client_event_handler(ClientEvent.SWITCH_ROLE, player_id)
+    yield from client_event_handler(ClientEvent.SWITCH_ROLE, player_id)
 
 @socketio.on(ClientEvent.INIT_START_GAME.value)
 def player_start_game():
@@ -121,7 +138,7 @@ def player_start_game():
         return
     game_code = session[GAME_CODE_KEY]
     redirect_url = url_for('game.game_data', game_code=game_code)
-    client_event_handler(ClientEvent.INIT_START_GAME, redirect_url)
+    yield from client_event_handler(ClientEvent.INIT_START_GAME, redirect_url)
 
 # TODO: this is problematic.
 # Socket.IO sends the same 'disconnect' event for all disconnects, so we cannot
@@ -129,4 +146,5 @@ def player_start_game():
 # We could maybe use game state for this once that is implemented
 @socketio.on('disconnect')
 def client_leave_lobby():
-    client_event_handler(ClientEvent.DISCONNECT)
+    wire_formats.forget(request.sid)
+    yield from client_event_handler(ClientEvent.DISCONNECT)
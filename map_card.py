@@ -1,48 +1,40 @@
+from board import STATUSES, STATUS_NAMES
 from card import CardStatus
+from collections import deque
 from config import global_config as config
+from math import sqrt
 from player import PlayerTeam
 import random
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Each map card has 1 bomb, 7 neutral, 8 lagging color, 9 starting color
 class MapCard(object):
     ''' A MapCard that holds the information the Spymaster sees.
         - Bomb locations, neutral locations, blue locations, red locations
         Note: the map is visually represented as an n x n grid, but is
-        programatically represented as a 1D array.
+        programatically represented as a 1D bytearray of CardStatus values.
     '''
-    def __init__(self):
-        self.starting_color = random.choice([PlayerTeam.RED, PlayerTeam.BLUE])
-        self.map = self._gen_map_card()
-        self.bomb_location = self.map.index(CardStatus.BOMB)
-
-    def _gen_map_card(self):
-        ''' Generate a MapCard by random placing the desired entities on a grid
-            of the desired size, as passed in from config.
-        '''
-        # TODO: This generation logic needs to be changed
-        # It is very hard to remember a random set of 8 or 9 squares on a 25 square grid
-        # Rather, it is significantly easier to remember when the squares are in contiguous blobs
-        # or have some pattern to them.
-
-        mapping = []
-
-        # Add bombs, reds, blues, and neutrals
-        for bomb in range(config.getNumBombs()):
-            mapping.append(CardStatus.BOMB)
-
-        for red in range(config.getNumReds()):
-            mapping.append(CardStatus.RED)
-
-        for blue in range(config.getNumBlues()):
-            mapping.append(CardStatus.BLUE)
-
-        for neutral in range(config.getNumNeutrals()):
-            mapping.append(CardStatus.NEUTRAL)
-
-        # Randomize ordering
-        random.shuffle(mapping)
-
-        return mapping
+    def __init__(self, layout=None, starting_color=None, game_config=None):
+        if starting_color is None:
+            starting_color = random.choice([PlayerTeam.RED, PlayerTeam.BLUE])
+        self.starting_color = starting_color
+        # Layouts are pre-generated in the background (see `MapCardPool`),
+        # for the card counts of the game's configuration. Boards overridden
+        # for a single game are not pooled (any number of them can be
+        # requested), their layout is generated here.
+        if layout is None:
+            game_config = game_config or config.snapshot()
+            if game_config.game_overrides:
+                layout = MapCardGenerator.from_config(game_config=game_config).generate_batch(1)[0]
+            else:
+                layout = MapCardPool.for_config(game_config).get()
+        self.map = layout
+        self.bomb_location = self.map.index(CardStatus.BOMB.value)
 
     def get_starting_color(self):
         ''' Get the color of the team whose turn it is first'''
@@ -54,26 +46,264 @@ class MapCard(object):
 
     def get_card_type_at_position(self, position):
         ''' Get the type of card at a given position on the map '''
-        return self.map[position]
+        return STATUSES[self.map[position]]
 
     def get_num_card_by_type(self, card_type):
         ''' Get the number of a certain type of card on the map '''
-        return self.map.count(card_type)
+        return self.map.count(card_type.value)
 
     # Serialize the map card into JSON
     def serialize(self):
         ''' Serialize the data in the MapCard '''
         return {
             "starting_color": self.starting_color.value,
-            "map": [str(status.name) for status in self.map],
+            "map": [STATUS_NAMES[status] for status in self.map],
             "bomb_location": self.bomb_location
         }
 
     def __repr__(self):
         output = ""
         max_len = 15
-        spacer = lambda x: x.name + " "*(max_len - len(x.name))
-        for x in range(5):
-            output += "".join(map(spacer, self.map[5*x:5*x+5]))
+        spacer = lambda x: STATUS_NAMES[x] + " "*(max_len - len(STATUS_NAMES[x]))
+        row_size = int(sqrt(len(self.map)))
+        for x in range(0, len(self.map), row_size):
+            output += "".join(map(spacer, self.map[x:x+row_size]))
             output += "\n"
         return output
+
+
+class MapCardGenerator(object):
+    ''' Generates batches of map card layouts for the given card counts.
+        - 'random' mode shuffles the cards uniformly over the grid.
+        - 'pattern' mode places the red and blue cards in contiguous blobs,
+          which are much easier for spymasters to remember. Blob layouts are
+          precomputed once as templates, and every generated layout is a
+          template under a random rotation/reflection of the grid (and a
+          red/blue swap when both teams have as many cards).
+        Batches are generated with NumPy when it is installed.
+    '''
+
+    # Number of precomputed pattern templates.
+    NUM_TEMPLATES = 64
+
+    def __init__(self, mode, num_bombs, num_reds, num_blues, num_neutrals, seed=None):
+        self.mode = mode
+        self.counts = [
+            (CardStatus.BOMB, num_bombs),
+            (CardStatus.RED, num_reds),
+            (CardStatus.BLUE, num_blues),
+            (CardStatus.NEUTRAL, num_neutrals),
+        ]
+        self.num_cards = num_bombs + num_reds + num_blues + num_neutrals
+        self.random = random.Random(seed)
+        self.numpy_random = numpy.random.RandomState(seed) if numpy is not None else None
+        # Every layout is a permutation of this one.
+        self.base_layout = bytearray()
+        for status, count in self.counts:
+            self.base_layout += bytes([status.value]) * count
+        if mode == 'pattern':
+            self.side = int(sqrt(self.num_cards))
+            if self.side * self.side != self.num_cards:
+                raise ValueError("Pattern map cards need a square board")
+            self.templates = [self._gen_template() for _ in range(MapCardGenerator.NUM_TEMPLATES)]
+            self.symmetries = self._gen_symmetries()
+            self.swappable = num_reds == num_blues
+        elif mode != 'random':
+            raise ValueError("Unknown map card mode %s" % mode)
+
+    @classmethod
+    def from_config(cls, seed=None, game_config=None):
+        game_config = game_config or config.snapshot()
+        return cls(
+            game_config.MAP_CARD_MODE,
+            game_config.getNumBombs(),
+            game_config.getNumReds(),
+            game_config.getNumBlues(),
+            game_config.getNumNeutrals(),
+            seed=seed
+        )
+
+    def generate_batch(self, size):
+        ''' Returns `size` new layouts. '''
+        if self.mode == 'pattern':
+            return self._gen_pattern_batch(size)
+        return self._gen_random_batch(size)
+
+    def _gen_random_batch(self, size):
+        if self.numpy_random is not None:
+            base = numpy.frombuffer(bytes(self.base_layout), dtype=numpy.uint8)
+            # One independent permutation of the base layout per row.
+            order = self.numpy_random.random_sample((size, self.num_cards)).argsort(axis=1)
+            return [bytearray(row.tobytes()) for row in base[order]]
+        layouts = []
+        for _ in range(size):
+            layout = bytearray(self.base_layout)
+            self.random.shuffle(layout)
+            layouts.append(layout)
+        return layouts
+
+    def _gen_pattern_batch(self, size):
+        # Red <-> blue lookup table (identity for the other statuses).
+        swap = bytearray(range(256))
+        swap[CardStatus.RED.value] = CardStatus.BLUE.value
+        swap[CardStatus.BLUE.value] = CardStatus.RED.value
+        if self.numpy_random is not None:
+            templates = numpy.array([list(t) for t in self.templates], dtype=numpy.uint8)
+            symmetries = numpy.array(self.symmetries, dtype=numpy.intp)
+            template_choices = self.numpy_random.randint(len(templates), size=size)
+            symmetry_choices = self.numpy_random.randint(len(symmetries), size=size)
+            layouts = templates[template_choices[:, None], symmetries[symmetry_choices]]
+            if self.swappable:
+                swapped = self.numpy_random.randint(2, size=size).astype(bool)
+                layouts[swapped] = numpy.frombuffer(bytes(swap), dtype=numpy.uint8)[layouts[swapped]]
+            return [bytearray(row.tobytes()) for row in layouts]
+        layouts = []
+        for _ in range(size):
+            template = self.random.choice(self.templates)
+            symmetry = self.random.choice(self.symmetries)
+            layout = bytearray(template[i] for i in symmetry)
+            if self.swappable and self.random.random() < 0.5:
+                layout = layout.translate(swap)
+            layouts.append(layout)
+        return layouts
+
+    def _gen_symmetries(self):
+        ''' Returns the 8 rotations/reflections of the grid, each as the list
+            of source positions of every target position.
+        '''
+        side = self.side
+        transforms = [
+            lambda r, c: (r, c),
+            lambda r, c: (c, side - 1 - r),
+            lambda r, c: (side - 1 - r, side - 1 - c),
+            lambda r, c: (side - 1 - c, r),
+            lambda r, c: (r, side - 1 - c),
+            lambda r, c: (side - 1 - r, c),
+            lambda r, c: (c, r),
+            lambda r, c: (side - 1 - c, side - 1 - r),
+        ]
+        symmetries = []
+        for transform in transforms:
+            symmetry = [0] * self.num_cards
+            for position in range(self.num_cards):
+                row, col = transform(*divmod(position, side))
+                symmetry[position] = row * side + col
+            symmetries.append(symmetry)
+        return symmetries
+
+    def _gen_template(self):
+        ''' Grows a contiguous region for each team, then places the bombs and
+            neutrals on the remaining cells. Retries until both regions fit.
+        '''
+        while True:
+            layout = bytearray([CardStatus.EMPTY.value]) * self.num_cards
+            grown = True
+            for status, count in self.counts:
+                if status is CardStatus.RED or status is CardStatus.BLUE:
+                    grown = grown and self._grow_region(layout, status, count)
+            if not grown:
+                continue
+            free = [i for i in range(self.num_cards) if layout[i] == CardStatus.EMPTY.value]
+            self.random.shuffle(free)
+            for status, count in self.counts:
+                if status is CardStatus.BOMB or status is CardStatus.NEUTRAL:
+                    for _ in range(count):
+                        layout[free.pop()] = status.value
+            return layout
+
+    def _grow_region(self, layout, status, count):
+        ''' Marks `count` orthogonally connected empty cells with `status`. '''
+        side = self.side
+        empty = [i for i in range(self.num_cards) if layout[i] == CardStatus.EMPTY.value]
+        if count == 0:
+            return True
+        if not empty:
+            return False
+        region = [self.random.choice(empty)]
+        layout[region[0]] = status.value
+        while len(region) < count:
+            frontier = []
+            for position in region:
+                row, col = divmod(position, side)
+                for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                    if 0 <= r < side and 0 <= c < side and layout[r * side + c] == CardStatus.EMPTY.value:
+                        frontier.append(r * side + c)
+            if not frontier:
+                return False
+            position = self.random.choice(frontier)
+            layout[position] = status.value
+            region.append(position)
+        return True
+
+
+class MapCardPool(object):
+    ''' Pool of pre-generated map card layouts. A background thread refills
+        it in batches whenever it drops below half its size, so creating a
+        game never pays the generation cost (unless the pool runs dry).
+        There is a pool per map card mode and card counts (see `for_config`)
+        of the configuration file, boards with per-game overrides have none.
+    '''
+
+    # Pools by (mode, card counts).
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, generator, size):
+        self.generator = generator
+        self.size = size
+        self.layouts = deque()
+        self.refill_needed = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Number of layouts generated on the request path (pool was empty).
+        self.misses = 0
+
+    @classmethod
+    def for_config(cls, game_config):
+        ''' Returns the pool of the layouts of a configuration. '''
+        key = (
+            game_config.MAP_CARD_MODE,
+            game_config.getNumBombs(),
+            game_config.getNumReds(),
+            game_config.getNumBlues(),
+            game_config.getNumNeutrals(),
+        )
+        pool = cls.pools.get(key)
+        if pool is None:
+            with cls.pools_lock:
+                pool = cls.pools.get(key)
+                if pool is None:
+                    generator = MapCardGenerator.from_config(game_config=game_config)
+                    pool = cls.pools[key] = cls(generator, game_config.MAP_CARD_POOL_SIZE)
+        return pool
+
+    def get(self):
+        ''' Pops a layout from the pool. '''
+        try:
+            layout = self.layouts.popleft()
+        except IndexError:
+            self.misses += 1
+            layout = self.generator.generate_batch(1)[0]
+        if len(self.layouts) < self.size // 2:
+            self._request_refill()
+        return layout
+
+    def _request_refill(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='map-card-pool')
+                self.thread.daemon = True
+                self.thread.start()
+        self.refill_needed.set()
+
+    def _run(self):
+        while True:
+            self.refill_needed.wait()
+            self.refill_needed.clear()
+            missing = self.size - len(self.layouts)
+            if missing > 0:
+                self.layouts.extend(self.generator.generate_batch(missing))
+
+# For global access (the pool of the configured board, other pools are
+# created on demand).
+map_card_pool = MapCardPool.for_config(config.snapshot())
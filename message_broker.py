@@ -0,0 +1,154 @@
+import logging
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+from socketio import PubSubManager
+
+# Frames are a 4 byte big-endian length followed by the payload.
+FRAME_HEADER = struct.Struct('>I')
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def recv_frame(sock):
+    ''' Reads one frame, returning None once the peer has closed. '''
+    header = _recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    return _recv_exactly(sock, FRAME_HEADER.unpack(header)[0])
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def socket_path(url):
+    ''' Returns the filesystem path of a unix:// message queue url. '''
+    if not url.startswith('unix://'):
+        raise ValueError("Unsupported message queue url %s" % url)
+    return url[len('unix://'):]
+
+
+class MessageBroker(object):
+    ''' Minimal local pub/sub broker listening on a UNIX socket.
+        Every frame received on a connection is forwarded to all connections
+        (including the sender), which is all `UnixSocketManager` needs.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        ''' Binds the socket and serves connections from a background thread. '''
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(64)
+        thread = threading.Thread(target=self._accept, name='message-broker')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.close()
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections.add(connection)
+            thread = threading.Thread(target=self._serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                frame = recv_frame(connection)
+                if frame is None:
+                    break
+                self.publish(frame)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.connections.discard(connection)
+            connection.close()
+
+    def publish(self, frame):
+        with self.lock:
+            for connection in list(self.connections):
+                try:
+                    send_frame(connection, frame)
+                except OSError:
+                    self.connections.discard(connection)
+
+
+class UnixSocketManager(PubSubManager):
+    ''' Socket.IO client manager sharing emits between processes through a
+        `MessageBroker`, so that a broadcast from one worker reaches the
+        clients connected to every worker.
+    '''
+    name = 'unix'
+
+    # Seconds to wait before reconnecting to the broker.
+    RECONNECT_DELAY = 1
+
+    def __init__(self, url, channel='flask-socketio', write_only=False):
+        super(UnixSocketManager, self).__init__(channel=channel, write_only=write_only)
+        self.path = socket_path(url)
+        self.publisher = None
+        self.publish_lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _publish(self, data):
+        frame = pickle.dumps((self.channel, data))
+        with self.publish_lock:
+            try:
+                if self.publisher is None:
+                    self.publisher = self._connect()
+                send_frame(self.publisher, frame)
+            except OSError:
+                # Retry once on a fresh connection (the broker may have restarted).
+                self.publisher = self._connect()
+                send_frame(self.publisher, frame)
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect()
+                while True:
+                    frame = recv_frame(sock)
+                    if frame is None:
+                        break
+                    channel, data = pickle.loads(frame)
+                    if channel == self.channel:
+                        yield data
+                sock.close()
+            except OSError:
+                logging.warning('[BROKER] Lost connection to %s, reconnecting', self.path)
+            time.sleep(UnixSocketManager.RECONNECT_DELAY)
@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from time import perf_counter_ns
+
+# Upper bounds (in nanoseconds) of the latency histogram buckets, doubling
+# from 1µs up to ~1s. Anything slower lands in the +Inf bucket.
+LATENCY_BUCKETS_NS = tuple(1000 << i for i in range(21))
+
+# Phases of handling an event, in the order they are marked.
+SESSION = 'session'
+# Waiting on the game's mailbox (see game_mailbox.py) for a worker.
+QUEUE = 'queue'
+MUTATION = 'mutation'
+SERIALIZATION = 'serialization'
+EMIT = 'emit'
+TOTAL = 'total'
+PHASES = (SESSION, QUEUE, MUTATION, SERIALIZATION, EMIT, TOTAL)
+
+
+class Histogram(object):
+    ''' Fixed bucket histogram. Observing a value is a bisect and two
+        additions; buckets are only made cumulative when rendered.
+        Updates are not locked, a lost increment under contention is an
+        acceptable price for keeping the hot path cheap.
+    '''
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # Count of values per bucket, the last bucket being +Inf.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def get_count(self):
+        return sum(self.counts)
+
+
+class EventTimer(object):
+    ''' Times the phases of handling one event. Each `mark` records the time
+        since the previous mark (or the start) under the given phase.
+    '''
+    __slots__ = ('histograms', 'start', 'last')
+
+    def __init__(self, histograms):
+        # Histogram of every phase of the event being timed.
+        self.histograms = histograms
+        self.start = self.last = perf_counter_ns()
+
+    def mark(self, phase):
+        now = perf_counter_ns()
+        self.histograms[phase].observe(now - self.last)
+        self.last = now
+
+    def stop(self):
+        ''' Marks the emit phase and records the total time of the event. '''
+        now = perf_counter_ns()
+        histograms = self.histograms
+        histograms[EMIT].observe(now - self.last)
+        histograms[TOTAL].observe(now - self.start)
+
+
+class NullTimer(object):
+    ''' Timer doing nothing, for code paths that are not instrumented. '''
+
+    def mark(self, phase):
+        pass
+
+    def stop(self):
+        pass
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics(object):
+    ''' Registry of event latency histograms and gauges, rendered in the
+        Prometheus text exposition format.
+    '''
+
+    def __init__(self, prefix='codenames'):
+        self.prefix = prefix
+        # Phase histograms by event name.
+        self.event_histograms = {} # Dict[str, Dict[str, Histogram]]
+        # Functions returning a dict of gauge values, by gauge name prefix.
+        self.collectors = {} # Dict[str, Callable[[], Dict[str, float]]]
+
+    def time_event(self, event):
+        ''' Returns a timer recording the phases of an event (by name). '''
+        histograms = self.event_histograms.get(event)
+        if histograms is None:
+            histograms = {phase: Histogram(LATENCY_BUCKETS_NS) for phase in PHASES}
+            self.event_histograms[event] = histograms
+        return EventTimer(histograms)
+
+    def add_collector(self, name, collect):
+        ''' Registers a function returning current gauge values. They are
+            only collected when the metrics are rendered.
+        '''
+        self.collectors[name] = collect
+
+    def render(self):
+        ''' Renders every metric in the Prometheus text format. '''
+        lines = []
+        name = '%s_event_duration_seconds' % self.prefix
+        lines.append('# HELP %s Time spent handling events, by phase.' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for event, histograms in sorted(self.event_histograms.items()):
+            for phase in PHASES:
+                histogram = histograms[phase]
+                labels = 'event="%s",phase="%s"' % (event, phase)
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{%s,le="%g"} %d' % (name, labels, bound / 1e9, cumulative))
+                cumulative += histogram.counts[-1]
+                lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, cumulative))
+                lines.append('%s_sum{%s} %.9f' % (name, labels, histogram.sum / 1e9))
+                lines.append('%s_count{%s} %d' % (name, labels, cumulative))
+
+        for collector, collect in sorted(self.collectors.items()):
+            for gauge, value in sorted(collect().items()):
+                gauge_name = '%s_%s_%s' % (self.prefix, collector, gauge)
+                lines.append('# TYPE %s gauge' % gauge_name)
+                lines.append('%s %s' % (gauge_name, value))
+        return '\n'.join(lines) + '\n'
+
+# For global access
+metrics = Metrics()
@@ -1,4 +1,3 @@
-from config import global_config as config
 from enum import Enum
 from random import choice
 from uuid import uuid4
@@ -24,22 +23,11 @@ class Player(object):
     	self.avatar = avatar
 
     @classmethod
-    def new_player(cls, used_avatars, team=None, role=None):
+    def new_player(cls, avatar, team=None, role=None):
         return cls(id=str(uuid4()),
                    team=team if team is not None else choice(list(PlayerTeam)),
                    role=role if role is not None else choice(list(PlayerRole)),
-                   avatar=Player._get_avatar(used_avatars))
-
-    @staticmethod
-    def _get_avatar(used_avatars, pref=None):
-        if pref is not None and pref not in used_avatars:
-            return pref
-        avatars = config.getAvatars()
-        available_avatars = [x for x in avatars if x not in used_avatars]
-        if len(available_avatars) < 1:
-            raise ValueError('Out of avatars')
-        avatar = choice(available_avatars)
-        return avatar
+                   avatar=avatar)
 
     # TODO: this should be swapped out with whatever serialization we choose
     def serialize(self):
@@ -0,0 +1,209 @@
+from async_mode import run_blocking
+from collections import OrderedDict
+from config import global_config as config
+from flask_session.sessions import ServerSideSession, SessionInterface
+from itsdangerous import BadSignature, want_bytes
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class MemorySession(ServerSideSession):
+    pass
+
+
+class MemorySessionInterface(SessionInterface):
+    ''' Flask session backend keeping session data in a bounded in-process
+        LRU cache, so socket handlers never touch the disk.
+        The session id travels in a signed cookie. Changed sessions are
+        written behind to an optional SQLite file by a background thread,
+        `flush_interval` seconds of changes per transaction, so sessions
+        evicted from the cache (least recently used first) or lost on a
+        restart are reloaded from it on their next request.
+        The cache is per process: with several processes sharing one SQLite
+        file (e.g. the shards of cluster.py), a client moving between them
+        may read a stale cached copy of its session. It is meant for a
+        single process; sharded deployments should use a shared backend
+        (SESSION_TYPE other than 'memory').
+    '''
+    session_class = MemorySession
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            expires REAL NOT NULL,
+            data BLOB NOT NULL
+        );
+    """
+
+    def __init__(self, capacity, path=None, flush_interval=1.0, permanent=True):
+        # Maximum number of sessions kept in memory.
+        self.capacity = capacity
+        # Session data by session id, least recently used first.
+        self.sessions = OrderedDict() # OrderedDict[str, dict]
+        # Changed sessions not yet written to `path`, by session id (None
+        # marks a deleted session).
+        self.dirty = {} # Dict[str, (float, dict)]
+        # Changed sessions being written (readable until committed).
+        self.flushing = {} # Dict[str, (float, dict)]
+        self.lock = threading.Lock()
+        self.permanent = permanent
+        self.path = path
+        self.flush_interval = flush_interval
+        # Cache metrics.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None:
+            connection = self._connect()
+            connection.executescript(MemorySessionInterface.SCHEMA)
+            connection.close()
+            self.thread = threading.Thread(target=self._run, name='session-writer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    @classmethod
+    def from_config(cls):
+        return cls(config.SESSION_CACHE_SIZE, config.SESSION_STORAGE_PATH, config.SESSION_FLUSH_INTERVAL)
+
+    def _connect(self):
+        # Used from the native threads of `run_blocking` in green thread modes.
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get_metrics(self):
+        ''' Returns cache counters. '''
+        return {
+            'cached': len(self.sessions),
+            'dirty': len(self.dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def open_session(self, app, request):
+        signer = self._get_signer(app)
+        if signer is None:
+            return None
+        signed_sid = request.cookies.get(app.session_cookie_name)
+        if not signed_sid:
+            return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+        try:
+            sid = signer.unsign(signed_sid).decode()
+        except BadSignature:
+            return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+
+        data = self._get(sid)
+        if data is not None:
+            return self.session_class(data, sid=sid)
+        return self.session_class(sid=sid, permanent=self.permanent)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                self._delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        expires = self.get_expiration_time(app, session)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        self._set(session.sid, dict(session), time.time() + lifetime)
+        response.set_cookie(app.session_cookie_name,
+                            self._get_signer(app).sign(want_bytes(session.sid)),
+                            expires=expires,
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app))
+
+    def _get(self, sid):
+        ''' Returns a copy of a session's data, loading it from disk on a miss. '''
+        with self.lock:
+            data = self.sessions.get(sid)
+            if data is not None:
+                self.sessions.move_to_end(sid)
+                self.hits += 1
+                return dict(data)
+            self.misses += 1
+            # Evicted before it was written out (or while being written).
+            entries = self.dirty if sid in self.dirty else self.flushing
+            pending = sid in entries
+            if pending and entries[sid] is not None:
+                data = entries[sid][1]
+        if not pending and self.path is not None:
+            data = run_blocking(self._load, sid)
+        if data is not None:
+            with self.lock:
+                self._cache(sid, data)
+            return dict(data)
+        return None
+
+    def _set(self, sid, data, expires):
+        with self.lock:
+            self._cache(sid, data)
+            if self.path is not None:
+                self.dirty[sid] = (expires, data)
+
+    def _delete(self, sid):
+        with self.lock:
+            self.sessions.pop(sid, None)
+            if self.path is not None:
+                self.dirty[sid] = None
+
+    def _cache(self, sid, data):
+        sessions = self.sessions
+        sessions[sid] = data
+        sessions.move_to_end(sid)
+        while len(sessions) > self.capacity:
+            sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, sid):
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT data FROM sessions WHERE sid = ? AND expires > ?",
+                (sid, time.time())
+            ).fetchone()
+        finally:
+            connection.close()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def flush(self, connection):
+        ''' Writes every changed session in one transaction, and drops
+            expired ones.
+        '''
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            self.flushing = dirty
+        if dirty:
+            run_blocking(self._write, connection, dirty)
+            with self.lock:
+                self.flushing = {}
+
+    def _write(self, connection, dirty):
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                    [(sid, entry[0], pickle.dumps(entry[1], pickle.HIGHEST_PROTOCOL))
+                     for sid, entry in dirty.items() if entry is not None]
+                )
+                connection.executemany(
+                    "DELETE FROM sessions WHERE sid = ?",
+                    [(sid,) for sid, entry in dirty.items() if entry is None]
+                )
+                connection.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+        except sqlite3.Error:
+            logging.exception('[SESSIONS] Failed to write %d sessions', len(dirty))
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush(connection)
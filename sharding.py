@@ -0,0 +1,79 @@
+from bisect import bisect
+from config import global_config as config
+import hashlib
+import os
+from urllib.parse import urlparse
+
+# Environment variable holding the index (in config.SHARD_URLS) of the shard
+# this process serves.
+SHARD_INDEX_ENV = 'CODENAMES_SHARD'
+
+
+class HashRing(object):
+    ''' Consistent hash ring mapping keys to nodes.
+        Every node is placed at `replicas` points on the ring and a key
+        belongs to the first node point following its own hash, so adding or
+        removing a node only moves the keys of neighbouring points.
+    '''
+
+    def __init__(self, nodes, replicas=100):
+        self.ring = sorted(
+            (HashRing.hash('%s#%d' % (node, replica)), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self.points = [point for point, _ in self.ring]
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def get_node(self, key):
+        ''' Returns the node owning the given key. '''
+        index = bisect(self.points, HashRing.hash(key)) % len(self.points)
+        return self.ring[index][1]
+
+
+class ShardRouter(object):
+    ''' Maps game codes to the shard (worker process) that owns them.
+        With fewer than two shard urls configured every game is local.
+    '''
+
+    def __init__(self, shard_urls, shard_index):
+        # Base url of every shard, by shard index.
+        self.shard_urls = shard_urls
+        # Index of the shard served by this process.
+        self.shard_index = shard_index
+        self.ring = HashRing(range(len(shard_urls))) if self.is_sharded() else None
+
+    @classmethod
+    def from_config(cls):
+        ''' Creates the router of this process from config and environment. '''
+        return cls(config.SHARD_URLS, int(os.environ.get(SHARD_INDEX_ENV, 0)))
+
+    def is_sharded(self):
+        return len(self.shard_urls) > 1
+
+    def get_shard(self, game_code):
+        ''' Returns the index of the shard owning a game code. '''
+        if not self.is_sharded():
+            return self.shard_index
+        return self.ring.get_node(str(game_code))
+
+    def owns(self, game_code):
+        ''' Returns whether this process' shard owns a game code. '''
+        return self.get_shard(game_code) == self.shard_index
+
+    def get_url(self, game_code, path):
+        ''' Returns the url of `path` on the shard owning a game code. '''
+        return self.shard_urls[self.get_shard(game_code)].rstrip('/') + path
+
+    def get_address(self):
+        ''' Returns the (host, port) this process' shard listens on. '''
+        if not self.is_sharded():
+            return None, None
+        url = urlparse(self.shard_urls[self.shard_index])
+        return url.hostname, url.port
+
+# For global access
+shard_router = ShardRouter.from_config()
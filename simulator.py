@@ -0,0 +1,219 @@
+''' Headless self-play of `CodenameGame`, without Flask.
+    Bots (see `POLICIES`) give clues and guess through `set_current_clue`,
+    `make_guess` and `end_turn`. Games are played in chunks across a process
+    pool, every chunk from its own seed, so results only depend on the seed
+    and the chunk size (not on the number of processes). Aggregate outcome
+    statistics are streamed as JSON lines while chunks come back, so memory
+    stays constant however many games are played.
+
+    Run from the repository root:
+        python -m simulator --games 1000000 --red noisy:0.8 --blue random
+'''
+from card import CardStatus
+from collections import Counter
+from config import global_config as config
+from functools import lru_cache
+from game import CodenameGame
+from map_card import MapCard, MapCardGenerator
+from multiprocessing import Pool
+from player import PlayerTeam
+from word_source import WordsFile
+import json
+import random
+import sys
+import time
+
+# Clues given before a game is abandoned (bots that never guess).
+MAX_CLUES = 100
+
+EMPTY = CardStatus.EMPTY.value
+
+
+class Policy(object):
+    ''' Interface of a bot playing both roles of a team. '''
+
+    def __init__(self, random):
+        self.random = random
+
+    def get_clue(self, game, team):
+        ''' Returns the (word, number) clue of the team's spymaster. '''
+        raise NotImplementedError("Please Implement this method")
+
+    def get_guess(self, game, team):
+        ''' Returns the word the team's operatives guess next, or None to
+            end their turn.
+        '''
+        raise NotImplementedError("Please Implement this method")
+
+    def get_positions(self, game, status=None):
+        ''' Returns the unrevealed positions (of cards of `status`). '''
+        statuses = game.board.statuses
+        solution = game.board.solution
+        if status is None:
+            return [index for index, revealed in enumerate(statuses) if revealed == EMPTY]
+        value = status.value
+        return [
+            index for index, revealed in enumerate(statuses)
+            if revealed == EMPTY and solution[index] == value
+        ]
+
+
+class RandomPolicy(Policy):
+    ''' Clues a random number of words, guesses unrevealed cards uniformly
+        and never stops early.
+    '''
+
+    def get_clue(self, game, team):
+        remaining = game.board.get_num_remaining(CardStatus[team.name])
+        return 'clue', self.random.randint(1, remaining)
+
+    def get_guess(self, game, team):
+        return game.board.get_word(self.random.choice(self.get_positions(game)))
+
+
+class NoisyPolicy(Policy):
+    ''' Clues 1 to 3 of the team's words, and guesses one of them with
+        probability `accuracy` (any unrevealed card otherwise). Stops once
+        the clued number of words was found.
+    '''
+
+    def __init__(self, random, accuracy=0.8):
+        super().__init__(random)
+        self.accuracy = float(accuracy)
+
+    def get_clue(self, game, team):
+        remaining = game.board.get_num_remaining(CardStatus[team.name])
+        return 'clue', self.random.randint(1, min(3, remaining))
+
+    def get_guess(self, game, team):
+        if game.guesses_left == 1:
+            return None
+        status = CardStatus[team.name] if self.random.random() < self.accuracy else None
+        return game.board.get_word(self.random.choice(self.get_positions(game, status)))
+
+# Policies by name, used as "name[:argument,...]".
+POLICIES = {
+    'random': RandomPolicy,
+    'noisy': NoisyPolicy,
+}
+
+def create_policy(spec, random):
+    name, _, arguments = spec.partition(':')
+    if name not in POLICIES:
+        raise ValueError("Unknown policy %s" % name)
+    return POLICIES[name](random, *(arguments.split(',') if arguments else ()))
+
+
+def play_game(game, policies, stats):
+    ''' Plays a game to the end, recording its outcome into `stats`. '''
+    clues = 0
+    while game.winner is None:
+        if clues == MAX_CLUES:
+            stats['abandoned'] += 1
+            return
+        team, role = game.get_current_turn()
+        policy = policies[team]
+        game.set_current_clue(*policy.get_clue(game, team))
+        clues += 1
+        while game.winner is None and game.get_current_turn()[0] is team:
+            word = policy.get_guess(game, team)
+            if word is None:
+                game.end_turn()
+                stats['ended_turns'] += 1
+                break
+            game.make_guess(word)
+            stats['guesses'] += 1
+            status = game.board.get_solution(game.board.get_index(word))
+            if status.name != team.name:
+                stats['wrong_guesses'] += 1
+            elif game.guesses_left == 0 and game.winner is None:
+                stats['out_of_guesses'] += 1
+        game.pop_patches()
+
+    bomb = game.board.get_num_revealed(CardStatus.BOMB) > 0
+    stats['games'] += 1
+    stats['clues'] += clues
+    stats['%s_wins' % game.winner.name.lower()] += 1
+    stats['bomb' if bomb else 'all_found'] += 1
+    if game.winner is game.map_card.get_starting_color():
+        stats['starting_team_wins'] += 1
+
+@lru_cache(maxsize=None)
+def get_words():
+    return WordsFile(config.WORDS_FILE).getAllWords()
+
+def play_chunk(args):
+    ''' Plays the `chunk`th chunk of `size` games, returning its statistics
+        (with the CPU time spent, in milliseconds).
+    '''
+    seed, chunk, size, red, blue = args
+    start = time.process_time()
+    rng = random.Random('%d:%d' % (seed, chunk))
+    generator = MapCardGenerator.from_config(seed=rng.getrandbits(32))
+    words = get_words()
+    policies = {
+        PlayerTeam.RED: create_policy(red, rng),
+        PlayerTeam.BLUE: create_policy(blue, rng),
+    }
+    stats = Counter()
+    for layout in generator.generate_batch(size):
+        map_card = MapCard(layout, rng.choice([PlayerTeam.RED, PlayerTeam.BLUE]))
+        game = CodenameGame(map_card, rng.sample(words, config.getNumCards()))
+        # Any exception is an engine (or policy) bug and fails the run.
+        play_game(game, policies, stats)
+    stats['cpu_ms'] += int((time.process_time() - start) * 1000)
+    return stats
+
+
+def simulate(games, red, blue, seed=0, processes=None, chunk_size=1000, output=sys.stdout, report_every=10):
+    ''' Plays `games` games, writing cumulative statistics every
+        `report_every` chunks and once done. Returns the final statistics.
+    '''
+    chunks = (games + chunk_size - 1) // chunk_size
+    tasks = (
+        (seed, chunk, min(chunk_size, games - chunk * chunk_size), red, blue)
+        for chunk in range(chunks)
+    )
+    stats = Counter()
+    start = time.perf_counter()
+
+    def report(done):
+        elapsed = time.perf_counter() - start
+        cpu_seconds = stats['cpu_ms'] / 1000
+        record = {
+            'chunks': done,
+            'elapsed': round(elapsed, 3),
+            'games_per_second': round(stats['games'] / elapsed, 1) if elapsed else None,
+            # Throughput of the engine alone, per busy core.
+            'games_per_core_second': round(stats['games'] / cpu_seconds, 1) if cpu_seconds else None,
+            'stats': dict(sorted(stats.items())),
+        }
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+    with Pool(processes) as pool:
+        for done, chunk_stats in enumerate(pool.imap_unordered(play_chunk, tasks), 1):
+            stats.update(chunk_stats)
+            if done % report_every == 0 and done != chunks:
+                report(done)
+    report(chunks)
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Plays bot games and writes outcome statistics as JSON lines.')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--red', default='noisy', help='policy of the red team (%s)' % ', '.join(POLICIES))
+    parser.add_argument('--blue', default='noisy', help='policy of the blue team')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None, help='(default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--output', help='file to append statistics to (default: stdout)')
+    args = parser.parse_args()
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        simulate(args.games, args.red, args.blue, args.seed, args.processes, args.chunk_size, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,53 @@
+from flask_socketio import SocketIO
+import inspect
+
+
+def run_handler(steps):
+    ''' Runs a handler written as a generator of futures (see
+        `SocketServer`) to completion, blocking on each future and sending
+        its result (or raising its exception) back into the handler.
+    '''
+    try:
+        future = next(steps)
+        while True:
+            try:
+                result = future.result()
+            except Exception as error:
+                future = steps.throw(error)
+            else:
+                future = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+class SocketServer(SocketIO):
+    ''' Flask-SocketIO server that also keeps the plain handler of every
+        event, so the asyncio server (see async_server.py) can serve the same
+        handlers.
+        Handlers that wait for a game's mailbox are generators yielding the
+        Future of each mailbox call, which evaluates to its result. On
+        Flask-SocketIO they run through `run_handler`, the asyncio server
+        awaits the futures instead of blocking.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Handler of each event, by event name.
+        self.event_handlers = {}
+
+    def on(self, message, namespace=None):
+        register = super().on(message, namespace)
+
+        def decorator(handler):
+            self.event_handlers[message] = handler
+            if inspect.isgeneratorfunction(handler):
+                def run(*args):
+                    return run_handler(handler(*args))
+                register(run)
+                return handler
+            return register(handler)
+        return decorator
+
+# Shared Socket.IO server, bound to the Flask app in app.py. Kept in its own
+# module so the handler modules (and benchmarks) can import it.
+socketio = SocketServer()
@@ -0,0 +1,51 @@
+class MachineError(Exception):
+    ''' Raised when a trigger is fired from a state it has no transition for. '''
+    pass
+
+
+class StateMachine(object):
+    ''' Table-driven finite state machine.
+        Subclasses declare `states` and `transitions` ([trigger, source, dest])
+        as class attributes. These are compiled once, when the subclass is
+        defined, into integer-coded tables and one trigger method per
+        transition name, so instances only store their current state code.
+    '''
+
+    states = []
+    transitions = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # State to integer code mapping.
+        cls.state_codes = {state: code for code, state in enumerate(cls.states)}
+        # Trigger name to destination code by source code (-1 if invalid).
+        cls.transition_table = {}
+        for trigger, source, dest in cls.transitions:
+            table = cls.transition_table.setdefault(trigger, [-1] * len(cls.states))
+            table[cls.state_codes[source]] = cls.state_codes[dest]
+        for trigger, table in cls.transition_table.items():
+            if trigger in cls.__dict__:
+                raise ValueError("Trigger %s conflicts with an attribute of %s"
+                                 % (trigger, cls.__name__))
+            setattr(cls, trigger, StateMachine._make_trigger(trigger, tuple(table)))
+
+    @staticmethod
+    def _make_trigger(trigger, table):
+        def fire(self):
+            dest = table[self.state_code]
+            if dest < 0:
+                raise MachineError("Can't trigger event %s from state %s!"
+                                   % (trigger, self.state))
+            self.state_code = dest
+            return True
+        fire.__name__ = trigger
+        return fire
+
+    def __init__(self, initial):
+        # Integer code of the current state.
+        self.state_code = self.state_codes[initial]
+
+    @property
+    def state(self):
+        ''' Returns the current state as declared in `states`. '''
+        return self.states[self.state_code]
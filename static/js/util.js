@@ -8,3 +8,137 @@ function getDeviceIcon(userAgent) {
     return '#icon-android';
   return '#icon-laptop';
 }
+
+// Socket payload encoding requested at client_connect. Binary payloads are
+// MessagePack with integer coded enums (see wire_format.py), JSON is the
+// fallback for browsers without typed arrays.
+var WIRE_FORMAT = (typeof Uint8Array !== 'undefined' &&
+                   typeof TextDecoder !== 'undefined') ? 'msgpack' : 'json';
+
+function withWireFormat(cookie) {
+  var data = {};
+  for (var key in cookie) {
+    data[key] = cookie[key];
+  }
+  data.encoding = WIRE_FORMAT;
+  return data;
+}
+
+// Returns a socket payload as the plain object the server serialized.
+function decodePayload(data) {
+  if (data instanceof ArrayBuffer) {
+    return expandPayload(unpackMsgpack(new Uint8Array(data)));
+  }
+  return data;
+}
+
+// Undoes wire_format.compact: enum codes back to names and the deck back to
+// a list of {word, status} cards.
+function expandPayload(value) {
+  if (Array.isArray(value)) {
+    return value.map(expandPayload);
+  }
+  if (value === null || typeof value !== 'object' || value instanceof Uint8Array) {
+    return value;
+  }
+  var expanded = {};
+  Object.keys(value).forEach(function(key) {
+    var item = value[key];
+    if (key === 'deck') {
+      expanded.deck = item.words.map(function(word, i) {
+        return { word: word, status: WIRE_ENUMS.status[item.statuses[i]] };
+      });
+    } else if (WIRE_ENUMS.hasOwnProperty(key) && typeof item === 'number') {
+      expanded[key] = WIRE_ENUMS[key][item];
+    } else {
+      expanded[key] = expandPayload(item);
+    }
+  });
+  return expanded;
+}
+
+// Minimal MessagePack decoder (no extension types).
+function unpackMsgpack(bytes) {
+  var view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  var utf8 = new TextDecoder('utf-8');
+  var offset = 0;
+
+  function str(length) {
+    var value = utf8.decode(bytes.subarray(offset, offset + length));
+    offset += length;
+    return value;
+  }
+  function bin(length) {
+    var value = bytes.slice(offset, offset + length);
+    offset += length;
+    return value;
+  }
+  function array(length) {
+    var value = new Array(length);
+    for (var i = 0; i < length; i++) {
+      value[i] = read();
+    }
+    return value;
+  }
+  function map(length) {
+    var value = {};
+    for (var i = 0; i < length; i++) {
+      var key = read();
+      value[key] = read();
+    }
+    return value;
+  }
+  function uint(size) {
+    var value;
+    if (size === 1) value = view.getUint8(offset);
+    else if (size === 2) value = view.getUint16(offset);
+    else if (size === 4) value = view.getUint32(offset);
+    else value = view.getUint32(offset) * 4294967296 + view.getUint32(offset + 4);
+    offset += size;
+    return value;
+  }
+  function int(size) {
+    var value;
+    if (size === 1) value = view.getInt8(offset);
+    else if (size === 2) value = view.getInt16(offset);
+    else if (size === 4) value = view.getInt32(offset);
+    else value = view.getInt32(offset) * 4294967296 + view.getUint32(offset + 4);
+    offset += size;
+    return value;
+  }
+  function read() {
+    var type = bytes[offset++];
+    if (type <= 0x7f) return type;
+    if (type <= 0x8f) return map(type & 0x0f);
+    if (type <= 0x9f) return array(type & 0x0f);
+    if (type <= 0xbf) return str(type & 0x1f);
+    if (type >= 0xe0) return type - 0x100;
+    switch (type) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(uint(1));
+      case 0xc5: return bin(uint(2));
+      case 0xc6: return bin(uint(4));
+      case 0xca: offset += 4; return view.getFloat32(offset - 4);
+      case 0xcb: offset += 8; return view.getFloat64(offset - 8);
+      case 0xcc: return uint(1);
+      case 0xcd: return uint(2);
+      case 0xce: return uint(4);
+      case 0xcf: return uint(8);
+      case 0xd0: return int(1);
+      case 0xd1: return int(2);
+      case 0xd2: return int(4);
+      case 0xd3: return int(8);
+      case 0xd9: return str(uint(1));
+      case 0xda: return str(uint(2));
+      case 0xdb: return str(uint(4));
+      case 0xdc: return array(uint(2));
+      case 0xdd: return array(uint(4));
+      case 0xde: return map(uint(2));
+      case 0xdf: return map(uint(4));
+    }
+    throw new Error('Unsupported MessagePack type 0x' + type.toString(16));
+  }
+  return read();
+}
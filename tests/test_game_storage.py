@@ -0,0 +1,75 @@
+''' Tests of the SQLite game storage. Run from the repository root:
+        python -m unittest discover tests
+'''
+from client_manager import ClientEvent
+from config import global_config as config
+from game import GameEvent
+from game_storage import SQLiteGameStorage
+from game_store import ActiveGameStore
+from unittest import mock
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot_interval = config.SNAPSHOT_INTERVAL
+        config.update(SNAPSHOT_INTERVAL=2)
+        self.directory = tempfile.mkdtemp()
+        self.storage = SQLiteGameStorage(os.path.join(self.directory, 'games.db'), 0.005)
+        self.store = ActiveGameStore(self.storage)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+        config.update(SNAPSHOT_INTERVAL=self.snapshot_interval)
+
+    def test_snapshot_does_not_block_game_events(self):
+        game_code = self.store.create_game()
+        game_manager = self.store.get_game(game_code)
+        client, _ = game_manager.handle_client_event(None, ClientEvent.CONNECT, None)
+        for _ in range(4):
+            game_manager.handle_client_event(client.id, ClientEvent.ADD_PLAYER, None)
+        self.storage.flush()
+        first_seq = game_manager.event_seq
+
+        # Stall the writer, and record the threads pickling game managers.
+        writer_free = threading.Event()
+        self.storage.writes.put(lambda connection: writer_free.wait(10))
+        pickling_threads = []
+        dumps = pickle.dumps
+        def recording_dumps(obj, *args, **kwargs):
+            pickling_threads.append(threading.current_thread())
+            return dumps(obj, *args, **kwargs)
+
+        with mock.patch.object(pickle, 'dumps', recording_dumps):
+            game_manager.handle_game_event(client.id, GameEvent.SUBMIT_CLUE, {'word': 'clue', 'number': '2'})
+            game_manager.handle_game_event(client.id, GameEvent.CHOOSE_WORD, game_manager.game.board.words[0])
+            # Both events completed while the writer was stalled, and crossed
+            # a snapshot without serializing the game on this thread.
+            self.assertGreaterEqual(game_manager.event_seq - first_seq, 2)
+            self.assertEqual(pickling_threads, [])
+            writer_free.set()
+            self.storage.flush()
+        self.assertTrue(pickling_threads)
+        self.assertNotIn(threading.current_thread(), pickling_threads)
+
+        # The snapshot built by the writer, with the events after it, rebuilds
+        # the game.
+        [(recovered_code, recovered, records)] = list(self.storage.load_games())
+        self.assertEqual(recovered_code, game_code)
+        self.assertEqual(recovered.event_seq, game_manager.event_seq // 2 * 2)
+        for seq, record in records:
+            recovered.replay_event(seq, record)
+        self.assertEqual(recovered.event_seq, game_manager.event_seq)
+        self.assertEqual(recovered.game.serialize(), game_manager.game.serialize())
+        self.assertEqual(recovered.client_manager.get_lobby_bundle(), game_manager.client_manager.get_lobby_bundle())
+
+
+if __name__ == '__main__':
+    unittest.main()
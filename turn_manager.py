@@ -1,6 +1,6 @@
-from transitions import Machine
 from enum import Enum
 from player import PlayerRole, PlayerTeam
+from state_machine import StateMachine
 
 '''
 class PlayerRole(Enum):
@@ -20,7 +20,7 @@ red_operative = red + operative
 blue_spymaster = blue + spymaster
 blue_operative = blue + operative
 
-class TurnManager(object):
+class TurnManager(StateMachine):
     states = [red_spymaster, red_operative, blue_spymaster, blue_operative]
     transitions = [
         ['next_turn', red_spymaster, red_operative],
@@ -29,14 +29,17 @@ class TurnManager(object):
         ['next_turn', blue_operative, red_spymaster],
     ]
 
+    # (team, role) of each state, indexed by state code.
+    team_roles = [
+        (PlayerTeam.RED, PlayerRole.SPYMASTER),
+        (PlayerTeam.RED, PlayerRole.OPERATIVE),
+        (PlayerTeam.BLUE, PlayerRole.SPYMASTER),
+        (PlayerTeam.BLUE, PlayerRole.OPERATIVE),
+    ]
+
     def __init__(self, starting_team):
         starting_role = PlayerRole.SPYMASTER
-        self.machine = Machine(
-            model=self,
-            states=TurnManager.states,
-            transitions=TurnManager.transitions,
-            initial=TurnManager.create_state(starting_team, starting_role)
-        )
+        super().__init__(initial=TurnManager.create_state(starting_team, starting_role))
 
     @staticmethod
     def create_state(team, role):
@@ -46,5 +49,4 @@ class TurnManager(object):
         return self.state
 
     def get_current_turn_team_role(self):
-        team_raw, role_raw = self.state.split()
-        return PlayerTeam(team_raw), PlayerRole(role_raw)
+        return self.team_roles[self.state_code]
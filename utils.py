@@ -1,15 +1,16 @@
 from copy import deepcopy
 from constants import GAME_CODE_KEY, CLIENT_ID_KEY
 from flask import session
-from flask_socketio import emit
 from functools import partial
+from wire_format import wire_formats
 
 
 class EmitEvent(object):
 	def __init__(self, *args, **kwargs):
 		self.args = args
 		self.kwargs = kwargs
-		self.emit_event = partial(emit, *self.args, **self.kwargs)
+		# Encoded for each recipient (see `WireFormats`).
+		self.emit_event = partial(wire_formats.emit, *self.args, **self.kwargs)
 
 	def emit(self):
 		self.emit_event()
@@ -0,0 +1,159 @@
+from board import STATUS_NAMES
+from flask import request
+from flask_socketio import join_room
+from player import PlayerRole, PlayerTeam
+from sockets import socketio
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+# Enum valued fields of socket payloads, with the names their integer codes
+# stand for in MessagePack payloads (code = index). Also sent to the pages
+# (see `static/js/util.js`) for decoding.
+WIRE_ENUMS = {
+    'status': STATUS_NAMES,
+    'team': tuple(team.value for team in PlayerTeam),
+    'currentTeam': tuple(team.value for team in PlayerTeam),
+    'role': tuple(role.value for role in PlayerRole),
+    'currentRole': tuple(role.value for role in PlayerRole),
+}
+ENUM_CODES = {
+    field: {name: code for code, name in enumerate(names)}
+    for field, names in WIRE_ENUMS.items()
+}
+
+
+def compact(value):
+    ''' Returns a payload with enum fields replaced by their codes and the
+        deck split into a word list and a status byte string (instead of a
+        {word, status} dict per card).
+    '''
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if key == 'deck':
+                compacted[key] = {
+                    'words': [card['word'] for card in item],
+                    'statuses': bytes(ENUM_CODES['status'][card['status']] for card in item),
+                }
+            elif key in ENUM_CODES and item in ENUM_CODES[key]:
+                compacted[key] = ENUM_CODES[key][item]
+            else:
+                compacted[key] = compact(item)
+        return compacted
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+def encode(data, encoding):
+    ''' Encodes a payload for the wire (JSON payloads are left to Socket.IO). '''
+    if encoding == MSGPACK:
+        return msgpack.packb(compact(data), use_bin_type=True)
+    return data
+
+
+class FlaskSocketIOTransport(object):
+    ''' Sends through the Flask-SocketIO server (eventlet, gevent and
+        threading modes). The asyncio server has its own transport.
+    '''
+
+    def emit(self, event, data, sid):
+        socketio.emit(event, data, room=sid)
+
+    def broadcast(self, event, data, room):
+        socketio.emit(event, data, room=room)
+
+    def join(self, room, sid):
+        join_room(room, sid=sid)
+
+
+class WireFormats(object):
+    ''' Tracks the payload encoding negotiated by each socket at
+        client_connect. Sockets using JSON join a game's room as before,
+        sockets using MessagePack join a sibling room, so that a broadcast is
+        encoded once per encoding in use rather than once per socket.
+    '''
+
+    def __init__(self):
+        # Encoding of every socket not using JSON, by socket id.
+        self.encodings = {} # Dict[str, str]
+        # Binary room joined by each of these sockets, by socket id.
+        self.binary_rooms = {} # Dict[str, str]
+        # Number of sockets in each binary room.
+        self.binary_room_sizes = {} # Dict[str, int]
+        self.lock = threading.Lock()
+        # Sends events to sockets and rooms.
+        self.transport = FlaskSocketIOTransport()
+
+    @staticmethod
+    def get_binary_room(room):
+        return '%s:%s' % (room, MSGPACK)
+
+    def negotiate(self, requested):
+        ''' Settles the encoding of the requesting socket, falling back to
+            JSON if the requested one is unknown or unavailable.
+        '''
+        if requested == MSGPACK and msgpack is not None:
+            self.encodings[request.sid] = MSGPACK
+            return MSGPACK
+        self.forget(request.sid)
+        return JSON
+
+    def get_encoding(self, sid):
+        return self.encodings.get(sid, JSON)
+
+    def join(self, room):
+        ''' Adds the requesting socket to a room, for its encoding. '''
+        sid = request.sid
+        if self.get_encoding(sid) == JSON:
+            self.transport.join(room, sid)
+            return
+        binary_room = WireFormats.get_binary_room(room)
+        self.transport.join(binary_room, sid)
+        with self.lock:
+            if self.binary_rooms.get(sid) != binary_room:
+                self._leave(sid)
+                self.binary_rooms[sid] = binary_room
+                self.binary_room_sizes[binary_room] = self.binary_room_sizes.get(binary_room, 0) + 1
+
+    def forget(self, sid):
+        ''' Drops a (disconnected) socket. '''
+        self.encodings.pop(sid, None)
+        with self.lock:
+            self._leave(sid)
+
+    def _leave(self, sid):
+        binary_room = self.binary_rooms.pop(sid, None)
+        if binary_room is None:
+            return
+        size = self.binary_room_sizes[binary_room] - 1
+        if size:
+            self.binary_room_sizes[binary_room] = size
+        else:
+            del self.binary_room_sizes[binary_room]
+
+    def emit(self, event, data=None, room=None, broadcast=False):
+        ''' Emits an event to the requesting socket, or broadcasts it to a
+            room, encoded for each recipient.
+        '''
+        if room is None and not broadcast:
+            sid = request.sid
+            self.transport.emit(event, encode(data, self.get_encoding(sid)), sid)
+        else:
+            self.broadcast(event, data, room)
+
+    def broadcast(self, event, data, room):
+        ''' Broadcasts an event to a room (needs no request context). '''
+        self.transport.broadcast(event, data, room)
+        binary_room = WireFormats.get_binary_room(room)
+        if binary_room in self.binary_room_sizes:
+            self.transport.broadcast(event, encode(data, MSGPACK), binary_room)
+
+# For global access
+wire_formats = WireFormats()
@@ -1,11 +1,24 @@
+import mmap
+import os
 import random
+import struct
 from config import global_config as config
-import nltk
-from nltk.corpus import wordnet as wn
 
 class WordsSource:
 	'''	Interface defining required methods of a word source. '''
 
+	@staticmethod
+	def factory(type):
+		''' Factory method for constructing word source by type. '''
+		if type == "file":
+			return WordsFromFile()
+		elif type == "lexicon":
+			return NounsFromLexicon()
+		elif type == "nltk":
+			return NounsFromNLTK()
+		else:
+			raise ValueError("Unknown word source type specified")
+
 	def sampleWords(n):
 		''' Sample `n` words from the word source. This sampling may be random
 			or biased in ways to improve content-distibution of words.
@@ -56,24 +69,25 @@ class NounsFromNLTK(WordsSource):
 	def getAllWords(self):
 		'''	Lazily evaluated/cached method that returns stored list of all single-word nouns in WordNet. '''
 		if self._words is None:
-			_words = self.getSingleWordNouns()
-		return _words
+			self._words = self.getSingleWordNouns()
+		return self._words
 
 	def getSingleWordNouns(self):
 		'''	Helper method of `getAllWords()` that fetches all single-word nouns in WordNet. '''
+		# Only needed (with network access) when building the word list.
+		import nltk
+		from nltk.corpus import wordnet as wn
 		nltk.download('wordnet')
 		nouns = set()
 		for synset in wn.all_synsets(wn.NOUN):
 			lemma_names = synset.lemma_names()
 			for name in lemma_names:
 				try:
-					ascii_name = name.encode('ascii')		
-					if ascii_name.count('_') > 0:
-						continue
-					else:
-						nouns.add(ascii_name)
+					name.encode('ascii')
 				except UnicodeEncodeError:
 					continue
+				if '_' not in name:
+					nouns.add(name.lower())
 		return list(nouns)
 	
 	def refreshWords(self):
@@ -85,8 +99,59 @@ class NounsFromNLTK(WordsSource):
 		words = self.getAllWords()
 		return random.sample(words, n)
 
+class LexiconFile:
+	'''	Wrapper on a compiled lexicon file (see `compileLexicon`), which is
+		memory-mapped so words are only decoded when sampled.
+		Layout: MAGIC, uint32 word count, (count + 1) uint32 offsets, then the
+		sorted words, newline-packed.
+	'''
+	MAGIC = b'CNLEX001'
+	HEADER = struct.Struct('<8sI')
+	OFFSET = struct.Struct('<I')
+
+	def __init__(self, filename):
+		self.filename = filename
+		with open(filename, 'rb') as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, self._count = LexiconFile.HEADER.unpack_from(self._map, 0)
+		if magic != LexiconFile.MAGIC:
+			raise ValueError("%s is not a compiled lexicon" % filename)
+		self._offsetsStart = LexiconFile.HEADER.size
+
+	def getNumWords(self):
+		return self._count
+
+	def getWord(self, i):
+		''' Decodes the i-th (in sorted order) word of the lexicon. '''
+		offsetPosition = self._offsetsStart + i * LexiconFile.OFFSET.size
+		start = LexiconFile.OFFSET.unpack_from(self._map, offsetPosition)[0]
+		end = LexiconFile.OFFSET.unpack_from(self._map, offsetPosition + LexiconFile.OFFSET.size)[0]
+		# Drop the newline separating this word from the next.
+		return self._map[start:end - 1].decode('ascii')
+
+	def sampleWords(self, n):
+		''' Samples `n` distinct words uniformly, decoding only those words. '''
+		return [self.getWord(i) for i in random.sample(range(self._count), n)]
+
+class NounsFromLexicon(WordsSource):
+	''' Word source based off of a compiled lexicon of WordNet single-word
+		nouns (built offline with `python word_source.py`).
+	'''
+	def __init__(self):
+		self._lexicon = None
+
+	def getLexicon(self):
+		'''	Lazily opened/cached memory-mapped lexicon. '''
+		if self._lexicon is None:
+			self._lexicon = LexiconFile(config.NOUN_LEXICON_FILE)
+		return self._lexicon
+
+	def sampleWords(self, n):
+		''' Samples words uniformly from the compiled lexicon. '''
+		return self.getLexicon().sampleWords(n)
+
 # For global access
-WordsInMemory = WordsFromFile()
+WordsInMemory = WordsSource.factory(config.WORD_SOURCE)
 
 """
 Possible advanced game generation technique (for future):
@@ -119,6 +184,27 @@ def reservoirSample(iterator, K):
 
 	return result	
 
+def compileLexicon(words, filename):
+	''' Compiles words into a lexicon file (see `LexiconFile`), sorted and
+		deduplicated. Written to a temporary file first, so a running server
+		never maps a partial lexicon.
+	'''
+	encoded = sorted(set(word.strip().lower().encode('ascii') for word in words if word.strip()))
+	offsets = []
+	position = LexiconFile.HEADER.size + (len(encoded) + 1) * LexiconFile.OFFSET.size
+	for word in encoded:
+		offsets.append(position)
+		position += len(word) + 1
+	offsets.append(position)
+
+	tmpFilename = filename + '.tmp'
+	with open(tmpFilename, 'wb') as f:
+		f.write(LexiconFile.HEADER.pack(LexiconFile.MAGIC, len(encoded)))
+		f.write(struct.pack('<%dI' % len(offsets), *offsets))
+		f.write(b''.join(word + b'\n' for word in encoded))
+	os.replace(tmpFilename, filename)
+	return len(encoded)
+
 # Default values
 
 DEFAULT_WORDS = [
@@ -147,4 +233,9 @@ DEFAULT_WORDS = [
         "Charge",
         "Bell",
         "Alps"
-    ]
\ No newline at end of file
+    ]
+
+if __name__ == '__main__':
+	# Build step: compile WordNet single-word nouns into the configured lexicon.
+	count = compileLexicon(NounsFromNLTK().getSingleWordNouns(), config.NOUN_LEXICON_FILE)
+	print('Compiled %d nouns into %s' % (count, config.NOUN_LEXICON_FILE))